@@ -0,0 +1,63 @@
+# Generated by Django 5.2 on 2026-10-17 03:10
+
+from django.db import migrations
+
+import gptinder_back.fields
+
+
+BATCH_SIZE = 500
+
+
+def json_to_binary(apps, schema_editor):
+    """Copy JSON float lists into the binary vector column"""
+    Message = apps.get_model('ai_chat', 'Message')
+    batch = []
+    messages = Message.objects.filter(embedding__isnull=False).only('id', 'embedding')
+    for message in messages.iterator(chunk_size=BATCH_SIZE):
+        message.embedding_binary = message.embedding
+        batch.append(message)
+        if len(batch) >= BATCH_SIZE:
+            Message.objects.bulk_update(batch, ['embedding_binary'])
+            batch = []
+    if batch:
+        Message.objects.bulk_update(batch, ['embedding_binary'])
+
+
+def binary_to_json(apps, schema_editor):
+    """Copy binary vectors back into the JSON column"""
+    Message = apps.get_model('ai_chat', 'Message')
+    batch = []
+    messages = Message.objects.filter(embedding_binary__isnull=False).only('id', 'embedding_binary')
+    for message in messages.iterator(chunk_size=BATCH_SIZE):
+        message.embedding = message.embedding_binary.tolist()
+        batch.append(message)
+        if len(batch) >= BATCH_SIZE:
+            Message.objects.bulk_update(batch, ['embedding'])
+            batch = []
+    if batch:
+        Message.objects.bulk_update(batch, ['embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_chat', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='embedding_binary',
+            field=gptinder_back.fields.VectorField(blank=True, null=True, verbose_name='Embedding'),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='message',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='message',
+            old_name='embedding_binary',
+            new_name='embedding',
+        ),
+    ]
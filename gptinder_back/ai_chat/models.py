@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
+from gptinder_back.fields import VectorField
+
 
 class Chat(models.Model):
     """Model to store chat sessions with AI"""
@@ -39,7 +41,7 @@ class Message(models.Model):
     created_at = models.DateTimeField(_("Created at"), auto_now_add=True)
     
     # Store embedding vector for the message content (for recommendation purposes)
-    embedding = models.JSONField(_("Embedding"), null=True, blank=True)
+    embedding = VectorField(_("Embedding"), null=True, blank=True)
     
     class Meta:
         ordering = ['created_at']
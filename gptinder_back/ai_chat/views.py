@@ -1,12 +1,15 @@
 from django.shortcuts import render
-import openai
 import json
 import numpy as np
 from django.conf import settings
+from django.db import transaction
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from recommendations.clients import get_openai_client
+from recommendations.embeddings import embed_text
+from recommendations.tasks import index_message_task
 from .models import Chat, Message
 from .serializers import (
     ChatSerializer, MessageSerializer, 
@@ -61,7 +64,7 @@ class ChatViewSet(viewsets.ModelViewSet):
             
             try:
                 # Call OpenAI API
-                response = openai.chat.completions.create(
+                response = get_openai_client().chat.completions.create(
                     model="gpt-3.5-turbo",
                     messages=messages,
                     max_tokens=1000
@@ -79,13 +82,13 @@ class ChatViewSet(viewsets.ModelViewSet):
                 
                 # Update embedding for user message (for recommendations)
                 try:
-                    embedding_response = openai.embeddings.create(
-                        model="text-embedding-ada-002",
-                        input=user_message.content
-                    )
-                    embedding = embedding_response.data[0].embedding
+                    embedding = embed_text(user_message.content)
                     user_message.embedding = embedding
                     user_message.save()
+                    
+                    # Make the message searchable for message-based recommendations, in a worker
+                    user_message_id = user_message.id
+                    transaction.on_commit(lambda: index_message_task.delay(user_message_id))
                 except Exception as e:
                     # Continue even if embedding fails
                     print(f"Embedding failed: {str(e)}")
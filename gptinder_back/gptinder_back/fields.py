@@ -0,0 +1,68 @@
+import base64
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class VectorField(models.BinaryField):
+    """
+    Stores an embedding vector as raw little-endian float32 (or float16) bytes.
+    Values loaded from the database are read-only np.frombuffer views over the
+    column bytes, so no parsing or copying happens on load. Lists and arrays are
+    accepted on assignment.
+    """
+    description = _("Embedding vector")
+
+    DTYPES = {
+        'float32': '<f4',
+        'float16': '<f2',
+    }
+
+    def __init__(self, *args, dtype='float32', **kwargs):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.dtype = dtype
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.dtype != 'float32':
+            kwargs['dtype'] = self.dtype
+        return name, path, args, kwargs
+
+    @property
+    def numpy_dtype(self):
+        return np.dtype(self.DTYPES[self.dtype])
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype=self.numpy_dtype)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, str):
+            # Serialized form used by dumpdata/loaddata
+            value = base64.b64decode(value.encode('ascii'))
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return np.frombuffer(value, dtype=self.numpy_dtype)
+        try:
+            return np.asarray(value, dtype=self.numpy_dtype)
+        except (TypeError, ValueError):
+            raise ValidationError(_("Enter a list of numbers."), code='invalid')
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        return np.ascontiguousarray(value, dtype=self.numpy_dtype).tobytes()
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        if value is None:
+            return None
+        return base64.b64encode(self.get_prep_value(value)).decode('ascii')
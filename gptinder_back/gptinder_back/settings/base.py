@@ -127,10 +127,123 @@ REST_FRAMEWORK = {
 # OpenAI API settings
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
+# Shared OpenAI client: size of its HTTP connection pool, request timeout (seconds) and retries
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 60))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 2))
+
+# Recommendation explanations: chat completions in flight per generate request, and the overall
+# deadline (seconds) after which any missing explanation falls back to a generic one
+EXPLANATION_MAX_CONCURRENCY = int(os.getenv('EXPLANATION_MAX_CONCURRENCY', 5))
+EXPLANATION_DEADLINE = float(os.getenv('EXPLANATION_DEADLINE', 10))
+
+# Recommendation jobs still pending or running after this many seconds are considered lost,
+# a new generate request starts a fresh job instead of returning them
+RECOMMENDATION_JOB_TIMEOUT = int(os.getenv('RECOMMENDATION_JOB_TIMEOUT', 600))
+
+# Periodic message analysis: at most this many due users per run, each in its own subtask. A user without
+# new messages is due again after MESSAGE_ANALYSIS_INTERVAL_HOURS, each new message brings that forward
+MESSAGE_ANALYSIS_BATCH_SIZE = int(os.getenv('MESSAGE_ANALYSIS_BATCH_SIZE', 1000))
+MESSAGE_ANALYSIS_INTERVAL_HOURS = float(os.getenv('MESSAGE_ANALYSIS_INTERVAL_HOURS', 24))
+# Each user is analyzed in its own subtask, retried MESSAGE_ANALYSIS_MAX_RETRIES times and stopped after
+# MESSAGE_ANALYSIS_USER_TIME_LIMIT seconds. Routing them to MESSAGE_ANALYSIS_QUEUE lets a dedicated
+# worker's concurrency bound how many run at once (default queue when empty)
+MESSAGE_ANALYSIS_MAX_RETRIES = int(os.getenv('MESSAGE_ANALYSIS_MAX_RETRIES', 2))
+MESSAGE_ANALYSIS_USER_TIME_LIMIT = int(os.getenv('MESSAGE_ANALYSIS_USER_TIME_LIMIT', 300))
+MESSAGE_ANALYSIS_QUEUE = os.getenv('MESSAGE_ANALYSIS_QUEUE', '')
+# Messages per user compared in the analysis; their normalized matrices are cached this long (seconds)
+MESSAGE_ANALYSIS_MESSAGES = int(os.getenv('MESSAGE_ANALYSIS_MESSAGES', 20))
+MESSAGE_MATRIX_CACHE_SECONDS = int(os.getenv('MESSAGE_MATRIX_CACHE_SECONDS', 86400))
+# Besides profile neighbours, the analysis takes the MESSAGE_ANALYSIS_MESSAGE_CANDIDATES users whose messages
+# are closest to the user's in the message index, searching MESSAGE_ANALYSIS_MESSAGE_MATCHES per message for
+# the user's MESSAGE_ANALYSIS_MESSAGE_QUERIES latest messages (one index query each)
+MESSAGE_ANALYSIS_MESSAGE_CANDIDATES = int(os.getenv('MESSAGE_ANALYSIS_MESSAGE_CANDIDATES', 5))
+MESSAGE_ANALYSIS_MESSAGE_MATCHES = int(os.getenv('MESSAGE_ANALYSIS_MESSAGE_MATCHES', 10))
+MESSAGE_ANALYSIS_MESSAGE_QUERIES = int(os.getenv('MESSAGE_ANALYSIS_MESSAGE_QUERIES', 5))
+# ... plus the MESSAGE_ANALYSIS_TAG_CANDIDATES users sharing the most interest tags with them
+MESSAGE_ANALYSIS_TAG_CANDIDATES = int(os.getenv('MESSAGE_ANALYSIS_TAG_CANDIDATES', 5))
+
+# Embedding generation: profiles per embeddings API request and concurrent requests
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 100))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv('EMBEDDING_MAX_CONCURRENCY', 4))
+
+# Embeddings kept in the in-process LRU in front of the EmbeddingCacheEntry table (~6KB each)
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv('EMBEDDING_CACHE_MEMORY_SIZE', 5000))
+
 # Pinecone settings
 PINECONE_API_KEY = os.getenv('PINECONE_API_KEY')
 PINECONE_ENVIRONMENT = os.getenv('PINECONE_ENVIRONMENT')
 PINECONE_INDEX_NAME = os.getenv('PINECONE_INDEX_NAME')
+# Optional index host, saves the describe_index lookup when the index is first used
+PINECONE_INDEX_HOST = os.getenv('PINECONE_INDEX_HOST', '')
+
+# Vector store backend for similarity search:
+# 'pinecone', 'numpy' (in-process exact search, single process/development only: processes don't
+# share upserts) or 'hnsw' (in-process approximate search, synced between processes through its log)
+VECTOR_STORE_BACKEND = os.getenv('VECTOR_STORE_BACKEND', 'pinecone')
+
+# Message embeddings can use their own backend, e.g. 'quantized' to keep millions of messages in memory
+MESSAGE_VECTOR_STORE_BACKEND = os.getenv('MESSAGE_VECTOR_STORE_BACKEND', VECTOR_STORE_BACKEND)
+
+# Quantized store: 'int8' (per-vector scale, 4x smaller) or 'pq' (product quantization, PQ_SUBSPACES bytes
+# per vector); the best QUANTIZATION_RERANK_CANDIDATES are re-scored against full-precision vectors
+QUANTIZATION_METHOD = os.getenv('QUANTIZATION_METHOD', 'int8')
+QUANTIZATION_RERANK_CANDIDATES = int(os.getenv('QUANTIZATION_RERANK_CANDIDATES', 100))
+PQ_SUBSPACES = int(os.getenv('PQ_SUBSPACES', 96))
+PQ_TRAIN_SIZE = int(os.getenv('PQ_TRAIN_SIZE', 20000))
+
+# Loaders of full-precision vectors by vector id, used for exact re-ranking
+VECTOR_RERANK_LOADERS = {
+    'users': 'recommendations.embeddings.load_user_embeddings',
+    'messages': 'recommendations.embeddings.load_message_embeddings',
+    'user_recent': 'recommendations.user_vectors.load_recent_vectors',
+    'user_long_term': 'recommendations.user_vectors.load_long_term_vectors',
+}
+
+# Vectors per upsert request (Pinecone recommends at most 100 vectors of this size)
+VECTOR_UPSERT_BATCH_SIZE = int(os.getenv('VECTOR_UPSERT_BATCH_SIZE', 100))
+# Neighbours materialized per user in UserNeighbor, and how many nearest users of a changed
+# user are checked for whether it entered their top-k
+USER_NEIGHBOR_COUNT = int(os.getenv('USER_NEIGHBOR_COUNT', 20))
+USER_NEIGHBOR_PATCH_CANDIDATES = int(os.getenv('USER_NEIGHBOR_PATCH_CANDIDATES', 100))
+# Refreshes of more changed users than this skip the per-user patching and rebuild the whole table once
+USER_NEIGHBOR_PATCH_MAX_USERS = int(os.getenv('USER_NEIGHBOR_PATCH_MAX_USERS', 200))
+# Full neighbour rebuilds (build_user_neighbors --all-pairs): worker processes and the memory
+# budget (MB) for the score blocks they compute at once
+ALL_PAIRS_WORKERS = int(os.getenv('ALL_PAIRS_WORKERS', os.cpu_count() or 1))
+ALL_PAIRS_MEMORY_MB = int(os.getenv('ALL_PAIRS_MEMORY_MB', 1024))
+
+# Similar-user search candidates: active-user and per-user exclusion bitsets are cached this long
+# (seconds); RECOMMENDATION_ACTIVE_DAYS > 0 only suggests users seen within that many days
+ACTIVE_USERS_CACHE_SECONDS = int(os.getenv('ACTIVE_USERS_CACHE_SECONDS', 60))
+EXCLUSIONS_CACHE_SECONDS = int(os.getenv('EXCLUSIONS_CACHE_SECONDS', 300))
+RECOMMENDATION_ACTIVE_DAYS = int(os.getenv('RECOMMENDATION_ACTIVE_DAYS', 0))
+
+# Per-user interest tag ids are cached this long (seconds), saving the profile drops them
+INTEREST_TAGS_CACHE_SECONDS = int(os.getenv('INTEREST_TAGS_CACHE_SECONDS', 3600))
+
+# Multi-vector users: the recent-message centroid covers the last USER_RECENT_MESSAGES messages.
+# Fused search combines profile, recent and long-term similarities with these weights and
+# fetches top_k * USER_VECTOR_FUSION_OVERFETCH candidates from each index
+USER_RECENT_MESSAGES = int(os.getenv('USER_RECENT_MESSAGES', 20))
+USER_VECTOR_WEIGHTS = {
+    'profile': float(os.getenv('USER_VECTOR_WEIGHT_PROFILE', 0.5)),
+    'recent': float(os.getenv('USER_VECTOR_WEIGHT_RECENT', 0.3)),
+    'long_term': float(os.getenv('USER_VECTOR_WEIGHT_LONG_TERM', 0.2)),
+}
+USER_VECTOR_FUSION_OVERFETCH = int(os.getenv('USER_VECTOR_FUSION_OVERFETCH', 4))
+# Use fused (message-aware) search when generating recommendations
+RECOMMENDATION_FUSED_SEARCH = os.getenv('RECOMMENDATION_FUSED_SEARCH', 'false').lower() == 'true'
+
+# Upsert requests in flight during bulk writes to a remote vector store
+VECTOR_UPSERT_CONCURRENCY = int(os.getenv('VECTOR_UPSERT_CONCURRENCY', 4))
+
+# HNSW index settings (snapshot and append log per namespace are kept in HNSW_INDEX_DIR)
+HNSW_INDEX_DIR = os.getenv('HNSW_INDEX_DIR', os.path.join(BASE_DIR, 'vector_index'))
+HNSW_M = int(os.getenv('HNSW_M', 16))
+HNSW_EF_CONSTRUCTION = int(os.getenv('HNSW_EF_CONSTRUCTION', 200))
+HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', 64))
+HNSW_SNAPSHOT_EVERY = int(os.getenv('HNSW_SNAPSHOT_EVERY', 10000))
 
 # Celery settings
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
@@ -16,6 +16,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # select_for_update в SQLite ничего не блокирует: транзакции сразу берут блокировку записи,
+        # чтобы параллельные запросы генерации рекомендаций ждали друг друга, а не падали с "database is locked"
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
 }
 
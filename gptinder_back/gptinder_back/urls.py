@@ -23,6 +23,7 @@ from rest_framework.routers import DefaultRouter
 from users.views import UserViewSet, LoginView, LogoutView, ChangePasswordView
 from ai_chat.views import ChatViewSet
 from recommendations.views import UserRecommendationViewSet, UserChatViewSet, UserMessageViewSet
+from recommendations.streams import recommendation_stream
 
 # Create a router and register our viewsets
 router = DefaultRouter()
@@ -34,6 +35,8 @@ router.register(r'user-messages', UserMessageViewSet, basename='user-message')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Before the router, which would take 'stream' for a recommendation id
+    path('api/recommendations/stream/', recommendation_stream, name='recommendation-stream'),
     path('api/', include(router.urls)),
     path('api/login/', LoginView.as_view(), name='login'),
     path('api/logout/', LogoutView.as_view(), name='logout'),
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import UserRecommendation, UserChat, UserMessage
+from .models import (
+    UserRecommendation, UserChat, UserMessage, EmbeddingCacheEntry, UserNeighbor, ExplanationCacheEntry,
+    MessageAnalysisSchedule
+)
 
 class UserMessageInline(admin.TabularInline):
     model = UserMessage
@@ -43,3 +46,36 @@ class UserMessageAdmin(admin.ModelAdmin):
     def short_content(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     short_content.short_description = 'Content'
+
+
+@admin.register(EmbeddingCacheEntry)
+class EmbeddingCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'embedding_model', 'text_hash', 'created_at')
+    list_filter = ('embedding_model', 'created_at')
+    search_fields = ('text_hash',)
+    date_hierarchy = 'created_at'
+    readonly_fields = ('created_at',)
+    exclude = ('embedding',)
+
+
+@admin.register(UserNeighbor)
+class UserNeighborAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'neighbor', 'rank', 'score', 'embedding_version')
+    search_fields = ('user__username', 'neighbor__username')
+    raw_id_fields = ('user', 'neighbor')
+
+
+@admin.register(ExplanationCacheEntry)
+class ExplanationCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'candidate', 'kind', 'updated_at')
+    list_filter = ('kind',)
+    search_fields = ('user__username', 'candidate__username')
+    raw_id_fields = ('user', 'candidate')
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(MessageAnalysisSchedule)
+class MessageAnalysisScheduleAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'due_at', 'new_messages', 'last_analyzed_at')
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
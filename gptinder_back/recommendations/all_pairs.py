@@ -0,0 +1,161 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+
+from users.models import User
+from .models import UserNeighbor
+from .vector_store import EMBEDDING_DIMENSION
+
+
+# Bytes per score cell of a block: the float32 scores, their negation and argpartition's int64 indices
+BYTES_PER_SCORE = 16
+
+_worker_shm = None
+_worker_matrix = None
+
+
+def block_top_k(matrix, start, stop, k):
+    """
+    Top-k cosine neighbours of rows start:stop of a row-normalized matrix, among all rows.
+    Returns (indices, scores), both shaped (stop - start, k), best first; a row never lists itself.
+    """
+    scores = matrix[start:stop] @ matrix.T
+    rows = np.arange(stop - start)
+    scores[rows, rows + start] = -np.inf
+
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def block_size(n, workers, memory_budget):
+    """Rows per block so that the blocks being scored at once fit in memory_budget bytes"""
+    return max(1, int(memory_budget // (workers * n * BYTES_PER_SCORE)))
+
+
+def _attach_matrix(name, shape):
+    """Worker initializer: map the shared embedding matrix without copying it"""
+    global _worker_shm, _worker_matrix
+    # Forked workers share the parent's resource tracker, so the parent's unlink covers them
+    _worker_shm = shared_memory.SharedMemory(name=name)
+    _worker_matrix = np.ndarray(shape, dtype=np.float32, buffer=_worker_shm.buf)
+
+
+def _worker_block_top_k(start, stop, k):
+    return start, *block_top_k(_worker_matrix, start, stop, k)
+
+
+def load_embedding_matrix(buffer=None):
+    """
+    (user ids, embedding versions, matrix) of all users with embeddings. The normalized
+    float32 rows are written straight into buffer (a SharedMemory) when given.
+    """
+    users = User.objects.filter(embedding__isnull=False).order_by('id')
+    n = users.count()
+    if buffer is not None:
+        n = min(n, buffer.size // (EMBEDDING_DIMENSION * 4))
+        matrix = np.ndarray((n, EMBEDDING_DIMENSION), dtype=np.float32, buffer=buffer.buf)
+    else:
+        matrix = np.empty((n, EMBEDDING_DIMENSION), dtype=np.float32)
+
+    ids = np.empty(n, dtype=np.int64)
+    versions = [None] * n
+    rows = users.values_list('id', 'embedding_updated_at', 'embedding').iterator(chunk_size=2000)
+    count = 0
+    for user_id, version, embedding in rows:
+        # Users that got an embedding after the count wait for the next rebuild
+        if count == n:
+            break
+        ids[count] = user_id
+        versions[count] = version
+        matrix[count] = embedding
+        count += 1
+
+    matrix = matrix[:count]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return ids[:count], versions[:count], matrix
+
+
+def write_all_neighbors(ids, versions, blocks):
+    """Replace the whole UserNeighbor table with (start, indices, scores) blocks"""
+    batch_size = 5000
+    with transaction.atomic():
+        UserNeighbor.objects.all().delete()
+        batch = []
+        for start, indices, scores in blocks:
+            for offset, (row_indices, row_scores) in enumerate(zip(indices, scores)):
+                user_id = int(ids[start + offset])
+                version = versions[start + offset]
+                for rank, (index, score) in enumerate(zip(row_indices.tolist(), row_scores.tolist()), start=1):
+                    batch.append(UserNeighbor(
+                        user_id=user_id,
+                        neighbor_id=int(ids[index]),
+                        score=score,
+                        rank=rank,
+                        embedding_version=version
+                    ))
+            if len(batch) >= batch_size:
+                UserNeighbor.objects.bulk_create(batch, batch_size=batch_size)
+                batch = []
+        UserNeighbor.objects.bulk_create(batch, batch_size=batch_size)
+
+
+def rebuild_all_user_neighbors(workers=None, memory_budget=None, k=None):
+    """
+    Recompute every user's neighbour rows at once: all embeddings go into one normalized
+    float32 matrix and the top-k of each row comes from blocked matrix products, spread
+    over worker processes that share the matrix. Returns the number of users.
+    """
+    workers = workers or settings.ALL_PAIRS_WORKERS
+    memory_budget = memory_budget or settings.ALL_PAIRS_MEMORY_MB * 1024 * 1024
+    k = k or settings.USER_NEIGHBOR_COUNT
+
+    n = User.objects.filter(embedding__isnull=False).count()
+    if n < 2:
+        return n
+
+    if workers <= 1:
+        ids, versions, matrix = load_embedding_matrix()
+        k = min(k, len(ids) - 1)
+        size = block_size(len(ids), 1, memory_budget)
+        write_all_neighbors(ids, versions, (
+            (start, *block_top_k(matrix, start, min(start + size, len(ids)), k))
+            for start in range(0, len(ids), size)
+        ))
+        return len(ids)
+
+    shm = shared_memory.SharedMemory(create=True, size=n * EMBEDDING_DIMENSION * 4)
+    matrix = None
+    try:
+        ids, versions, matrix = load_embedding_matrix(shm)
+        k = min(k, len(ids) - 1)
+        size = block_size(len(ids), workers, memory_budget)
+        starts = list(range(0, len(ids), size))
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_attach_matrix,
+            initargs=(shm.name, matrix.shape)
+        ) as executor:
+            blocks = executor.map(
+                _worker_block_top_k,
+                starts,
+                [min(start + size, len(ids)) for start in starts],
+                [k] * len(starts)
+            )
+            write_all_neighbors(ids, versions, blocks)
+        return len(ids)
+    finally:
+        # Views of the buffer must be gone before it can be closed
+        matrix = None
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import MessageAnalysisSchedule
+
+
+def next_due_at(last_analyzed_at, new_messages):
+    """
+    A due-by schedule: a user is due once staleness x activity, (now - last_analyzed_at) *
+    (1 + new_messages), reaches one analysis interval. Every run takes the due users in
+    due_at order, so the order itself stays a static, indexable column; it isn't the order
+    of the current priorities. Users never analyzed are due right away.
+    """
+    if last_analyzed_at is None:
+        return timezone.now()
+    interval = timedelta(hours=settings.MESSAGE_ANALYSIS_INTERVAL_HOURS)
+    return last_analyzed_at + interval / (1 + new_messages)
+
+
+def schedule_users(user_ids):
+    """Add a schedule row, due right away, for those of user_ids that don't have one yet"""
+    now = timezone.now()
+    MessageAnalysisSchedule.objects.bulk_create(
+        [MessageAnalysisSchedule(user_id=user_id, due_at=now) for user_id in user_ids],
+        ignore_conflicts=True
+    )
+
+
+def pop_due_users(limit):
+    """
+    Ids of up to limit due users, earliest due_at first, read from the due_at index.
+    They are marked analyzed now, so the next run moves on to other users.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        schedules = list(
+            MessageAnalysisSchedule.objects.select_for_update(skip_locked=True)
+            .filter(due_at__lte=now)
+            .order_by('due_at')
+            .values_list('pk', 'user_id')[:limit]
+        )
+        MessageAnalysisSchedule.objects.filter(pk__in=[pk for pk, _ in schedules]).update(
+            last_analyzed_at=now,
+            new_messages=0,
+            due_at=next_due_at(now, 0)
+        )
+    return [user_id for _, user_id in schedules]
+
+
+def record_new_message(user_id):
+    """Count a new message towards the user's activity, bringing their next analysis forward"""
+    schedules = MessageAnalysisSchedule.objects.filter(user_id=user_id)
+    for attempt in range(3):
+        row = schedules.values_list('last_analyzed_at', 'new_messages').first()
+        if row is None:
+            schedule_users([user_id])
+            continue
+        # Only applied if no other message or analysis changed the row since it was read
+        last_analyzed_at, new_messages = row
+        if schedules.filter(last_analyzed_at=last_analyzed_at, new_messages=new_messages).update(
+            new_messages=new_messages + 1,
+            due_at=next_due_at(last_analyzed_at, new_messages + 1)
+        ):
+            return
+    # Still contended: count the message, its due_at follows with the next one
+    schedules.update(new_messages=F('new_messages') + 1)
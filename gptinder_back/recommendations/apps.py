@@ -6,10 +6,11 @@ class RecommendationsConfig(AppConfig):
     name = 'recommendations'
     
     def ready(self):
-        """Register periodic tasks when the app is ready"""
+        """Register signal handlers and periodic tasks when the app is ready"""
         # Import is here to avoid AppRegistryNotReady exception
         from django_celery_beat.models import PeriodicTask, IntervalSchedule
         import json
+        from . import signals  # noqa: F401
         
         # Create interval schedule if it doesn't exist
         schedule, created = IntervalSchedule.objects.get_or_create(
@@ -28,3 +29,20 @@ class RecommendationsConfig(AppConfig):
                 'description': 'Periodically analyzes message similarities between users with similar embeddings and creates recommendations if they might be useful to each other',
             },
         )
+        
+        # Re-embed users whose profile changed since their embedding was built
+        hourly_schedule, created = IntervalSchedule.objects.get_or_create(
+            every=1,
+            period=IntervalSchedule.HOURS,
+        )
+        
+        PeriodicTask.objects.get_or_create(
+            name='Refresh dirty user embeddings',
+            task='recommendations.tasks.refresh_dirty_user_embeddings',
+            interval=hourly_schedule,
+            kwargs=json.dumps({}),
+            defaults={
+                'enabled': True,
+                'description': 'Re-embeds only the users whose interests or bio changed since their embedding was last built',
+            },
+        )
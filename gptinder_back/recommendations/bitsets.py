@@ -0,0 +1,76 @@
+import numpy as np
+
+
+class IdBitset:
+    """
+    Set of non-negative integer ids stored as a bit array, one bit per id up to
+    the largest one: 100k user ids take 12.5KB. Works with `in`, so it can be
+    used as the value of '$in' / '$nin' filter conditions, and checks whole
+    arrays of ids at once with contains_many().
+    """
+
+    def __init__(self, bits=None):
+        self._bits = np.zeros(0, dtype=np.uint8) if bits is None else bits
+
+    @classmethod
+    def from_ids(cls, ids):
+        bitset = cls()
+        bitset.add_many(ids)
+        return bitset
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(np.frombuffer(data, dtype=np.uint8).copy())
+
+    def to_bytes(self):
+        return self._bits.tobytes()
+
+    def copy(self):
+        return IdBitset(self._bits.copy())
+
+    def add_many(self, ids):
+        ids = np.fromiter(ids, dtype=np.int64) if not isinstance(ids, np.ndarray) else ids.astype(np.int64)
+        if len(ids) == 0:
+            return
+        if ids.min() < 0:
+            raise ValueError("Ids must be non-negative")
+
+        required = int(ids.max() >> 3) + 1
+        if required > len(self._bits):
+            bits = np.zeros(required, dtype=np.uint8)
+            bits[:len(self._bits)] = self._bits
+            self._bits = bits
+        np.bitwise_or.at(self._bits, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+
+    def add(self, id):
+        self.add_many([id])
+
+    def contains_many(self, ids):
+        """Boolean mask telling which of ids are in the set"""
+        ids = np.asarray(ids, dtype=np.int64)
+        result = np.zeros(len(ids), dtype=bool)
+        valid = (ids >= 0) & ((ids >> 3) < len(self._bits))
+        valid_ids = ids[valid]
+        result[valid] = (self._bits[valid_ids >> 3] >> (valid_ids & 7)) & 1
+        return result
+
+    def __contains__(self, id):
+        if not isinstance(id, (int, np.integer)) or id < 0 or (id >> 3) >= len(self._bits):
+            return False
+        return bool((self._bits[id >> 3] >> (id & 7)) & 1)
+
+    def __or__(self, other):
+        size = max(len(self._bits), len(other._bits))
+        bits = np.zeros(size, dtype=np.uint8)
+        bits[:len(self._bits)] = self._bits
+        bits[:len(other._bits)] |= other._bits
+        return IdBitset(bits)
+
+    def __iter__(self):
+        return iter(np.flatnonzero(np.unpackbits(self._bits, bitorder='little')).tolist())
+
+    def __len__(self):
+        return int(np.unpackbits(self._bits).sum())
+
+    def __repr__(self):
+        return f"IdBitset({len(self)} ids)"
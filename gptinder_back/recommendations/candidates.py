@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from users.models import User
+from .bitsets import IdBitset
+from .models import UserRecommendation
+
+
+def _exclusions_key(user_id):
+    return f"user_exclusions:{user_id}"
+
+
+def excluded_user_ids(user_id):
+    """
+    Users that shouldn't be suggested to user_id again: already recommended to them
+    or already in a UserChat with them. Cached as a bitset, dropped when one of those
+    changes (and after EXCLUSIONS_CACHE_SECONDS, as caches may be per process).
+    """
+    data = cache.get(_exclusions_key(user_id))
+    if data is not None:
+        return IdBitset.from_bytes(data)
+
+    recommended = UserRecommendation.objects.filter(user_id=user_id).values_list(
+        'recommended_user_id', flat=True
+    )
+    chatted = User.objects.filter(user_chats__participants=user_id).values_list('id', flat=True)
+
+    bitset = IdBitset.from_ids(recommended.iterator())
+    bitset.add_many(chatted.iterator())
+    cache.set(_exclusions_key(user_id), bitset.to_bytes(), timeout=settings.EXCLUSIONS_CACHE_SECONDS)
+    return bitset
+
+
+def invalidate_excluded_user_ids(user_ids):
+    """Drop cached exclusion sets, called when recommendations or chats change"""
+    cache.delete_many([_exclusions_key(user_id) for user_id in user_ids])
+
+
+def active_user_ids(active_within=None):
+    """
+    Active users, optionally only those seen within the active_within timedelta.
+    Cached for ACTIVE_USERS_CACHE_SECONDS.
+    """
+    seconds = int(active_within.total_seconds()) if active_within else 0
+    key = f"active_users:{seconds}"
+    data = cache.get(key)
+    if data is not None:
+        return IdBitset.from_bytes(data)
+
+    users = User.objects.filter(is_active=True)
+    if active_within:
+        users = users.filter(last_activity__gte=timezone.now() - active_within)
+
+    bitset = IdBitset.from_ids(users.values_list('id', flat=True).iterator())
+    cache.set(key, bitset.to_bytes(), timeout=settings.ACTIVE_USERS_CACHE_SECONDS)
+    return bitset
+
+
+def candidate_filter(user_id, exclude_seen=False, active_within=None):
+    """
+    Vector store filter for users that can be suggested to user_id:
+    active (and seen within active_within, RECOMMENDATION_ACTIVE_DAYS by default),
+    not the user themself and, with exclude_seen, not already recommended to
+    or chatting with them. Being active is checked on the vectors' is_active
+    metadata; only a recency window needs the active-user bitset as '$in'.
+    """
+    if active_within is None and settings.RECOMMENDATION_ACTIVE_DAYS:
+        active_within = timedelta(days=settings.RECOMMENDATION_ACTIVE_DAYS)
+
+    excluded = excluded_user_ids(user_id) if exclude_seen else IdBitset()
+    excluded.add(user_id)
+    filter = {
+        'is_active': True,
+        'user_id': {'$nin': excluded}
+    }
+    if active_within:
+        filter['user_id']['$in'] = active_user_ids(active_within)
+    return filter
@@ -0,0 +1,54 @@
+import threading
+
+import httpx
+import openai
+import pinecone
+from django.conf import settings
+
+
+_lock = threading.Lock()
+_openai_client = None
+_pinecone_client = None
+
+
+def get_openai_client():
+    """
+    Process-wide OpenAI client.
+    Reusing it keeps HTTP connections (and their TLS sessions) alive between requests.
+    """
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                _openai_client = openai.OpenAI(
+                    api_key=settings.OPENAI_API_KEY,
+                    timeout=settings.OPENAI_TIMEOUT,
+                    max_retries=settings.OPENAI_MAX_RETRIES,
+                    http_client=openai.DefaultHttpxClient(
+                        limits=httpx.Limits(
+                            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                            max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+                        )
+                    ),
+                )
+    return _openai_client
+
+
+def get_pinecone_client():
+    """Process-wide Pinecone client"""
+    global _pinecone_client
+    if _pinecone_client is None:
+        with _lock:
+            if _pinecone_client is None:
+                _pinecone_client = pinecone.Pinecone(
+                    api_key=settings.PINECONE_API_KEY
+                )
+    return _pinecone_client
+
+
+def reset_clients():
+    """Drop cached clients, e.g. in a forked worker that must not share the parent's connections"""
+    global _openai_client, _pinecone_client
+    with _lock:
+        _openai_client = None
+        _pinecone_client = None
@@ -0,0 +1,125 @@
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import EmbeddingCacheEntry
+
+
+STATS_KEYS = ('memory_hits', 'db_hits', 'misses')
+
+
+def normalize_text(text):
+    """Canonical form of a text for embedding: NFC, collapsed whitespace"""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def increment_counters(prefix, counts):
+    """Add {name: value} to the '{prefix}:{name}' counters"""
+    # Counters live in the Django cache so every process reports into the same numbers
+    for name, value in counts.items():
+        if not value:
+            continue
+        key = f"{prefix}:{name}"
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            cache.set(key, value, timeout=None)
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (embedding model, hash of normalized text):
+    an in-process LRU in front of the EmbeddingCacheEntry table.
+    Texts passed in must already be normalized with normalize_text().
+    """
+
+    def __init__(self, max_memory_entries=None):
+        self.max_memory_entries = max_memory_entries or settings.EMBEDDING_CACHE_MEMORY_SIZE
+        # Vectors are kept as float32 arrays, a list of Python floats is ~8x larger
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _memory_get(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            return vector
+
+    def _memory_set(self, key, embedding):
+        vector = np.array(embedding, dtype=np.float32)
+        # Shared between callers, so it must not be modified in place
+        vector.setflags(write=False)
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_many(self, texts, embedding_model):
+        """Return {text: embedding} for every text found in the cache"""
+        found = {}
+        db_lookup = {}
+        for text in set(texts):
+            key = (embedding_model, text_hash(text))
+            vector = self._memory_get(key)
+            if vector is not None:
+                found[text] = vector
+            else:
+                db_lookup[key[1]] = text
+        memory_hits = len(found)
+
+        if db_lookup:
+            entries = EmbeddingCacheEntry.objects.filter(
+                embedding_model=embedding_model,
+                text_hash__in=list(db_lookup)
+            ).values_list('text_hash', 'embedding')
+            for hash_value, embedding in entries:
+                found[db_lookup[hash_value]] = embedding
+                self._memory_set((embedding_model, hash_value), embedding)
+
+        db_hits = len(found) - memory_hits
+        self._count(memory_hits=memory_hits, db_hits=db_hits, misses=len(db_lookup) - db_hits)
+        return found
+
+    def set_many(self, embeddings, embedding_model):
+        """Store {text: embedding} in both tiers"""
+        entries = []
+        for text, embedding in embeddings.items():
+            hash_value = text_hash(text)
+            self._memory_set((embedding_model, hash_value), embedding)
+            entries.append(EmbeddingCacheEntry(
+                embedding_model=embedding_model,
+                text_hash=hash_value,
+                embedding=embedding
+            ))
+        # Another worker may have stored the same text in the meantime
+        EmbeddingCacheEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+    def _count(self, **counts):
+        increment_counters('embedding_cache', counts)
+
+    def stats(self):
+        """Hit/miss counters plus the number of stored entries"""
+        stats = {name: cache.get(f"embedding_cache:{name}", 0) for name in STATS_KEYS}
+        lookups = sum(stats.values())
+        stats['hit_rate'] = (stats['memory_hits'] + stats['db_hits']) / lookups if lookups else 0.0
+        stats['memory_entries'] = len(self._memory)
+        stats['db_entries'] = EmbeddingCacheEntry.objects.count()
+        return stats
+
+    def reset_stats(self):
+        cache.delete_many([f"embedding_cache:{name}" for name in STATS_KEYS])
+
+
+embedding_cache = EmbeddingCache()
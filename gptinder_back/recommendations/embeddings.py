@@ -1,127 +1,465 @@
-import os
-import pinecone
-import openai
-import numpy as np
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
+from users.interests import common_interests
 from users.models import User
-from .models import UserRecommendation
+from ai_chat.models import Message
+from .models import ExplanationCacheEntry, UserRecommendation, UserVector
+from .all_pairs import rebuild_all_user_neighbors
+from .analysis_schedule import record_new_message, schedule_users
+from .clients import get_openai_client
+from .neighbors import (
+    get_user_neighbors, refresh_user_neighbors, search_neighbors, write_user_neighbors
+)
+from .embedding_cache import embedding_cache, normalize_text, text_hash
+from .explanation_cache import explanation_cache, explanation_key
+from .message_scoring import append_cached_message
+from .bitsets import IdBitset
+from .candidates import active_user_ids, candidate_filter, excluded_user_ids, invalidate_excluded_user_ids
+from .quantization import normalize_rows
+from .user_vectors import (
+    PROFILE, USER_VECTOR_NAMESPACES, add_message_to_vectors, compute_user_vectors,
+    load_long_term_vectors, load_recent_vectors, save_user_vectors, user_messages
+)
+from .vector_store import chunked, get_vector_store, matches_filter
+
+
+EMBEDDING_MODEL = "text-embedding-ada-002"  # Uses 1536 dimensions
+
+# Part of the explanation cache key, bump it when the explanation prompt changes
+EXPLANATION_PROMPT_VERSION = 1
+
+
+def request_embeddings(texts, model=EMBEDDING_MODEL):
+    """Embed texts with one OpenAI request, bypassing the cache"""
+    response = get_openai_client().embeddings.create(
+        model=model,
+        input=texts
+    )
+    # The API returns one item per input, tagged with its position
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def embed_texts(texts, model=EMBEDDING_MODEL):
+    """
+    Embed texts through the embedding cache.
+    Texts are normalized first, only cache misses are sent to OpenAI (in one request).
+    """
+    normalized = [normalize_text(text) for text in texts]
+    found = embedding_cache.get_many(normalized, model)
+    
+    missing = [text for text in dict.fromkeys(normalized) if text not in found]
+    if missing:
+        new_embeddings = dict(zip(missing, request_embeddings(missing, model)))
+        embedding_cache.set_many(new_embeddings, model)
+        found.update(new_embeddings)
+    
+    return [found[text] for text in normalized]
+
+
+def embed_text(text, model=EMBEDDING_MODEL):
+    """Embed a single text through the embedding cache"""
+    return embed_texts([text], model)[0]
+
+
+def profile_hash(user):
+    """Hash of the normalized profile text, stored with the embedding to detect profile edits"""
+    return text_hash(normalize_text(EmbeddingService.profile_text(user)))
+
+
+def load_user_embeddings(vector_ids):
+    """Full-precision user embeddings for vector ids like 'user:42'"""
+    user_ids = [int(vector_id.split(':', 1)[1]) for vector_id in vector_ids]
+    users = User.objects.filter(id__in=user_ids, embedding__isnull=False).values_list('id', 'embedding')
+    return {f"user:{user_id}": embedding for user_id, embedding in users}
+
+
+def load_message_embeddings(vector_ids):
+    """Full-precision message embeddings for vector ids like 'message:42'"""
+    message_ids = [int(vector_id.split(':', 1)[1]) for vector_id in vector_ids]
+    messages = Message.objects.filter(id__in=message_ids, embedding__isnull=False).values_list('id', 'embedding')
+    return {f"message:{message_id}": embedding for message_id, embedding in messages}
+
+
+# Full-precision vectors of each user vector kind, by vector id
+USER_VECTOR_LOADERS = {
+    PROFILE: load_user_embeddings,
+    UserVector.RECENT: load_recent_vectors,
+    UserVector.LONG_TERM: load_long_term_vectors,
+}
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service():
+    """
+    Return the process-wide EmbeddingService.
+    It is created on first use, so in-process vector stores are filled
+    from the database once per process instead of on every request.
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = EmbeddingService()
+    return _service
 
 
 class EmbeddingService:
     """Service for handling user embeddings"""
     
-    def __init__(self):
-        # Initialize Pinecone with new API
-        self.pc = pinecone.Pinecone(
-            api_key=settings.PINECONE_API_KEY
+    def __init__(self, vector_store=None, message_store=None):
+        # Vector store backend (Pinecone or in-process, see VECTOR_STORE_BACKEND)
+        self.vector_store = vector_store if vector_store is not None else get_vector_store('users')
+        self._message_store = message_store
+        self._user_vector_stores = {PROFILE: self.vector_store}
+        
+        # In-process stores start empty, fill them from the database
+        if self.vector_store.local:
+            self.vector_store.fill_if_empty(self.load_user_vectors)
+    
+    @property
+    def message_store(self):
+        """Vector store with embeddings of user-role AI chat messages"""
+        if self._message_store is None:
+            self._message_store = get_vector_store('messages')
+            if self._message_store.local:
+                self._message_store.fill_if_empty(self.load_message_vectors)
+        return self._message_store
+    
+    def load_user_vectors(self, batch_size=None):
+        """Load all stored user embeddings into the vector store"""
+        users = User.objects.filter(embedding__isnull=False).only(
+            'id', 'is_active', 'embedding'
+        )
+        return self.vector_store.upsert_many(
+            (self._user_vector(user, user.embedding) for user in users.iterator(chunk_size=1000)),
+            batch_size=batch_size
         )
+    
+    def load_message_vectors(self, batch_size=None):
+        """Load all stored message embeddings into the message vector store"""
+        messages = Message.objects.filter(
+            role='user',
+            embedding__isnull=False
+        ).values_list('id', 'chat__user_id', 'embedding')
         
-        # Get or create index
-        index_name = settings.PINECONE_INDEX_NAME
-        if index_name not in self.pc.list_indexes().names():
-            self.pc.create_index(
-                name=index_name,
-                dimension=1536,  # OpenAI embeddings dimension
-                metric='cosine'
-            )
+        return self.message_store.upsert_many(
+            (
+                self._message_vector(message_id, user_id, embedding)
+                for message_id, user_id, embedding in messages.iterator(chunk_size=1000)
+            ),
+            batch_size=batch_size
+        )
+    
+    @staticmethod
+    def _user_vector(user, embedding):
+        # Metadata only carries what queries filter on, profile text stays in the database
+        return {
+            'id': f"user:{user.id}",
+            'values': embedding,
+            'metadata': {
+                'user_id': user.id,
+                'is_active': user.is_active
+            }
+        }
+    
+    @staticmethod
+    def _message_vector(message_id, user_id, embedding):
+        return {
+            'id': f"message:{message_id}",
+            'values': embedding,
+            'metadata': {
+                'message_id': message_id,
+                'user_id': user_id
+            }
+        }
+    
+    def user_vector_store(self, kind):
+        """Vector store holding one kind of user vector ('profile', 'recent' or 'long_term')"""
+        if kind not in self._user_vector_stores:
+            store = get_vector_store(USER_VECTOR_NAMESPACES[kind])
+            self._user_vector_stores[kind] = store
+            if store.local:
+                store.fill_if_empty(lambda: self.load_message_centroids(kind))
+        return self._user_vector_stores[kind]
+    
+    def load_message_centroids(self, kind):
+        """Load stored message centroids of one kind into their vector store"""
+        vectors = UserVector.objects.filter(kind=kind).values_list('user_id', 'user__is_active', 'embedding')
+        return self.user_vector_store(kind).upsert_many(
+            self._centroid_vector(user_id, is_active, embedding)
+            for user_id, is_active, embedding in vectors.iterator(chunk_size=1000)
+        )
+    
+    @staticmethod
+    def _centroid_vector(user_id, is_active, embedding):
+        return {
+            'id': f"user:{user_id}",
+            'values': embedding,
+            'metadata': {
+                'user_id': user_id,
+                'is_active': is_active
+            }
+        }
+    
+    def index_message(self, message):
+        """
+        Add a user message with an embedding to the message vector store, fold it into
+        the author's message centroids and cached message matrix, and count it towards
+        their next message analysis
+        """
+        if message.role != 'user' or message.embedding is None:
+            return
+        user_id = message.chat.user_id
+        is_active = message.chat.user.is_active
+        self.message_store.upsert([
+            self._message_vector(message.id, user_id, message.embedding)
+        ])
         
-        # Connect to the index
-        self.index = self.pc.Index(index_name)
+        for kind, vector in add_message_to_vectors(user_id, message.embedding).items():
+            self.user_vector_store(kind).upsert([self._centroid_vector(user_id, is_active, vector)])
         
-        # Set up OpenAI
-        openai.api_key = settings.OPENAI_API_KEY
+        append_cached_message(user_id, message.content, message.embedding)
+        record_new_message(user_id)
+    
+    def sync_user_active(self, user):
+        """Re-upsert a user's vectors so their is_active metadata follows the user"""
+        if user.embedding is not None:
+            self.vector_store.upsert([self._user_vector(user, user.embedding)])
+        for kind, embedding in UserVector.objects.filter(user=user).values_list('kind', 'embedding'):
+            self.user_vector_store(kind).upsert([self._centroid_vector(user.id, user.is_active, embedding)])
+    
+    def rebuild_message_centroids(self):
+        """Recompute the message centroids of every user from their messages"""
+        messages = user_messages().iterator(chunk_size=1000)
+        active = active_user_ids()
+        
+        updated_count = 0
+        for chunk in chunked(compute_user_vectors(messages), settings.VECTOR_UPSERT_BATCH_SIZE):
+            for kind in USER_VECTOR_NAMESPACES:
+                if kind == PROFILE:
+                    continue
+                self.user_vector_store(kind).upsert_many(
+                    self._centroid_vector(user_id, user_id in active, vectors[kind][0])
+                    for user_id, vectors in chunk
+                )
+            for user_id, vectors in chunk:
+                save_user_vectors(user_id, vectors)
+            updated_count += len(chunk)
+        return updated_count
+    
+    @staticmethod
+    def profile_text(user):
+        """Text that represents a user profile for embedding"""
+        # Combine user interests and bio for embedding
+        return f"Interests: {user.interests}\nBio: {user.bio}"
     
     def generate_user_embedding(self, user):
         """Generate embedding for a user based on their interests and bio"""
-        # Combine user interests and bio for embedding
-        text_to_embed = f"Interests: {user.interests}\nBio: {user.bio}"
+        text_to_embed = self.profile_text(user)
         
         if not text_to_embed.strip():
             return None
         
+        # Profile unchanged since the stored embedding was built
+        if (user.embedding is not None and not user.embedding_dirty
+                and user.embedding_profile_hash == profile_hash(user)):
+            return user.embedding
+        
         try:
-            # Generate embedding using OpenAI
-            response = openai.embeddings.create(
-                model="text-embedding-ada-002",  # Uses 1536 dimensions
-                input=text_to_embed
-            )
-            embedding = response.data[0].embedding
+            # Generate embedding using OpenAI (or reuse it if the profile text was seen before)
+            embedding = embed_text(text_to_embed)
             
             # Update user model with embedding data
             user.embedding = embedding
             user.embedding_updated_at = timezone.now()
-            user.save(update_fields=['embedding', 'embedding_updated_at'])
+            user.embedding_profile_hash = profile_hash(user)
+            user.embedding_dirty = False
+            user.save(update_fields=[
+                'embedding', 'embedding_updated_at', 'embedding_profile_hash', 'embedding_dirty'
+            ])
             
-            # Store in Pinecone
-            self.index.upsert(
-                vectors=[{
-                    'id': f"user:{user.id}",
-                    'values': embedding,
-                    'metadata': {
-                        'user_id': user.id,
-                        'username': user.username,
-                        'interests': user.interests,
-                        'bio': user.bio
-                    }
-                }]
+            # Store in the vector store
+            self.vector_store.upsert(
+                vectors=[self._user_vector(user, embedding)]
             )
             
+            # Update the user's materialized neighbours and the lists the user entered or left
+            refresh_user_neighbors(self.vector_store, [user])
+            
+            # A user with an embedding takes part in the periodic message analysis
+            schedule_users([user.id])
+            
             return embedding
         except Exception as e:
             print(f"Error generating embedding: {e}")
             return None
     
-    def find_similar_users(self, user_id, top_k=10):
-        """Find users with similar interests to the given user"""
+    def find_similar_users(self, user_id, top_k=10, exclude_seen=False, active_within=None,
+                           fused=False, weights=None):
+        """
+        Find users with similar interests to the given user.
+        Only active users are returned (see candidate_filter for active_within);
+        exclude_seen also skips users already recommended to or chatting with the user.
+        fused ranks by profile and message centroid similarity combined (see fused_neighbors).
+        """
         target_user = User.objects.get(id=user_id)
         
         # Get or generate embedding for target user
-        if not target_user.embedding:
+        if target_user.embedding is None:
             embedding = self.generate_user_embedding(target_user)
-            if not embedding:
+            if embedding is None:
                 return []
         else:
             embedding = target_user.embedding
         
-        # Query Pinecone for similar users
-        query_response = self.index.query(
+        filter = candidate_filter(user_id, exclude_seen=exclude_seen, active_within=active_within)
+        neighbors = None
+        
+        if fused:
+            neighbors = self.fused_neighbors(user_id, embedding, top_k, filter, weights)
+        
+        # Materialized neighbours first, one indexed query
+        neighbor_count = settings.USER_NEIGHBOR_COUNT
+        if neighbors is None and top_k <= neighbor_count:
+            materialized = get_user_neighbors(target_user)
+            if materialized is None:
+                # Miss: materialize the unfiltered neighbours for next time
+                materialized = search_neighbors(self.vector_store, user_id, embedding, neighbor_count)
+                write_user_neighbors(user_id, target_user.embedding_updated_at, materialized)
+            
+            active = active_user_ids()
+            usable = [
+                (similar_user_id, score) for similar_user_id, score in materialized
+                if matches_filter({'user_id': similar_user_id, 'is_active': similar_user_id in active}, filter)
+            ]
+            if len(usable) >= top_k:
+                neighbors = usable[:top_k]
+        
+        if neighbors is None:
+            # Too few usable materialized neighbours: search with the filter applied inside the search
+            neighbors = search_neighbors(self.vector_store, user_id, embedding, top_k, filter=filter)
+        
+        return [
+            {
+                'user_id': similar_user_id,
+                'similarity_score': similarity_score,
+                'metadata': {'user_id': similar_user_id}
+            }
+            for similar_user_id, similarity_score in neighbors
+        ]
+    
+    def fused_neighbors(self, user_id, embedding, top_k, filter=None, weights=None):
+        """
+        Search the profile, recent-message and long-term-message indexes and fuse the scores:
+        a candidate's score is the weighted mean of its similarities over the vector kinds
+        both users have. Similarities a candidate lacks from one index's results are
+        computed exactly from stored vectors, so the fusion doesn't depend on which index
+        happened to return it. Returns [(user_id, score)] best first.
+        """
+        weights = weights or settings.USER_VECTOR_WEIGHTS
+        query_vectors = {PROFILE: embedding}
+        query_vectors.update(UserVector.objects.filter(user_id=user_id).values_list('kind', 'embedding'))
+        kinds = [kind for kind, weight in weights.items() if weight > 0 and kind in query_vectors]
+        
+        scores = {kind: {} for kind in kinds}
+        for kind in kinds:
+            matches = search_neighbors(
+                self.user_vector_store(kind), user_id, query_vectors[kind],
+                top_k * settings.USER_VECTOR_FUSION_OVERFETCH, filter=filter
+            )
+            scores[kind].update(matches)
+        
+        candidates = set().union(*scores.values())
+        for kind in kinds:
+            missing = [f"user:{candidate}" for candidate in candidates if candidate not in scores[kind]]
+            if not missing:
+                continue
+            query = normalize_rows(query_vectors[kind])[0]
+            for vector_id, values in USER_VECTOR_LOADERS[kind](missing).items():
+                scores[kind][int(vector_id.split(':', 1)[1])] = float(normalize_rows(values)[0] @ query)
+        
+        fused = []
+        for candidate in candidates:
+            available = [kind for kind in kinds if candidate in scores[kind]]
+            total_weight = sum(weights[kind] for kind in available)
+            fused.append((
+                candidate,
+                sum(weights[kind] * scores[kind][candidate] for kind in available) / total_weight
+            ))
+        fused.sort(key=lambda item: -item[1])
+        return fused[:top_k]
+    
+    def find_similar_messages(self, embedding, top_k=10, exclude_user_id=None, filter=None):
+        """Find user messages closest to the given embedding, optionally skipping one author"""
+        if filter is None and exclude_user_id is not None:
+            filter = {'user_id': {'$ne': exclude_user_id}}
+        matches = self.message_store.query(
             vector=embedding,
-            top_k=top_k + 1,  # +1 because we'll filter out the user themselves
+            top_k=top_k,
+            filter=filter,
             include_metadata=True
         )
         
-        # Filter out the user themselves and convert to list of user IDs
-        similar_users = []
-        for match in query_response['matches']:
-            match_id = match['id']
-            
-            # Skip if this is the target user
-            if match_id == f"user:{user_id}":
-                continue
-                
-            # Extract user ID from the ID string (format: "user:123")
-            if match_id.startswith('user:'):
-                similar_user_id = int(match_id.split(':', 1)[1])
-                similarity_score = match['score']
-                metadata = match['metadata']
-                
-                similar_users.append({
-                    'user_id': similar_user_id,
-                    'similarity_score': similarity_score,
-                    'metadata': metadata
-                })
+        return [
+            {
+                'message_id': match['metadata']['message_id'],
+                'user_id': match['metadata']['user_id'],
+                'similarity_score': match['score']
+            }
+            for match in matches
+        ]
+    
+    def find_users_by_messages(self, user_id, embeddings, top_k=10, exclude_seen=False):
+        """
+        Authors of the messages closest to any of embeddings (a user's own messages, newest first)
+        in the message index, as [(author_id, best message similarity)] best first. Only the first
+        MESSAGE_ANALYSIS_MESSAGE_QUERIES embeddings are searched, one index query each. Like
+        find_similar_users, only active users other than user_id, and with exclude_seen
+        not already recommended to or chatting with them.
+        """
+        excluded = excluded_user_ids(user_id) if exclude_seen else IdBitset()
+        excluded.add(user_id)
+        filter = {'user_id': {'$nin': excluded}}
+        active = active_user_ids()
         
-        return similar_users
+        best = {}
+        for embedding in embeddings[:settings.MESSAGE_ANALYSIS_MESSAGE_QUERIES]:
+            matches = self.find_similar_messages(
+                [float(value) for value in embedding],
+                top_k=settings.MESSAGE_ANALYSIS_MESSAGE_MATCHES,
+                filter=filter
+            )
+            for match in matches:
+                author_id = match['user_id']
+                if author_id in active and match['similarity_score'] > best.get(author_id, float('-inf')):
+                    best[author_id] = match['similarity_score']
+        
+        return sorted(best.items(), key=lambda item: -item[1])[:top_k]
     
-    def explain_similarity(self, user1, user2):
+    @staticmethod
+    def explanation_key(user1, user2):
+        """Explanation cache key: both profiles plus the prompt template version"""
+        return explanation_key(EXPLANATION_PROMPT_VERSION, profile_hash(user1), profile_hash(user2))
+    
+    @staticmethod
+    def request_explanation(user1, user2, timeout=None):
         """Generate an explanation of why two users are similar using OpenAI"""
         interests1 = user1.interests
         interests2 = user2.interests
         bio1 = user1.bio
         bio2 = user2.bio
         
+        # Bump EXPLANATION_PROMPT_VERSION when changing the prompt
         prompt = f"""
         I need to explain why these two people might be a good match for a conversation.
         
@@ -140,72 +478,266 @@ class EmbeddingService:
         Example format: "Hey [Person 1 name], [Person 2 name] is also into [specific shared interest]. They're currently working on [something relevant], maybe you two could chat about it!"
         """
         
+        response = get_openai_client().chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": "You are a friendly AI helping to explain why two people might enjoy talking to each other."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=100,
+            temperature=0.7,
+            **({'timeout': timeout} if timeout is not None else {})
+        )
+        
+        return response.choices[0].message.content.strip()
+    
+    @staticmethod
+    def fallback_explanation(user2):
+        """Generic explanation used when OpenAI fails or is too slow"""
+        return f"{user2.first_name or user2.username} seems to share similar interests with you!"
+    
+    def explain_many(self, user1, users, on_explained=None):
+        """
+        Explanations of why user1 might like each of users, as {user_id: explanation}.
+        Cached explanations are reused; the rest are generated with up to
+        EXPLANATION_MAX_CONCURRENCY calls at once, and those not ready within
+        EXPLANATION_DEADLINE seconds get the (uncached) fallback text.
+        on_explained(user_id, explanation) is called, in this thread, as each one is ready.
+        """
+        if not users:
+            return {}
+        
+        keys = {user2.id: self.explanation_key(user1, user2) for user2 in users}
+        explanations = explanation_cache.get_many(ExplanationCacheEntry.PROFILE, user1.id, keys)
+        if on_explained:
+            for user_id, explanation in explanations.items():
+                on_explained(user_id, explanation)
+        missing = [user2 for user2 in users if user2.id not in explanations]
+        if not missing:
+            return explanations
+        
+        deadline = settings.EXPLANATION_DEADLINE
+        executor = ThreadPoolExecutor(
+            max_workers=min(settings.EXPLANATION_MAX_CONCURRENCY, len(missing))
+        )
+        futures = {
+            executor.submit(self.request_explanation, user1, user2, timeout=deadline): user2
+            for user2 in missing
+        }
+        generated = {}
         try:
-            response = openai.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a friendly AI helping to explain why two people might enjoy talking to each other."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=100,
-                temperature=0.7
-            )
-            
-            explanation = response.choices[0].message.content.strip()
-            return explanation
-        except Exception as e:
-            print(f"Error generating explanation: {e}")
-            return f"{user2.first_name or user2.username} seems to share similar interests with you!"
+            for future in as_completed(futures, timeout=deadline):
+                user2 = futures[future]
+                try:
+                    explanation = generated[user2.id] = future.result()
+                except Exception as e:
+                    print(f"Error generating explanation: {e}")
+                    explanation = self.fallback_explanation(user2)
+                explanations[user2.id] = explanation
+                if on_explained:
+                    on_explained(user2.id, explanation)
+        except FuturesTimeoutError:
+            pass
+        finally:
+            # Don't wait for late calls, their per-request timeout ends them soon enough
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        late = [user2 for user2 in missing if user2.id not in explanations]
+        if late:
+            print(f"Explanation deadline exceeded for {len(late)} of {len(missing)} users")
+        for user2 in late:
+            explanations[user2.id] = self.fallback_explanation(user2)
+            if on_explained:
+                on_explained(user2.id, explanations[user2.id])
+        
+        explanation_cache.set_many(ExplanationCacheEntry.PROFILE, user1.id, generated, keys)
+        return explanations
 
-    def update_all_user_embeddings(self):
-        """Update embeddings for all users"""
-        users = User.objects.all()
+    @staticmethod
+    def _request_embeddings_safe(texts):
+        """Worker thread part of a batch: only the API call, no database access"""
+        try:
+            return dict(zip(texts, request_embeddings(texts)))
+        except Exception as e:
+            print(f"Error generating embeddings for {len(texts)} profiles: {e}")
+            return None
+    
+    def update_all_user_embeddings(self, batch_size=None, max_concurrency=None, neighbor_workers=None):
+        """Update embeddings for all users (full rebuild)"""
+        return self._update_user_embeddings(
+            User.objects.all(), batch_size, max_concurrency,
+            patch_neighbors=False, neighbor_workers=neighbor_workers
+        )
+    
+    def update_dirty_user_embeddings(self, batch_size=None, max_concurrency=None, neighbor_workers=None):
+        """Update embeddings only for users whose profile changed since their embedding was built"""
+        users = User.objects.filter(embedding_dirty=True)
+        return self._update_user_embeddings(
+            users, batch_size, max_concurrency,
+            patch_neighbors=users.count() <= settings.USER_NEIGHBOR_PATCH_MAX_USERS,
+            neighbor_workers=neighbor_workers
+        )
+    
+    def _update_user_embeddings(self, users, batch_size=None, max_concurrency=None,
+                                patch_neighbors=True, neighbor_workers=None):
+        """
+        Profiles are streamed from the database and embedded batch_size per API request,
+        with up to max_concurrency requests in flight. Results are written back with
+        bulk_update and upserted to the vector store in chunks.
+        Neighbour lists are patched per batch when patch_neighbors is set; otherwise the
+        whole table is rebuilt once at the end (see all_pairs), which is far cheaper when
+        many users changed.
+        """
+        batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        max_concurrency = max_concurrency or settings.EMBEDDING_MAX_CONCURRENCY
+        
+        users = users.only('id', 'is_active', 'interests', 'bio').order_by('id')
+        batches = chunked(users.iterator(chunk_size=batch_size), batch_size)
         updated_count = 0
         
-        for user in users:
-            if self.generate_user_embedding(user):
-                updated_count += 1
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            # Keep a bounded number of batches in flight so memory stays flat
+            pending = deque()
+            for batch in batches:
+                texts = [normalize_text(self.profile_text(user)) for user in batch]
+                found = embedding_cache.get_many(texts, EMBEDDING_MODEL)
+                missing = [text for text in dict.fromkeys(texts) if text not in found]
+                future = executor.submit(self._request_embeddings_safe, missing) if missing else None
+                pending.append((batch, texts, found, future))
+                
+                if len(pending) >= max_concurrency * 2:
+                    updated_count += self._finish_batch(*pending.popleft(), patch_neighbors)
+            while pending:
+                updated_count += self._finish_batch(*pending.popleft(), patch_neighbors)
+        
+        if updated_count and not patch_neighbors:
+            rebuild_all_user_neighbors(workers=neighbor_workers)
         
         return updated_count
     
-    def generate_recommendations(self, user_id):
-        """Generate recommendations for a user and save them to the database"""
+    def _finish_batch(self, users, texts, found, future, patch_neighbors=True):
+        """Collect a batch's API result and persist it on the calling thread"""
+        if future is not None:
+            new_embeddings = future.result()
+            if new_embeddings is None:
+                return 0
+            embedding_cache.set_many(new_embeddings, EMBEDDING_MODEL)
+            found.update(new_embeddings)
+        
+        return self._store_user_embeddings(users, texts, [found[text] for text in texts], patch_neighbors)
+    
+    def _store_user_embeddings(self, users, texts, embeddings, patch_neighbors=True):
+        """Write a batch of new embeddings to the database and the vector store"""
+        if not embeddings:
+            return 0
+        
+        now = timezone.now()
+        for user, text, embedding in zip(users, texts, embeddings):
+            user.embedding = embedding
+            user.embedding_updated_at = now
+            user.embedding_profile_hash = text_hash(text)
+            user.embedding_dirty = False
+        User.objects.bulk_update(
+            users, ['embedding', 'embedding_updated_at', 'embedding_profile_hash', 'embedding_dirty']
+        )
+        
+        # Profiles edited while the batch was being embedded stay dirty for the next run
+        hashes = {user.id: user.embedding_profile_hash for user in users}
+        current = User.objects.filter(id__in=hashes).only('id', 'interests', 'bio')
+        edited = [user.id for user in current if profile_hash(user) != hashes[user.id]]
+        if edited:
+            User.objects.filter(id__in=edited).update(embedding_dirty=True)
+        
+        self.vector_store.upsert_many(self._user_vector(user, user.embedding) for user in users)
+        if patch_neighbors:
+            refresh_user_neighbors(self.vector_store, users)
+        schedule_users([user.id for user in users])
+        
+        return len(users)
+    
+    def generate_recommendations(self, user_id, progress=None, on_recommendation=None, on_explained=None):
+        """
+        Generate recommendations for a user and save them to the database.
+        Existing rows are diffed against the new matches: dropped pairs are deleted,
+        new pairs inserted and kept pairs only get a fresh score, so their explanation
+        and is_viewed survive. The change is applied in one transaction.
+        Hooks, all called in this thread:
+        - progress(**counts) with the stage and partial counts as work advances;
+        - on_recommendation(recommendation) with each (unsaved) row once it is scored;
+        - on_explained(recommended_user_id, explanation) as each new explanation is ready.
+        """
+        progress = progress or (lambda **counts: None)
+        progress(stage='searching')
+        
         # Find similar users
-        similar_users = self.find_similar_users(user_id)
+        similar_users = self.find_similar_users(user_id, fused=settings.RECOMMENDATION_FUSED_SEARCH)
         target_user = User.objects.get(id=user_id)
         
-        # Clear existing recommendations
-        UserRecommendation.objects.filter(user_id=user_id).delete()
+        scores = {
+            similar['user_id']: similar['similarity_score']
+            for similar in similar_users
+            if similar['user_id'] != user_id
+        }
+        matched_users = User.objects.defer('embedding').in_bulk(list(scores))
+        existing = {
+            recommendation.recommended_user_id: recommendation
+            for recommendation in UserRecommendation.objects.filter(user_id=user_id).only(
+                'id', 'recommended_user_id', 'explanation'
+            )
+        }
         
-        # Create new recommendations
-        for similar in similar_users:
-            similar_user_id = similar['user_id']
-            similarity_score = similar['similarity_score']
-            
-            try:
-                similar_user = User.objects.get(id=similar_user_id)
-                
-                # Skip if users are the same (shouldn't happen, but just in case)
-                if similar_user_id == user_id:
-                    continue
-                
-                # Generate explanation
-                explanation = self.explain_similarity(target_user, similar_user)
-                
-                # Extract common interests (basic method, can be improved)
-                user_interests = set(i.strip().lower() for i in target_user.interests.split(',') if i.strip())
-                similar_interests = set(i.strip().lower() for i in similar_user.interests.split(',') if i.strip())
-                common_interests = list(user_interests.intersection(similar_interests))
-                
-                # Create recommendation
-                UserRecommendation.objects.create(
-                    user=target_user,
-                    recommended_user=similar_user,
-                    similarity_score=similarity_score,
-                    common_interests=common_interests,
-                    explanation=explanation
-                )
-            except User.DoesNotExist:
+        shared_interests = common_interests(user_id, list(matched_users))
+        recommendations = {}
+        for similar_user_id, similarity_score in scores.items():
+            similar_user = matched_users.get(similar_user_id)
+            if similar_user is None:
                 print(f"User with ID {similar_user_id} not found")
+                continue
+            
+            current = existing.get(similar_user_id)
+            recommendation = recommendations[similar_user_id] = UserRecommendation(
+                user_id=user_id,
+                recommended_user=similar_user,
+                similarity_score=similarity_score,
+                common_interests=shared_interests[similar_user_id],
+                explanation=current.explanation if current is not None else None
+            )
+            if on_recommendation:
+                on_recommendation(recommendation)
+        
+        # Explain new pairs concurrently, outside the transaction
+        to_explain = [
+            recommendation.recommended_user
+            for recommendation in recommendations.values()
+            if not recommendation.explanation
+        ]
+        progress(stage='explaining', candidates_found=len(recommendations), explanations_total=len(to_explain))
+        explained = []
+        
+        def explanation_ready(similar_user_id, explanation):
+            recommendations[similar_user_id].explanation = explanation
+            explained.append(similar_user_id)
+            progress(explanations_done=len(explained))
+            if on_explained:
+                on_explained(similar_user_id, explanation)
+        
+        self.explain_many(target_user, to_explain, on_explained=explanation_ready)
+        recommendations = list(recommendations.values())
+        
+        progress(stage='saving')
+        with transaction.atomic():
+            UserRecommendation.objects.filter(user_id=user_id).exclude(
+                recommended_user_id__in=[r.recommended_user_id for r in recommendations]
+            ).delete()
+            UserRecommendation.objects.bulk_create(
+                recommendations,
+                update_conflicts=True,
+                unique_fields=['user', 'recommended_user'],
+                # Kept pairs carry their stored explanation, only empty ones were regenerated
+                update_fields=['similarity_score', 'common_interests', 'explanation']
+            )
+        
+        # bulk_create sends no post_save signals
+        invalidate_excluded_user_ids([user_id])
         
-        return UserRecommendation.objects.filter(user_id=user_id).count() 
\ No newline at end of file
+        return len(recommendations)
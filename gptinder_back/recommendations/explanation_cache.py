@@ -0,0 +1,73 @@
+from django.core.cache import cache
+
+from .embedding_cache import increment_counters, text_hash
+from .models import ExplanationCacheEntry
+
+
+STATS_KEYS = ('hits', 'misses')
+
+
+def explanation_key(prompt_version, *parts):
+    """Hash of the inputs of an explanation prompt: template version plus profile hashes etc."""
+    return text_hash('\n'.join([str(prompt_version), *parts]))
+
+
+class ExplanationCache:
+    """
+    Generated explanations in the ExplanationCacheEntry table, one per (user, candidate, kind).
+    An entry is reused only while its key still matches (see explanation_key), so editing
+    either profile or bumping the prompt version invalidates it; the next explanation
+    generated for the pair replaces it.
+    """
+
+    def get_many(self, kind, user_id, keys):
+        """keys is {candidate_id: key}, returns {candidate_id: explanation} for valid entries"""
+        if not keys:
+            return {}
+
+        entries = ExplanationCacheEntry.objects.filter(
+            user_id=user_id,
+            kind=kind,
+            candidate_id__in=list(keys)
+        ).values_list('candidate_id', 'key_hash', 'explanation')
+        found = {
+            candidate_id: explanation
+            for candidate_id, key_hash, explanation in entries
+            if keys[candidate_id] == key_hash
+        }
+
+        increment_counters('explanation_cache', {'hits': len(found), 'misses': len(keys) - len(found)})
+        return found
+
+    def set_many(self, kind, user_id, explanations, keys):
+        """Store {candidate_id: explanation} generated from the inputs in keys"""
+        ExplanationCacheEntry.objects.bulk_create(
+            [
+                ExplanationCacheEntry(
+                    user_id=user_id,
+                    candidate_id=candidate_id,
+                    kind=kind,
+                    key_hash=keys[candidate_id],
+                    explanation=explanation
+                )
+                for candidate_id, explanation in explanations.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'candidate', 'kind'],
+            update_fields=['key_hash', 'explanation', 'updated_at']
+        )
+
+    def stats(self):
+        """Hit/miss counters; every hit is an LLM call saved"""
+        stats = {name: cache.get(f"explanation_cache:{name}", 0) for name in STATS_KEYS}
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['llm_calls_saved'] = stats['hits']
+        stats['entries'] = ExplanationCacheEntry.objects.count()
+        return stats
+
+    def reset_stats(self):
+        cache.delete_many([f"explanation_cache:{name}" for name in STATS_KEYS])
+
+
+explanation_cache = ExplanationCache()
@@ -0,0 +1,276 @@
+import heapq
+import json
+import math
+import os
+
+import numpy as np
+
+
+class HNSWIndex:
+    """
+    Hierarchical Navigable Small World graph for approximate cosine search.
+    Vectors are normalized on insert, similarity is the dot product.
+    Deleted vectors stay in the graph as tombstones so the graph remains
+    navigable; they are skipped in results and dropped by compact().
+    """
+
+    def __init__(self, dimension, M=16, ef_construction=200, ef_search=64, seed=None):
+        self.dimension = dimension
+        self.M = M
+        self.max_links_level0 = 2 * M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._level_multiplier = 1 / math.log(max(M, 2))
+        self._rng = np.random.default_rng(seed)
+
+        self._vectors = np.zeros((1024, dimension), dtype=np.float32)
+        self._labels = []
+        self._levels = []
+        self._links = []
+        self._label_to_node = {}
+        self._deleted = set()
+        self._entry_point = None
+        self._max_level = -1
+
+    def __len__(self):
+        return len(self._label_to_node)
+
+    def __contains__(self, label):
+        return label in self._label_to_node
+
+    @property
+    def tombstones(self):
+        return len(self._deleted)
+
+    def _grow(self, required):
+        capacity = self._vectors.shape[0]
+        if required <= capacity:
+            return
+        while capacity < required:
+            capacity *= 2
+        vectors = np.zeros((capacity, self.dimension), dtype=np.float32)
+        vectors[:len(self._labels)] = self._vectors[:len(self._labels)]
+        self._vectors = vectors
+
+    @staticmethod
+    def _normalize(values):
+        vector = np.asarray(values, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        return vector
+
+    def _search_layer(self, query, entry_points, ef, level, accept=None):
+        """
+        Best-first search on one layer. Returns a min-heap of (similarity, node).
+        Nodes rejected by accept are still traversed but never returned.
+        """
+        visited = set(entry_points)
+        similarities = (self._vectors[entry_points] @ query).tolist()
+
+        candidates = [(-similarity, node) for similarity, node in zip(similarities, entry_points)]
+        heapq.heapify(candidates)
+        results = [
+            (similarity, node) for similarity, node in zip(similarities, entry_points)
+            if accept is None or accept(node)
+        ]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative_similarity, node = heapq.heappop(candidates)
+            if len(results) >= ef and -negative_similarity < results[0][0]:
+                break
+
+            neighbours = [n for n in self._links[node][level] if n not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+
+            for similarity, neighbour in zip((self._vectors[neighbours] @ query).tolist(), neighbours):
+                if len(results) < ef or similarity > results[0][0]:
+                    heapq.heappush(candidates, (-similarity, neighbour))
+                    if accept is None or accept(neighbour):
+                        heapq.heappush(results, (similarity, neighbour))
+                        if len(results) > ef:
+                            heapq.heappop(results)
+
+        return results
+
+    def _select_neighbours(self, candidates, max_links):
+        """
+        Neighbour selection heuristic from the HNSW paper: prefer candidates
+        that are closer to the new node than to any already selected neighbour,
+        then fill up with the closest pruned ones.
+        """
+        ordered = sorted(candidates, reverse=True)
+        selected = []
+        pruned = []
+        for similarity, node in ordered:
+            if len(selected) >= max_links:
+                break
+            if selected and np.any(self._vectors[selected] @ self._vectors[node] > similarity):
+                pruned.append(node)
+            else:
+                selected.append(node)
+
+        for node in pruned:
+            if len(selected) >= max_links:
+                break
+            selected.append(node)
+        return selected
+
+    def _greedy_descend(self, query, level_from, level_to):
+        entry_point = self._entry_point
+        for level in range(level_from, level_to, -1):
+            entry_point = max(self._search_layer(query, [entry_point], 1, level))[1]
+        return entry_point
+
+    def add(self, label, values):
+        """Insert a vector, replacing any vector stored under the same label"""
+        if label in self._label_to_node:
+            self.delete(label)
+
+        vector = self._normalize(values)
+        node = len(self._labels)
+        self._grow(node + 1)
+        self._vectors[node] = vector
+
+        level = int(-math.log(1.0 - self._rng.random()) * self._level_multiplier)
+        self._labels.append(label)
+        self._levels.append(level)
+        self._links.append([[] for _ in range(level + 1)])
+        self._label_to_node[label] = node
+
+        if self._entry_point is None:
+            self._entry_point = node
+            self._max_level = level
+            return
+
+        entry_point = self._greedy_descend(vector, self._max_level, level)
+        entry_points = [entry_point]
+        for current_level in range(min(level, self._max_level), -1, -1):
+            candidates = self._search_layer(vector, entry_points, self.ef_construction, current_level)
+            max_links = self.max_links_level0 if current_level == 0 else self.M
+
+            neighbours = self._select_neighbours(candidates, self.M)
+            self._links[node][current_level] = neighbours
+
+            # Link back, shrinking neighbour lists that overflow
+            for neighbour in neighbours:
+                links = self._links[neighbour][current_level]
+                links.append(node)
+                if len(links) > max_links:
+                    similarities = (self._vectors[links] @ self._vectors[neighbour]).tolist()
+                    self._links[neighbour][current_level] = self._select_neighbours(
+                        list(zip(similarities, links)), max_links
+                    )
+
+            entry_points = [n for _, n in candidates] or entry_points
+
+        if level > self._max_level:
+            self._entry_point = node
+            self._max_level = level
+
+    def delete(self, label):
+        """Mark the vector stored under label as deleted"""
+        node = self._label_to_node.pop(label, None)
+        if node is not None:
+            self._deleted.add(node)
+
+    def search(self, values, k=10, ef=None, accept=None):
+        """
+        Return up to k (label, similarity) pairs, best first.
+        accept is an optional predicate on labels applied inside the search.
+        """
+        if self._entry_point is None or k <= 0:
+            return []
+
+        query = self._normalize(values)
+        ef = max(ef or self.ef_search, k)
+
+        if accept is None:
+            node_accept = lambda node: node not in self._deleted
+        else:
+            node_accept = lambda node: node not in self._deleted and accept(self._labels[node])
+
+        entry_point = self._greedy_descend(query, self._max_level, 0)
+        results = self._search_layer(query, [entry_point], ef, 0, accept=node_accept)
+        return [
+            (self._labels[node], similarity)
+            for similarity, node in heapq.nlargest(k, results)
+        ]
+
+    def compact(self):
+        """Rebuild the graph without tombstones"""
+        live = sorted(self._label_to_node.items(), key=lambda item: item[1])
+        vectors = self._vectors[[node for _, node in live]].copy()
+
+        self.__init__(self.dimension, self.M, self.ef_construction, self.ef_search)
+        for (label, _), vector in zip(live, vectors):
+            self.add(label, vector)
+
+    def save(self, path, **extra):
+        """Write a snapshot of the graph (plus any extra arrays) to path atomically"""
+        size = len(self._labels)
+        link_counts = []
+        link_data = []
+        for node_links in self._links:
+            for level_links in node_links:
+                link_counts.append(len(level_links))
+                link_data.extend(level_links)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                vectors=self._vectors[:size],
+                levels=np.asarray(self._levels, dtype=np.int32),
+                link_counts=np.asarray(link_counts, dtype=np.int32),
+                link_data=np.asarray(link_data, dtype=np.int32),
+                deleted=np.asarray(sorted(self._deleted), dtype=np.int64),
+                labels=np.asarray(json.dumps(self._labels)),
+                params=np.asarray([
+                    self.dimension, self.M, self.ef_construction, self.ef_search,
+                    -1 if self._entry_point is None else self._entry_point, self._max_level
+                ], dtype=np.int64),
+                **extra
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, ef_search=None):
+        """Load a snapshot written by save()"""
+        with np.load(path) as data:
+            dimension, M, ef_construction, saved_ef_search, entry_point, max_level = data['params'].tolist()
+            index = cls(dimension, M, ef_construction, ef_search or saved_ef_search)
+
+            vectors = data['vectors']
+            index._grow(len(vectors))
+            index._vectors[:len(vectors)] = vectors
+            index._labels = json.loads(str(data['labels']))
+            index._levels = data['levels'].tolist()
+            index._deleted = set(data['deleted'].tolist())
+
+            link_counts = data['link_counts'].tolist()
+            link_data = data['link_data'].tolist()
+
+        position = 0
+        count_index = 0
+        for level in index._levels:
+            node_links = []
+            for _ in range(level + 1):
+                count = link_counts[count_index]
+                node_links.append(link_data[position:position + count])
+                position += count
+                count_index += 1
+            index._links.append(node_links)
+
+        index._label_to_node = {
+            label: node for node, label in enumerate(index._labels)
+            if node not in index._deleted
+        }
+        index._entry_point = None if entry_point < 0 else entry_point
+        index._max_level = max_level
+        return index
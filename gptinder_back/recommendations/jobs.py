@@ -0,0 +1,96 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import User
+from .embeddings import get_embedding_service
+from .models import RecommendationJob
+
+
+def start_recommendation_job(user):
+    """
+    The user's active RecommendationJob, or a new pending one: returns (job, created).
+    Jobs older than RECOMMENDATION_JOB_TIMEOUT are considered lost and not reused.
+    The caller runs a created job (see run_recommendation_job).
+    """
+    with transaction.atomic():
+        # Lock the user row so concurrent requests agree on one job
+        User.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True).first()
+        job = RecommendationJob.objects.filter(
+            user=user,
+            status__in=RecommendationJob.ACTIVE_STATUSES,
+            created_at__gte=timezone.now() - timedelta(seconds=settings.RECOMMENDATION_JOB_TIMEOUT)
+        ).first()
+        if job is not None:
+            return job, False
+        return RecommendationJob.objects.create(user=user), True
+
+
+def run_recommendation_job(job_id, on_recommendation=None, on_explained=None):
+    """
+    Run a RecommendationJob: refresh the user's embedding, then regenerate their
+    recommendations, recording the stage and partial counts on the job as it goes.
+    on_recommendation and on_explained are passed to generate_recommendations.
+    Returns False if the job was already claimed by another runner.
+    """
+    # Claiming the job atomically keeps a redelivered task from running it twice
+    if not RecommendationJob.objects.filter(id=job_id, status=RecommendationJob.PENDING).update(
+        status=RecommendationJob.RUNNING, stage='embedding', updated_at=timezone.now()
+    ):
+        return False
+    job = RecommendationJob.objects.select_related('user').get(id=job_id)
+    
+    def progress(**fields):
+        RecommendationJob.objects.filter(id=job_id).update(updated_at=timezone.now(), **fields)
+    
+    def finish(status, **fields):
+        progress(status=status, stage='', finished_at=timezone.now(), **fields)
+    
+    embedding_service = get_embedding_service()
+    try:
+        if embedding_service.generate_user_embedding(job.user) is None:
+            finish(
+                RecommendationJob.FAILED,
+                detail="Couldn't generate embeddings for your profile. Please add more information to your interests and bio."
+            )
+            return True
+        
+        count = embedding_service.generate_recommendations(
+            job.user_id,
+            progress=progress,
+            on_recommendation=on_recommendation,
+            on_explained=on_explained
+        )
+    except Exception as e:
+        print(f"Error generating recommendations for user {job.user_id}: {e}")
+        finish(RecommendationJob.FAILED, detail=f"Error generating recommendations: {str(e)}")
+        return True
+    
+    finish(
+        RecommendationJob.SUCCEEDED,
+        recommendations_count=count,
+        detail='' if count else "No recommendations found. Try adding more to your interests and bio."
+    )
+    return True
+
+
+def wait_for_job(job_id, on_progress=None, poll_interval=0.5):
+    """
+    Block until a job run elsewhere finishes, calling on_progress(job) whenever it changes.
+    Returns the finished job, or None once RECOMMENDATION_JOB_TIMEOUT has passed.
+    """
+    deadline = time.monotonic() + settings.RECOMMENDATION_JOB_TIMEOUT
+    last_update = None
+    while time.monotonic() < deadline:
+        job = RecommendationJob.objects.get(id=job_id)
+        if job.updated_at != last_update:
+            last_update = job.updated_at
+            if on_progress:
+                on_progress(job)
+        if job.status not in RecommendationJob.ACTIVE_STATUSES:
+            return job
+        time.sleep(poll_interval)
+    return None
@@ -0,0 +1,70 @@
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from recommendations.vector_store import VECTOR_STORE_BACKENDS, EMBEDDING_DIMENSION, HNSWVectorStore
+
+
+class Command(BaseCommand):
+    help = 'Benchmark a vector store backend with random vectors'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend',
+            type=str,
+            default='numpy',
+            # Remote backends are left out so the benchmark never writes to a shared index
+            choices=sorted(name for name, store_class in VECTOR_STORE_BACKENDS.items() if store_class.local),
+            help='In-process vector store backend to benchmark',
+        )
+        parser.add_argument(
+            '--vectors',
+            type=int,
+            default=10000,
+            help='Number of vectors to index',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of queries to run',
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=10,
+            help='Number of neighbours per query',
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        store_class = VECTOR_STORE_BACKENDS[options['backend']]
+        if issubclass(store_class, HNSWVectorStore):
+            store = store_class(namespace='benchmark', directory=tempfile.mkdtemp())
+        else:
+            store = store_class(namespace='benchmark')
+
+        data = rng.standard_normal((options['vectors'], EMBEDDING_DIMENSION), dtype=np.float32)
+        start_time = time.perf_counter()
+        store.upsert([
+            {'id': f"bench:{i}", 'values': row, 'metadata': {'user_id': i}}
+            for i, row in enumerate(data)
+        ])
+        upsert_duration = time.perf_counter() - start_time
+
+        queries = rng.standard_normal((options['queries'], EMBEDDING_DIMENSION), dtype=np.float32)
+        latencies = []
+        for query in queries:
+            start_time = time.perf_counter()
+            store.query(query, top_k=options['top_k'])
+            latencies.append(time.perf_counter() - start_time)
+
+        latencies = np.array(latencies) * 1e6
+        self.stdout.write(f'Indexed {len(data)} vectors in {upsert_duration:.2f} seconds')
+        self.stdout.write(self.style.SUCCESS(
+            f'Query latency: p50 {np.percentile(latencies, 50):.0f} us, '
+            f'p95 {np.percentile(latencies, 95):.0f} us, '
+            f'p99 {np.percentile(latencies, 99):.0f} us'
+        ))
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recommendations.all_pairs import rebuild_all_user_neighbors
+from recommendations.embeddings import get_embedding_service
+from recommendations.neighbors import rebuild_user_neighbors
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the materialized nearest-neighbour table for all users with embeddings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all-pairs',
+            action='store_true',
+            help='Compute all neighbours locally with blocked matrix products instead of one vector search per user',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Worker processes for --all-pairs (ALL_PAIRS_WORKERS by default)',
+        )
+        parser.add_argument(
+            '--memory-mb',
+            type=int,
+            help='Memory budget in MB for the score blocks of --all-pairs (ALL_PAIRS_MEMORY_MB by default)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options.get('all_pairs'):
+            memory_mb = options.get('memory_mb')
+            count = rebuild_all_user_neighbors(
+                workers=options.get('workers'),
+                memory_budget=memory_mb * 1024 * 1024 if memory_mb else None
+            )
+        else:
+            embedding_service = get_embedding_service()
+            users = User.objects.filter(embedding__isnull=False).only(
+                'id', 'embedding', 'embedding_updated_at'
+            ).order_by('id')
+
+            rebuild_user_neighbors(embedding_service.vector_store, users.iterator(chunk_size=500))
+            count = users.count()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt neighbours for {count} users in {time.monotonic() - started:.1f}s')
+        )
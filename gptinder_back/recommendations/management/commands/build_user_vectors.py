@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recommendations.embeddings import get_embedding_service
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the recent and long-term message centroids of all users and indexes them'
+
+    def handle(self, *args, **options):
+        updated_count = get_embedding_service().rebuild_message_centroids()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt message vectors for {updated_count} users')
+        )
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+
+from recommendations.embeddings import get_embedding_service
+from recommendations.vector_store import get_vector_store
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds the in-process vector index from embeddings stored in the database, '
+        'or uploads them to a remote (Pinecone) index'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--namespace',
+            type=str,
+            choices=['users', 'messages', 'all'],
+            default='all',
+            help='Which index to build',
+        )
+
+    def handle(self, *args, **options):
+        namespace = options['namespace']
+        user_store = get_vector_store('users')
+        message_store = get_vector_store('messages')
+
+        # Empty local stores are filled from the database as soon as the service touches them,
+        # stores that already hold vectors are refreshed explicitly
+        had_users = user_store.local and len(user_store) > 0
+        had_messages = message_store.local and len(message_store) > 0
+        embedding_service = get_embedding_service()
+
+        if namespace in ('users', 'all'):
+            if not user_store.local:
+                self.upload(embedding_service.load_user_vectors, 'user')
+            else:
+                if had_users:
+                    embedding_service.load_user_vectors()
+                self.snapshot(user_store)
+                self.stdout.write(self.style.SUCCESS(f'Indexed {len(user_store)} user embeddings'))
+
+        if namespace in ('messages', 'all'):
+            if not message_store.local:
+                self.upload(embedding_service.load_message_vectors, 'message')
+            else:
+                if had_messages:
+                    embedding_service.load_message_vectors()
+                else:
+                    embedding_service.message_store
+                self.snapshot(message_store)
+                self.stdout.write(self.style.SUCCESS(f'Indexed {len(message_store)} message embeddings'))
+
+    def upload(self, load, kind):
+        # Remote stores are never filled on startup: upload what the database holds,
+        # upserts are idempotent so running it again is safe
+        count = load()
+        self.stdout.write(self.style.SUCCESS(f'Uploaded {count} {kind} embeddings'))
+
+    def snapshot(self, store):
+        # Persistent stores get a fresh snapshot so restarts don't replay the whole log
+        if hasattr(store, 'snapshot'):
+            store.snapshot()
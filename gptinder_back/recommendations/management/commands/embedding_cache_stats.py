@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from recommendations.embedding_cache import embedding_cache
+
+
+class Command(BaseCommand):
+    help = 'Shows hit/miss counters of the embedding cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them',
+        )
+
+    def handle(self, *args, **options):
+        stats = embedding_cache.stats()
+
+        self.stdout.write(f"Memory hits: {stats['memory_hits']}")
+        self.stdout.write(f"Database hits: {stats['db_hits']}")
+        self.stdout.write(f"Misses (OpenAI calls): {stats['misses']}")
+        self.stdout.write(f"Stored embeddings: {stats['db_entries']}")
+        self.stdout.write(self.style.SUCCESS(f"Hit rate: {stats['hit_rate']:.1%}"))
+
+        if options.get('reset'):
+            embedding_cache.reset_stats()
+            self.stdout.write('Counters reset')
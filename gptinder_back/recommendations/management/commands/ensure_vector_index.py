@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recommendations.vector_store import ensure_vector_indexes
+
+
+class Command(BaseCommand):
+    help = 'Creates the vector indexes for user and message embeddings if they do not exist'
+
+    def handle(self, *args, **options):
+        ensure_vector_indexes()
+        self.stdout.write(self.style.SUCCESS('Vector indexes are ready'))
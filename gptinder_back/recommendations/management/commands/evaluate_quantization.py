@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ai_chat.models import Message
+from recommendations.quantization import ProductQuantizer, ScalarQuantizer, normalize_rows
+
+
+class Command(BaseCommand):
+    help = 'Measures recall and memory of quantized message embeddings against exact search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=settings.MESSAGE_ANALYSIS_MESSAGE_MATCHES,
+            help='Number of neighbours compared per query (the message analysis searches MESSAGE_ANALYSIS_MESSAGE_MATCHES)',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Number of stored vectors used as queries',
+        )
+        parser.add_argument(
+            '--rerank',
+            type=int,
+            default=settings.QUANTIZATION_RERANK_CANDIDATES,
+            help='Candidates re-ranked with full-precision vectors (QUANTIZATION_RERANK_CANDIDATES by default)',
+        )
+        parser.add_argument(
+            '--json',
+            type=str,
+            help='Read embeddings from a JSON file ({key: vector} or [vector, ...]) instead of the database',
+        )
+
+    def load_vectors(self, path):
+        if path:
+            with open(path) as f:
+                data = json.load(f)
+            return np.asarray(list(data.values()) if isinstance(data, dict) else data, dtype=np.float32)
+
+        embeddings = Message.objects.filter(
+            role='user',
+            embedding__isnull=False
+        ).values_list('embedding', flat=True)
+        return np.vstack(list(embeddings.iterator()))
+
+    def handle(self, *args, **options):
+        vectors = normalize_rows(self.load_vectors(options.get('json')))
+        count, dimension = vectors.shape
+        top_k = min(options['top_k'], count - 1)
+        rerank = max(options['rerank'], top_k)
+
+        rng = np.random.default_rng(0)
+        query_ids = rng.choice(count, min(options['queries'], count), replace=False)
+
+        # Ground truth: exact neighbours of each query, the query itself excluded
+        exact = vectors[query_ids] @ vectors.T
+        exact[np.arange(len(query_ids)), query_ids] = -np.inf
+        truth = [set(np.argsort(-row)[:top_k]) for row in exact]
+
+        quantizers = [('int8', ScalarQuantizer())]
+        for subspaces in (192, 96, 48):
+            if dimension % subspaces == 0:
+                quantizers.append((f'pq{subspaces}', ProductQuantizer(dimension, subspaces=subspaces)))
+
+        self.stdout.write(
+            f'{count} vectors, {dimension} dimensions, {len(query_ids)} queries, recall@{top_k}'
+        )
+        self.stdout.write(f'{"method":<8} {"bytes/vector":>12} {"ratio":>7} {"recall":>8} {"reranked":>9}')
+        self.stdout.write(f'{"float32":<8} {dimension * 4:>12} {1:>6.1f}x {1:>8.3f} {1:>9.3f}')
+
+        for name, quantizer in quantizers:
+            quantizer.train(vectors)
+            codes, scales = quantizer.encode(vectors)
+
+            recall = 0
+            reranked_recall = 0
+            for query_index, expected in zip(query_ids, truth):
+                scores = quantizer.scores(vectors[query_index], codes, scales)
+                scores[query_index] = -np.inf
+
+                approximate = np.argsort(-scores)
+                recall += len(expected & set(approximate[:top_k])) / top_k
+
+                candidates = approximate[:rerank + 1]
+                candidates = candidates[candidates != query_index][:rerank]
+                rescored = candidates[np.argsort(-(vectors[candidates] @ vectors[query_index]))]
+                reranked_recall += len(expected & set(rescored[:top_k])) / top_k
+
+            code_size = quantizer.code_size(dimension)
+            self.stdout.write(
+                f'{name:<8} {code_size:>12} {dimension * 4 / code_size:>6.1f}x '
+                f'{recall / len(query_ids):>8.3f} {reranked_recall / len(query_ids):>9.3f}'
+            )
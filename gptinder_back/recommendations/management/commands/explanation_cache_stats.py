@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from recommendations.explanation_cache import explanation_cache
+
+
+class Command(BaseCommand):
+    help = 'Shows hit/miss counters of the explanation cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them',
+        )
+
+    def handle(self, *args, **options):
+        stats = explanation_cache.stats()
+
+        self.stdout.write(f"Hits (LLM calls saved): {stats['llm_calls_saved']}")
+        self.stdout.write(f"Misses: {stats['misses']}")
+        self.stdout.write(f"Stored explanations: {stats['entries']}")
+        self.stdout.write(self.style.SUCCESS(f"Hit rate: {stats['hit_rate']:.1%}"))
+
+        if options.get('reset'):
+            explanation_cache.reset_stats()
+            self.stdout.write('Counters reset')
@@ -1,9 +1,49 @@
-from django.core.management.base import BaseCommand
+import itertools
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
-from recommendations.embeddings import EmbeddingService
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from recommendations.clients import reset_clients
+from recommendations.embeddings import get_embedding_service
+from recommendations.models import RecommendationRun, UserRecommendation
 
 User = get_user_model()
 
+
+def user_id_chunks(users, after_id, chunk_size):
+    """Ids of users above after_id in ascending chunks, paged by id rather than offset"""
+    while True:
+        ids = list(users.filter(id__gt=after_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        after_id = ids[-1]
+
+
+def generate_for_users(user_ids):
+    """Generate recommendations for a chunk of users, returns [(user_id, username, count, error)]"""
+    embedding_service = get_embedding_service()
+    results = []
+    for user in User.objects.filter(id__in=user_ids).only('id', 'username').order_by('id'):
+        try:
+            results.append((user.id, user.username, embedding_service.generate_recommendations(user.id), None))
+        except Exception as e:
+            results.append((user.id, user.username, 0, str(e)))
+    return results
+
+
+def init_worker():
+    """Pool processes open their own HTTP clients instead of inheriting the parent's"""
+    reset_clients()
+
+
 class Command(BaseCommand):
     help = 'Generates recommendations for all users based on their embeddings'
 
@@ -18,32 +58,161 @@ class Command(BaseCommand):
             action='store_true',
             help='Show explanations for recommendations',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Users per chunk handed to a worker (and per checkpoint)',
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='Only users whose embedding was updated since this date or datetime (ISO format)',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue the last unfinished run, skipping users it already processed',
+        )
 
     def handle(self, *args, **options):
-        embedding_service = EmbeddingService()
         username = options.get('user')
         show_explanations = options.get('explain', False)
-        
+
         if username:
             try:
                 user = User.objects.get(username=username)
-                self.generate_for_user(user, embedding_service, show_explanations)
+                self.generate_for_user(user, get_embedding_service(), show_explanations)
             except User.DoesNotExist:
                 self.stdout.write(
                     self.style.ERROR(f'User {username} not found')
                 )
+            return
+
+        run = self.get_run(options)
+        users = User.objects.all()
+        if run.since:
+            users = users.filter(embedding_updated_at__gte=run.since)
+        self.generate_for_all(run, users, options['workers'], options['chunk_size'], show_explanations)
+
+    def get_run(self, options):
+        """The run to continue with --resume, otherwise a new one"""
+        since = self.parse_since(options.get('since'))
+        if options.get('resume'):
+            run = RecommendationRun.objects.filter(finished_at__isnull=True).first()
+            if run is not None:
+                if since and since != run.since:
+                    self.stdout.write(self.style.WARNING('Resuming with the --since of the interrupted run'))
+                self.stdout.write(
+                    f'Resuming run {run.id} after user {run.last_user_id} '
+                    f'({run.users_done} users done, {len(run.failed_user_ids)} failed to retry)'
+                )
+                return run
+            self.stdout.write(self.style.WARNING('No unfinished run to resume, starting a new one'))
+        return RecommendationRun.objects.create(since=since)
+
+    @staticmethod
+    def parse_since(value):
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            date = parse_date(value)
+            if date is None:
+                raise CommandError(f'Invalid --since value: {value}')
+            since = timezone.datetime(date.year, date.month, date.day)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def generate_for_all(self, run, users, workers, chunk_size, show_explanations):
+        # Users that failed in an interrupted run are retried before continuing after its checkpoint
+        retry_ids = list(run.failed_user_ids)
+        total = len(retry_ids) + users.filter(id__gt=run.last_user_id).count()
+        self.stdout.write(f'Generating recommendations for {total} users with {workers} worker(s)...')
+
+        processed = 0
+        started = time.monotonic()
+        chunks = itertools.chain(
+            ((retry_ids[i:i + chunk_size], True) for i in range(0, len(retry_ids), chunk_size)),
+            ((chunk, False) for chunk in user_id_chunks(users, run.last_user_id, chunk_size)),
+        )
+
+        def record(chunk, is_retry, results):
+            nonlocal processed
+            for _, username, count, error in results:
+                if error:
+                    self.stdout.write(
+                        self.style.ERROR(f'Error generating recommendations for {username}: {error}')
+                    )
+                elif show_explanations:
+                    self.show_recommendations(User.objects.get(username=username))
+
+            # Chunks are recorded in id order, so every user up to the chunk's last id was attempted;
+            # the ones that failed are kept for the next --resume
+            failed_ids = [user_id for user_id, _, _, error in results if error]
+            if not is_retry:
+                run.last_user_id = chunk[-1]
+            attempted = set(chunk)
+            run.failed_user_ids = [user_id for user_id in run.failed_user_ids if user_id not in attempted] + failed_ids
+            run.users_done += len(results) - len(failed_ids)
+            run.users_failed = len(run.failed_user_ids)
+            run.save(update_fields=['last_user_id', 'failed_user_ids', 'users_done', 'users_failed', 'updated_at'])
+
+            processed += len(chunk)
+            rate = processed / max(time.monotonic() - started, 1e-9)
+            eta = timedelta(seconds=int((total - processed) / rate)) if rate else '?'
+            self.stdout.write(f'{processed}/{total} users, {rate:.1f} users/s, ETA {eta}')
+
+        if workers <= 1:
+            for chunk, is_retry in chunks:
+                record(chunk, is_retry, generate_for_users(chunk))
         else:
-            users = User.objects.all()
-            for user in users:
-                self.generate_for_user(user, embedding_service, show_explanations)
-    
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=init_worker
+            ) as executor:
+                pending = deque()
+                for index, (chunk, is_retry) in enumerate(chunks):
+                    if index == 0:
+                        # The pool forks all its workers on the first submit, they must not
+                        # share the connection the chunk query just opened
+                        connections.close_all()
+                    pending.append((chunk, is_retry, executor.submit(generate_for_users, chunk)))
+                    if len(pending) >= workers * 2:
+                        chunk, is_retry, future = pending.popleft()
+                        record(chunk, is_retry, future.result())
+                while pending:
+                    chunk, is_retry, future = pending.popleft()
+                    record(chunk, is_retry, future.result())
+
+        # A run with failed users stays unfinished so that --resume retries them
+        if not run.failed_user_ids:
+            run.finished_at = timezone.now()
+            run.save(update_fields=['finished_at', 'updated_at'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Generated recommendations for {run.users_done} users ({run.users_failed} failed) '
+                f'in {timedelta(seconds=int(time.monotonic() - started))}'
+            )
+        )
+        if run.failed_user_ids:
+            self.stdout.write(self.style.WARNING('Run with --resume to retry the failed users'))
+
     def generate_for_user(self, user, embedding_service, show_explanations):
         self.stdout.write(f'Generating recommendations for {user.username}...')
-        
+
         try:
             # Generate recommendations
             recommendations_count = embedding_service.generate_recommendations(user.id)
-            
+
             if recommendations_count == 0:
                 self.stdout.write(
                     self.style.WARNING(f'No recommendations were generated for {user.username}')
@@ -52,20 +221,23 @@ class Command(BaseCommand):
                 self.stdout.write(
                     self.style.SUCCESS(f'Generated {recommendations_count} recommendations for {user.username}')
                 )
-                
+
                 # Show recommendations with explanations if requested
                 if show_explanations:
-                    from recommendations.models import UserRecommendation
-                    recommendations = UserRecommendation.objects.filter(user=user)
-                    
-                    for rec in recommendations:
-                        self.stdout.write(
-                            f'- {rec.recommended_user.username} (score: {rec.similarity_score:.2f})'
-                        )
-                        if rec.explanation:
-                            self.stdout.write(f'  Explanation: {rec.explanation}')
-                        
+                    self.show_recommendations(user)
+
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error generating recommendations for {user.username}: {str(e)}')
-            ) 
\ No newline at end of file
+            )
+
+    def show_recommendations(self, user):
+        recommendations = UserRecommendation.objects.filter(user=user).select_related('recommended_user')
+
+        self.stdout.write(f'{user.username}:')
+        for rec in recommendations:
+            self.stdout.write(
+                f'- {rec.recommended_user.username} (score: {rec.similarity_score:.2f})'
+            )
+            if rec.explanation:
+                self.stdout.write(f'  Explanation: {rec.explanation}')
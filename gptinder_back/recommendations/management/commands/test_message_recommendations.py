@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
-from recommendations.tasks import analyze_messages_for_recommendations
+from recommendations.analysis_schedule import pop_due_users
+from recommendations.tasks import analyze_user_messages, summarize_message_analysis
 
 
 class Command(BaseCommand):
@@ -11,8 +13,11 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('Starting message analysis for recommendations...'))
         start_time = timezone.now()
         
-        # Run the task synchronously (not as Celery task)
-        result = analyze_messages_for_recommendations()
+        # Run the per-user subtasks synchronously (not as Celery tasks)
+        user_ids = pop_due_users(settings.MESSAGE_ANALYSIS_BATCH_SIZE)
+        result = summarize_message_analysis([
+            analyze_user_messages.apply(args=[user_id]).get() for user_id in user_ids
+        ])
         
         end_time = timezone.now()
         duration = (end_time - start_time).total_seconds()
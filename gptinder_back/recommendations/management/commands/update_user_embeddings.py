@@ -1,23 +1,40 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from recommendations.embeddings import EmbeddingService
+from recommendations.embeddings import get_embedding_service
 
 
 class Command(BaseCommand):
-    help = 'Updates embeddings for all users based on their interests and bio'
+    help = 'Updates embeddings of users whose interests or bio changed (all users with --force)'
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Force update embeddings even if they were recently updated',
+            help='Rebuild embeddings for all users, not only the changed ones',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Number of profiles embedded per API request',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Maximum number of embedding requests in flight',
         )
 
     def handle(self, *args, **options):
         force_update = options.get('force', False)
-        embedding_service = EmbeddingService()
+        embedding_service = get_embedding_service()
 
-        updated_count = embedding_service.update_all_user_embeddings()
+        if force_update:
+            update_embeddings = embedding_service.update_all_user_embeddings
+        else:
+            update_embeddings = embedding_service.update_dirty_user_embeddings
+        
+        updated_count = update_embeddings(
+            batch_size=options.get('batch_size'),
+            max_concurrency=options.get('concurrency'),
+        )
         
         self.stdout.write(
             self.style.SUCCESS(f'Successfully updated embeddings for {updated_count} users')
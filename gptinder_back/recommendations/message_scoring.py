@@ -0,0 +1,137 @@
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from ai_chat.models import Message
+from .quantization import normalize_rows
+
+
+def message_matrix(embeddings):
+    """A user's message embeddings stacked once into a float32 matrix with unit-length rows"""
+    return normalize_rows(np.vstack(embeddings))
+
+
+def score_messages(matrix, candidate_matrices):
+    """
+    Best message pair between one user and each candidate, from a single matrix product.
+    matrix is the user's message_matrix(), candidate_matrices is {candidate_id: message_matrix()}.
+    Returns {candidate_id: (max similarity, user message index, candidate message index)}.
+    """
+    candidate_ids = [candidate_id for candidate_id, candidate in candidate_matrices.items() if len(candidate)]
+    if not candidate_ids or not len(matrix):
+        return {}
+
+    # All pair scores at once: user messages x messages of every candidate
+    scores = matrix @ np.vstack([candidate_matrices[candidate_id] for candidate_id in candidate_ids]).T
+    best_rows = scores.argmax(axis=0)
+    best_scores = scores[best_rows, np.arange(scores.shape[1])]
+
+    results = {}
+    start = 0
+    for candidate_id in candidate_ids:
+        stop = start + len(candidate_matrices[candidate_id])
+        column = start + int(best_scores[start:stop].argmax())
+        results[candidate_id] = (float(best_scores[column]), int(best_rows[column]), column - start)
+        start = stop
+    return results
+
+
+def recent_messages(user_ids, limit):
+    """
+    {user_id: (contents, message_matrix())} of each user's latest limit user-role messages
+    with embeddings, newest first, loaded for all users in one windowed query.
+    Users without such messages are left out.
+    """
+    rows = Message.objects.filter(
+        chat__user_id__in=user_ids,
+        role='user',
+        embedding__isnull=False
+    ).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=F('chat__user_id'),
+            order_by=[F('created_at').desc(), F('id').desc()]
+        )
+    ).filter(position__lte=limit).order_by('chat__user_id', 'position').values_list(
+        'chat__user_id', 'content', 'embedding'
+    )
+
+    grouped = defaultdict(lambda: ([], []))
+    for user_id, content, embedding in rows:
+        contents, embeddings = grouped[user_id]
+        contents.append(content)
+        embeddings.append(embedding)
+    return {
+        user_id: (contents, message_matrix(embeddings))
+        for user_id, (contents, embeddings) in grouped.items()
+    }
+
+
+def _message_matrix_key(user_id):
+    return f"message_matrix:{user_id}"
+
+
+def _unpack(data):
+    contents, buffer = data
+    if not contents:
+        return None
+    # A read-only view of the cached bytes, no copy
+    return contents, np.frombuffer(buffer, dtype=np.float32).reshape(len(contents), -1)
+
+
+def cached_recent_messages(user_ids):
+    """
+    recent_messages() of the last MESSAGE_ANALYSIS_MESSAGES messages, through the Django cache:
+    each user's contents and normalized float32 matrix are cached as raw bytes (evicted by the
+    cache backend's LRU policy or after MESSAGE_MATRIX_CACHE_SECONDS), only misses hit the database.
+    """
+    keys = {_message_matrix_key(user_id): user_id for user_id in user_ids}
+    cached = {keys[key]: data for key, data in cache.get_many(list(keys)).items()}
+
+    missing = [user_id for user_id in keys.values() if user_id not in cached]
+    if missing:
+        loaded = recent_messages(missing, settings.MESSAGE_ANALYSIS_MESSAGES)
+        # Users without messages are cached too, so they aren't queried again
+        fresh = {
+            user_id: (loaded[user_id][0], loaded[user_id][1].tobytes()) if user_id in loaded else ([], b'')
+            for user_id in missing
+        }
+        cache.set_many(
+            {_message_matrix_key(user_id): data for user_id, data in fresh.items()},
+            timeout=settings.MESSAGE_MATRIX_CACHE_SECONDS
+        )
+        cached.update(fresh)
+
+    messages = {}
+    for user_id, data in cached.items():
+        unpacked = _unpack(data)
+        if unpacked is not None:
+            messages[user_id] = unpacked
+    return messages
+
+
+def append_cached_message(user_id, content, embedding):
+    """Put a new message on top of the user's cached matrix; uncached users are loaded on the next read"""
+    key = _message_matrix_key(user_id)
+    data = cache.get(key)
+    if data is None:
+        return
+
+    unpacked = _unpack(data)
+    limit = settings.MESSAGE_ANALYSIS_MESSAGES
+    row = normalize_rows(embedding)
+    if unpacked is None:
+        contents, matrix = [content], row
+    else:
+        contents = [content, *unpacked[0]][:limit]
+        matrix = np.vstack([row, unpacked[1]])[:limit]
+    cache.set(key, (contents, matrix.tobytes()), timeout=settings.MESSAGE_MATRIX_CACHE_SECONDS)
+
+
+def invalidate_cached_messages(user_ids):
+    """Drop cached message matrices, called when messages are deleted"""
+    cache.delete_many([_message_matrix_key(user_id) for user_id in user_ids])
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-17 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0004_auto_20250424_1006'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('embedding_model', models.CharField(max_length=100, verbose_name='Embedding Model')),
+                ('text_hash', models.CharField(help_text='SHA-256 of the normalized text', max_length=64, verbose_name='Text Hash')),
+                ('embedding', models.JSONField(verbose_name='Embedding')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+            ],
+            options={
+                'unique_together': {('embedding_model', 'text_hash')},
+            },
+        ),
+    ]
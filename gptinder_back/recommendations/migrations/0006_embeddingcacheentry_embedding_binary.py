@@ -0,0 +1,74 @@
+# Generated by Django 5.2 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+import gptinder_back.fields
+
+
+BATCH_SIZE = 500
+
+
+def json_to_binary(apps, schema_editor):
+    """Copy JSON float lists into the binary vector column"""
+    EmbeddingCacheEntry = apps.get_model('recommendations', 'EmbeddingCacheEntry')
+    batch = []
+    entries = EmbeddingCacheEntry.objects.filter(embedding__isnull=False).only('id', 'embedding')
+    for entry in entries.iterator(chunk_size=BATCH_SIZE):
+        entry.embedding_binary = entry.embedding
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            EmbeddingCacheEntry.objects.bulk_update(batch, ['embedding_binary'])
+            batch = []
+    if batch:
+        EmbeddingCacheEntry.objects.bulk_update(batch, ['embedding_binary'])
+
+
+def binary_to_json(apps, schema_editor):
+    """Copy binary vectors back into the JSON column"""
+    EmbeddingCacheEntry = apps.get_model('recommendations', 'EmbeddingCacheEntry')
+    batch = []
+    entries = EmbeddingCacheEntry.objects.filter(embedding_binary__isnull=False).only('id', 'embedding_binary')
+    for entry in entries.iterator(chunk_size=BATCH_SIZE):
+        entry.embedding = entry.embedding_binary.tolist()
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            EmbeddingCacheEntry.objects.bulk_update(batch, ['embedding'])
+            batch = []
+    if batch:
+        EmbeddingCacheEntry.objects.bulk_update(batch, ['embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0005_embeddingcacheentry'),
+    ]
+
+    operations = [
+        # Nullable while both columns exist, so the migration can also be reversed
+        migrations.AlterField(
+            model_name='embeddingcacheentry',
+            name='embedding',
+            field=models.JSONField(null=True, verbose_name='Embedding'),
+        ),
+        migrations.AddField(
+            model_name='embeddingcacheentry',
+            name='embedding_binary',
+            field=gptinder_back.fields.VectorField(null=True, verbose_name='Embedding'),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='embeddingcacheentry',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='embeddingcacheentry',
+            old_name='embedding_binary',
+            new_name='embedding',
+        ),
+        migrations.AlterField(
+            model_name='embeddingcacheentry',
+            name='embedding',
+            field=gptinder_back.fields.VectorField(verbose_name='Embedding'),
+        ),
+    ]
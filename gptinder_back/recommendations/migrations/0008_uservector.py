@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 12:05
+
+import django.db.models.deletion
+import gptinder_back.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0007_userneighbor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserVector',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('recent', 'Recent messages centroid'), ('long_term', 'Long-term messages centroid')], max_length=20, verbose_name='Kind')),
+                ('embedding', gptinder_back.fields.VectorField(verbose_name='Embedding')),
+                ('message_count', models.PositiveIntegerField(default=0, verbose_name='Message Count')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vectors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'kind')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-17 14:20
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0009_explanationcacheentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('stage', models.CharField(blank=True, max_length=20, verbose_name='Stage')),
+                ('candidates_found', models.PositiveIntegerField(default=0, verbose_name='Candidates Found')),
+                ('explanations_total', models.PositiveIntegerField(default=0, verbose_name='Explanations Total')),
+                ('explanations_done', models.PositiveIntegerField(default=0, verbose_name='Explanations Done')),
+                ('recommendations_count', models.PositiveIntegerField(default=0, verbose_name='Recommendations Count')),
+                ('detail', models.TextField(blank=True, help_text='Error or notice shown to the user', verbose_name='Detail')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendation_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'status'], name='recommendat_user_id_7daf41_idx')],
+            },
+        ),
+    ]
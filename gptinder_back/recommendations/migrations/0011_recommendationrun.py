@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-17 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0010_recommendationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('since', models.DateTimeField(blank=True, null=True, verbose_name='Since')),
+                ('last_user_id', models.BigIntegerField(default=0, verbose_name='Last User ID')),
+                ('users_done', models.PositiveIntegerField(default=0, verbose_name='Users Done')),
+                ('users_failed', models.PositiveIntegerField(default=0, verbose_name='Users Failed')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='Started at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished at')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
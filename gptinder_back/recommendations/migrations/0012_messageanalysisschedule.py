@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-17 16:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0011_recommendationrun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageAnalysisSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_analyzed_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Analyzed at')),
+                ('new_messages', models.PositiveIntegerField(default=0, verbose_name='New Messages')),
+                ('due_at', models.DateTimeField(verbose_name='Due at')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='message_analysis_schedule', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['due_at'],
+                'indexes': [models.Index(fields=['due_at'], name='recommendat_due_at_7efcbb_idx')],
+            },
+        ),
+    ]
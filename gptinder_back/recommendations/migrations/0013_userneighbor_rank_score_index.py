@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0012_messageanalysisschedule'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userneighbor',
+            index=models.Index(fields=['rank', 'score'], name='recommendat_rank_3ab343_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-17 17:40
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def schedule_existing_users(apps, schema_editor):
+    """Users that had an embedding before the schedule existed are due right away"""
+    User = apps.get_model('users', 'User')
+    MessageAnalysisSchedule = apps.get_model('recommendations', 'MessageAnalysisSchedule')
+    now = timezone.now()
+    user_ids = User.objects.filter(embedding__isnull=False).values_list('id', flat=True)
+    MessageAnalysisSchedule.objects.bulk_create(
+        (MessageAnalysisSchedule(user_id=user_id, due_at=now) for user_id in user_ids.iterator()),
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0013_userneighbor_rank_score_index'),
+        ('users', '0008_interesttag_userinterest'),
+    ]
+
+    operations = [
+        migrations.RunPython(schedule_existing_users, migrations.RunPython.noop),
+    ]
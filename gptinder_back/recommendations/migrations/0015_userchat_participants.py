@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-17 18:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_users_to_participants(apps, schema_editor):
+    """The model went back to a participants relation, move each chat's user1/user2 into it"""
+    UserChat = apps.get_model('recommendations', 'UserChat')
+    Participant = UserChat.participants.through
+    chats = UserChat.objects.values_list('id', 'user1_id', 'user2_id')
+    Participant.objects.bulk_create(
+        (
+            Participant(userchat_id=chat_id, user_id=user_id)
+            for chat_id, user1_id, user2_id in chats.iterator()
+            for user_id in {user1_id, user2_id}
+        ),
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0014_schedule_existing_users'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='userchat',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='userchat',
+            name='participants',
+            field=models.ManyToManyField(related_name='user_chats', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_users_to_participants, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='userchat',
+            name='user1',
+        ),
+        migrations.RemoveField(
+            model_name='userchat',
+            name='user2',
+        ),
+    ]
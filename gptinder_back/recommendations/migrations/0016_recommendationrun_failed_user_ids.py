@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0015_userchat_participants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationrun',
+            name='failed_user_ids',
+            field=models.JSONField(blank=True, default=list, verbose_name='Failed User IDs'),
+        ),
+    ]
@@ -1,7 +1,11 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
+from gptinder_back.fields import VectorField
+
 
 class UserRecommendation(models.Model):
     """Model to store user recommendations"""
@@ -69,3 +73,194 @@ class UserMessage(models.Model):
     
     def __str__(self):
         return f"{self.sender.username}: {self.content[:30]}..."
+
+
+class EmbeddingCacheEntry(models.Model):
+    """Embedding of a normalized text, shared by user profiles and chat messages"""
+    embedding_model = models.CharField(_("Embedding Model"), max_length=100)
+    text_hash = models.CharField(_("Text Hash"), max_length=64,
+                                 help_text=_("SHA-256 of the normalized text"))
+    embedding = VectorField(_("Embedding"))
+    created_at = models.DateTimeField(_("Created at"), auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['embedding_model', 'text_hash']
+    
+    def __str__(self):
+        return f"{self.embedding_model}:{self.text_hash[:12]}"
+
+
+class UserNeighbor(models.Model):
+    """Materialized top-k most similar users of a user, kept up to date when embeddings change"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='neighbors'
+    )
+    neighbor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='neighbor_of'
+    )
+    score = models.FloatField(_("Score"))
+    rank = models.PositiveSmallIntegerField(_("Rank"))
+    # user.embedding_updated_at of the embedding the row was computed from
+    embedding_version = models.DateTimeField(_("Embedding Version"), null=True)
+    
+    class Meta:
+        ordering = ['user', 'rank']
+        unique_together = ['user', 'neighbor']
+        indexes = [
+            models.Index(fields=['user', 'rank']),
+            # Lists whose k-th score is below a bound, see neighbors.refresh_user_neighbors
+            models.Index(fields=['rank', 'score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} -> {self.neighbor_id} #{self.rank} ({self.score})"
+
+
+class UserVector(models.Model):
+    """Additional vectors of a user next to the profile embedding, built from their AI chat messages"""
+    RECENT = 'recent'
+    LONG_TERM = 'long_term'
+    KIND_CHOICES = (
+        (RECENT, _("Recent messages centroid")),
+        (LONG_TERM, _("Long-term messages centroid")),
+    )
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='vectors'
+    )
+    kind = models.CharField(_("Kind"), max_length=20, choices=KIND_CHOICES)
+    embedding = VectorField(_("Embedding"))
+    message_count = models.PositiveIntegerField(_("Message Count"), default=0)
+    updated_at = models.DateTimeField(_("Updated at"), auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'kind']
+    
+    def __str__(self):
+        return f"{self.user_id}:{self.kind} ({self.message_count} messages)"
+
+
+
+class ExplanationCacheEntry(models.Model):
+    """Last generated explanation for a (user, candidate) pair, reused while the prompt inputs are unchanged"""
+    PROFILE = 'profile'
+    MESSAGES = 'messages'
+    KIND_CHOICES = (
+        (PROFILE, _("Profile similarity")),
+        (MESSAGES, _("Message similarity")),
+    )
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='explanation_cache_entries'
+    )
+    candidate = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    kind = models.CharField(_("Kind"), max_length=20, choices=KIND_CHOICES)
+    key_hash = models.CharField(_("Key Hash"), max_length=64,
+                                help_text=_("Hash of both profiles and the prompt template version"))
+    explanation = models.TextField(_("Explanation"))
+    updated_at = models.DateTimeField(_("Updated at"), auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'candidate', 'kind']
+    
+    def __str__(self):
+        return f"{self.user_id} -> {self.candidate_id} ({self.kind})"
+
+
+class RecommendationJob(models.Model):
+    """Background (re)generation of a user's recommendations, polled by the client"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, _("Pending")),
+        (RUNNING, _("Running")),
+        (SUCCEEDED, _("Succeeded")),
+        (FAILED, _("Failed")),
+    )
+    ACTIVE_STATUSES = (PENDING, RUNNING)
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='recommendation_jobs'
+    )
+    status = models.CharField(_("Status"), max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    # embedding, searching, explaining or saving while running
+    stage = models.CharField(_("Stage"), max_length=20, blank=True)
+    candidates_found = models.PositiveIntegerField(_("Candidates Found"), default=0)
+    explanations_total = models.PositiveIntegerField(_("Explanations Total"), default=0)
+    explanations_done = models.PositiveIntegerField(_("Explanations Done"), default=0)
+    recommendations_count = models.PositiveIntegerField(_("Recommendations Count"), default=0)
+    detail = models.TextField(_("Detail"), blank=True,
+                              help_text=_("Error or notice shown to the user"))
+    created_at = models.DateTimeField(_("Created at"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("Updated at"), auto_now=True)
+    finished_at = models.DateTimeField(_("Finished at"), null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.status} ({self.id})"
+
+
+class RecommendationRun(models.Model):
+    """Checkpoint of a generate_recommendations command run over all users, for --resume"""
+    # Only users whose embedding was updated since then (all users when empty)
+    since = models.DateTimeField(_("Since"), null=True, blank=True)
+    # Users are processed in id order; every user up to this id was attempted
+    last_user_id = models.BigIntegerField(_("Last User ID"), default=0)
+    # Users up to last_user_id that failed, retried first on --resume
+    failed_user_ids = models.JSONField(_("Failed User IDs"), default=list, blank=True)
+    users_done = models.PositiveIntegerField(_("Users Done"), default=0)
+    users_failed = models.PositiveIntegerField(_("Users Failed"), default=0)
+    started_at = models.DateTimeField(_("Started at"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("Updated at"), auto_now=True)
+    finished_at = models.DateTimeField(_("Finished at"), null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Run {self.id}: {self.users_done} done, up to user {self.last_user_id}"
+
+
+class MessageAnalysisSchedule(models.Model):
+    """When a user is next due for the periodic message analysis, see recommendations.analysis_schedule"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='message_analysis_schedule'
+    )
+    last_analyzed_at = models.DateTimeField(_("Last Analyzed at"), null=True, blank=True)
+    # Messages with embeddings written since the last analysis
+    new_messages = models.PositiveIntegerField(_("New Messages"), default=0)
+    # Users are picked in due_at order, see analysis_schedule.next_due_at
+    due_at = models.DateTimeField(_("Due at"))
+    
+    class Meta:
+        ordering = ['due_at']
+        indexes = [
+            models.Index(fields=['due_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id}: due {self.due_at} ({self.new_messages} new messages)"
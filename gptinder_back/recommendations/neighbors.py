@@ -0,0 +1,158 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from users.models import User
+from .models import UserNeighbor
+from .quantization import normalize_rows
+
+
+def user_id_from_vector_id(vector_id):
+    """'user:42' -> 42"""
+    return int(vector_id.split(':', 1)[1])
+
+
+def search_neighbors(vector_store, user_id, embedding, top_k, filter=None):
+    """Live vector search: [(neighbor_id, score)] best first, the user excluded"""
+    matches = vector_store.query(vector=embedding, top_k=top_k + 1, filter=filter)
+    neighbors = [
+        (user_id_from_vector_id(match['id']), match['score'])
+        for match in matches
+        if match['id'].startswith('user:') and match['id'] != f"user:{user_id}"
+    ]
+    return neighbors[:top_k]
+
+
+def exact_scores(embedding, user_ids):
+    """Cosine similarity of embedding to the stored embeddings of user_ids"""
+    users = User.objects.filter(id__in=list(user_ids), embedding__isnull=False).values_list('id', 'embedding')
+    ids = []
+    vectors = []
+    for user_id, user_embedding in users:
+        ids.append(user_id)
+        vectors.append(user_embedding)
+    if not ids:
+        return {}
+
+    matrix = normalize_rows(np.vstack(vectors))
+    scores = matrix @ normalize_rows(embedding)[0]
+    return dict(zip(ids, scores.tolist()))
+
+
+def get_user_neighbors(user):
+    """
+    All materialized neighbours of a user as [(neighbor_id, score)], best first.
+    Returns None on a miss: no rows, or rows computed from an older embedding.
+    """
+    if user.embedding_updated_at is None:
+        return None
+
+    neighbors = list(
+        UserNeighbor.objects.filter(
+            user_id=user.id,
+            embedding_version=user.embedding_updated_at
+        ).values_list('neighbor_id', 'score')
+    )
+    return neighbors or None
+
+
+def write_user_neighbors(user_id, embedding_version, neighbors):
+    """Replace a user's neighbour rows with [(neighbor_id, score)] (best first)"""
+    with transaction.atomic():
+        UserNeighbor.objects.filter(user_id=user_id).delete()
+        UserNeighbor.objects.bulk_create([
+            UserNeighbor(
+                user_id=user_id,
+                neighbor_id=neighbor_id,
+                score=score,
+                rank=rank,
+                embedding_version=embedding_version
+            )
+            for rank, (neighbor_id, score) in enumerate(neighbors, start=1)
+        ])
+
+
+def rebuild_user_neighbors(vector_store, users):
+    """Recompute the neighbour rows of users from scratch, without touching anyone else's"""
+    count = settings.USER_NEIGHBOR_COUNT
+    for user in users:
+        if user.embedding is None:
+            continue
+        neighbors = search_neighbors(vector_store, user.id, user.embedding, count)
+        write_user_neighbors(user.id, user.embedding_updated_at, neighbors)
+
+
+def refresh_user_neighbors(vector_store, users):
+    """
+    Maintain the table after the embeddings of users changed (they must already be
+    in the vector store): recompute their own rows, then patch the rows of users
+    they entered or left. Lists that can't be patched exactly (a listed user left
+    or fell to the bottom) are recomputed in full.
+    """
+    count = settings.USER_NEIGHBOR_COUNT
+    changed = {user.id: user for user in users if user.embedding is not None}
+    if not changed:
+        return
+
+    # A changed user can enter a list only by beating its k-th score. Users among its
+    # nearest candidates get the search score; lists whose k-th score is below the last
+    # candidate's could take it too, so they are scored exactly against stored embeddings
+    new_scores = {}
+    limit = max(count, settings.USER_NEIGHBOR_PATCH_CANDIDATES)
+    for user in changed.values():
+        neighbors = search_neighbors(vector_store, user.id, user.embedding, limit)
+        write_user_neighbors(user.id, user.embedding_updated_at, neighbors[:count])
+        for neighbor_id, score in neighbors:
+            if neighbor_id not in changed:
+                new_scores.setdefault(neighbor_id, {})[user.id] = score
+
+        if len(neighbors) == limit:
+            low_lists = UserNeighbor.objects.filter(
+                rank=count,
+                score__lt=neighbors[-1][1]
+            ).exclude(user_id__in=changed).exclude(
+                user_id__in=[neighbor_id for neighbor_id, _ in neighbors]
+            ).values_list('user_id', flat=True)
+            for neighbor_id, score in exact_scores(user.embedding, low_lists).items():
+                new_scores.setdefault(neighbor_id, {})[user.id] = score
+
+    # Users already listing a changed user must rescore or drop it
+    listing = UserNeighbor.objects.filter(
+        neighbor_id__in=changed
+    ).exclude(user_id__in=changed).values_list('user_id', flat=True)
+    affected = set(new_scores) | set(listing)
+
+    current = {}
+    rows = UserNeighbor.objects.filter(user_id__in=affected).values_list(
+        'user_id', 'neighbor_id', 'score', 'embedding_version'
+    )
+    for user_id, neighbor_id, score, embedding_version in rows:
+        entries, _ = current.setdefault(user_id, ({}, embedding_version))
+        entries[neighbor_id] = score
+
+    incomplete = []
+    for user_id, (entries, embedding_version) in current.items():
+        # Users outside the list scored at most its old k-th score; if a listed user
+        # left or fell below that, one of them may belong in the list
+        floor = min(entries.values()) if len(entries) >= count else float('-inf')
+        patched = dict(entries)
+        uncertain = False
+        for changed_id in changed:
+            score = new_scores.get(user_id, {}).get(changed_id)
+            if score is not None:
+                uncertain |= changed_id in entries and score < floor
+                patched[changed_id] = score
+            elif patched.pop(changed_id, None) is not None:
+                uncertain = True
+
+        neighbors = sorted(patched.items(), key=lambda item: -item[1])[:count]
+        if uncertain:
+            incomplete.append(user_id)
+        elif neighbors != sorted(entries.items(), key=lambda item: -item[1]):
+            write_user_neighbors(user_id, embedding_version, neighbors)
+
+    if incomplete:
+        rebuild_user_neighbors(
+            vector_store,
+            User.objects.filter(id__in=incomplete).only('id', 'embedding', 'embedding_updated_at')
+        )
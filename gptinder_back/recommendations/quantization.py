@@ -0,0 +1,132 @@
+import numpy as np
+
+
+def normalize_rows(matrix):
+    """Return a float32 copy of matrix with unit-length rows"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+class ScalarQuantizer:
+    """
+    int8 quantization with one scale per vector: x ~= codes * scale.
+    Needs no training. A 1536-d vector takes 1540 bytes instead of 6144.
+    """
+    trained = True
+
+    def train(self, vectors):
+        pass
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def decode(self, codes, scales):
+        return codes.astype(np.float32) * scales[:, None]
+
+    def scores(self, query, codes, scales, chunk_size=8192):
+        """Asymmetric inner products: float query against int8 codes"""
+        result = np.empty(len(codes), dtype=np.float32)
+        # Upcast in chunks so the float copy of the codes stays small
+        for start in range(0, len(codes), chunk_size):
+            chunk = codes[start:start + chunk_size].astype(np.float32)
+            result[start:start + chunk_size] = (chunk @ query) * scales[start:start + chunk_size]
+        return result
+
+    def code_size(self, dimension):
+        return dimension + 4
+
+
+class ProductQuantizer:
+    """
+    Product quantization: vectors are split into subspaces and each part is
+    replaced by the id of its nearest centroid (256 per subspace, one byte each).
+    Queries use asymmetric distance: a per-query lookup table of inner products
+    between the query parts and the centroids.
+    """
+
+    def __init__(self, dimension, subspaces=96, centroids=256, iterations=20, seed=0):
+        if dimension % subspaces:
+            raise ValueError(f"Dimension {dimension} is not divisible by {subspaces} subspaces")
+        self.dimension = dimension
+        self.subspaces = subspaces
+        self.subspace_dimension = dimension // subspaces
+        self.centroids = centroids
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks = None
+
+    @property
+    def trained(self):
+        return self.codebooks is not None
+
+    def _split(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors.reshape(len(vectors), self.subspaces, self.subspace_dimension)
+
+    def train(self, vectors):
+        """Learn one k-means codebook per subspace"""
+        parts = self._split(vectors)
+        rng = np.random.default_rng(self.seed)
+        centroids = min(self.centroids, len(parts))
+        self.codebooks = np.empty(
+            (self.subspaces, centroids, self.subspace_dimension), dtype=np.float32
+        )
+
+        for subspace in range(self.subspaces):
+            data = parts[:, subspace, :]
+            codebook = data[rng.choice(len(data), centroids, replace=False)].copy()
+            for _ in range(self.iterations):
+                assignment = self._nearest(data, codebook)
+                counts = np.bincount(assignment, minlength=centroids)
+                sums = np.zeros_like(codebook)
+                np.add.at(sums, assignment, data)
+
+                filled = counts > 0
+                codebook[filled] = sums[filled] / counts[filled, None]
+                # Re-seed empty clusters with random points
+                empty = np.flatnonzero(~filled)
+                if len(empty):
+                    codebook[empty] = data[rng.integers(len(data), size=len(empty))]
+            self.codebooks[subspace] = codebook
+
+    @staticmethod
+    def _nearest(data, codebook):
+        distances = (
+            (data ** 2).sum(axis=1, keepdims=True)
+            - 2 * data @ codebook.T
+            + (codebook ** 2).sum(axis=1)
+        )
+        return distances.argmin(axis=1)
+
+    def encode(self, vectors):
+        parts = self._split(vectors)
+        codes = np.empty((len(parts), self.subspaces), dtype=np.uint8)
+        for subspace in range(self.subspaces):
+            codes[:, subspace] = self._nearest(parts[:, subspace, :], self.codebooks[subspace])
+        return codes, None
+
+    def decode(self, codes, scales=None):
+        parts = self.codebooks[np.arange(self.subspaces), codes]
+        return parts.reshape(len(codes), self.dimension)
+
+    def scores(self, query, codes, scales=None, chunk_size=8192):
+        """Asymmetric inner products through a (subspaces x centroids) lookup table"""
+        query_parts = np.asarray(query, dtype=np.float32).reshape(self.subspaces, self.subspace_dimension)
+        table = np.einsum('sd,scd->sc', query_parts, self.codebooks)
+
+        result = np.empty(len(codes), dtype=np.float32)
+        subspaces = np.arange(self.subspaces)
+        for start in range(0, len(codes), chunk_size):
+            result[start:start + chunk_size] = table[subspaces, codes[start:start + chunk_size]].sum(axis=1)
+        return result
+
+    def code_size(self, dimension):
+        return self.subspaces
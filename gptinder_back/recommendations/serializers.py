@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from users.serializers import UserSerializer
-from .models import UserRecommendation, UserChat, UserMessage
+from .models import RecommendationJob, UserRecommendation, UserChat, UserMessage
 
 
 class UserRecommendationSerializer(serializers.ModelSerializer):
@@ -17,6 +17,19 @@ class UserRecommendationSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'recommended_user', 'similarity_score', 'common_interests', 'created_at', 'explanation')
 
 
+class RecommendationJobSerializer(serializers.ModelSerializer):
+    """Serializer for RecommendationJob model, reports progress of a generation"""
+    
+    class Meta:
+        model = RecommendationJob
+        fields = (
+            'id', 'status', 'stage', 'candidates_found', 'explanations_total',
+            'explanations_done', 'recommendations_count', 'detail',
+            'created_at', 'updated_at', 'finished_at'
+        )
+        read_only_fields = fields
+
+
 class UserMessageSerializer(serializers.ModelSerializer):
     """Serializer for UserMessage model"""
     sender_username = serializers.CharField(source='sender.username', read_only=True)
@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from ai_chat.models import Chat, Message
+from .candidates import invalidate_excluded_user_ids
+from .embeddings import profile_hash
+from .message_scoring import invalidate_cached_messages
+from .models import UserChat, UserRecommendation
+from .tasks import sync_user_active_task
+
+
+PROFILE_FIELDS = {'interests', 'bio'}
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='mark_embedding_dirty')
+def mark_embedding_dirty(sender, instance, update_fields=None, **kwargs):
+    """Flag the user's embedding for refresh when interests or bio changed"""
+    if instance.embedding_dirty:
+        return
+    if update_fields is not None and not PROFILE_FIELDS & set(update_fields):
+        return
+    # Deferred fields were not loaded, so they can't have been edited
+    if PROFILE_FIELDS & instance.get_deferred_fields():
+        return
+
+    if profile_hash(instance) != instance.embedding_profile_hash:
+        sender.objects.filter(pk=instance.pk).update(embedding_dirty=True)
+        instance.embedding_dirty = True
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='note_active_change')
+def note_active_change(sender, instance, update_fields=None, **kwargs):
+    """Note whether is_active is about to change, the vector metadata has to follow"""
+    instance._active_changed = False
+    if instance.pk is None or (update_fields is not None and 'is_active' not in update_fields):
+        return
+    was_active = sender.objects.filter(pk=instance.pk).values_list('is_active', flat=True).first()
+    instance._active_changed = was_active is not None and was_active != instance.is_active
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='sync_active_metadata')
+def sync_active_metadata(sender, instance, **kwargs):
+    """Similar-user search filters on is_active metadata, update it in a worker"""
+    if getattr(instance, '_active_changed', False):
+        user_id = instance.pk
+        transaction.on_commit(lambda: sync_user_active_task.delay(user_id))
+
+
+@receiver(post_save, sender=UserRecommendation, dispatch_uid='recommendation_saved_exclusions')
+@receiver(post_delete, sender=UserRecommendation, dispatch_uid='recommendation_deleted_exclusions')
+def recommendation_changed(sender, instance, **kwargs):
+    """Users already recommended are excluded from similar-user search"""
+    invalidate_excluded_user_ids([instance.user_id])
+
+
+@receiver(m2m_changed, sender=UserChat.participants.through, dispatch_uid='chat_participants_exclusions')
+def chat_participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Chat partners are excluded from similar-user search"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if reverse:
+        # instance is a user, pk_set holds chats
+        chats = UserChat.objects.filter(pk__in=pk_set) if pk_set else instance.user_chats.all()
+        user_ids = {instance.pk}
+    else:
+        chats = [instance]
+        user_ids = set(pk_set or [])
+
+    for chat in chats:
+        user_ids.update(chat.participants.values_list('id', flat=True))
+    invalidate_excluded_user_ids(user_ids)
+
+
+@receiver(pre_delete, sender=UserChat, dispatch_uid='chat_deleted_exclusions')
+def chat_deleted(sender, instance, **kwargs):
+    invalidate_excluded_user_ids(instance.participants.values_list('id', flat=True))
+
+
+
+@receiver(post_delete, sender=Message, dispatch_uid='message_deleted_matrix')
+def message_deleted(sender, instance, **kwargs):
+    """A deleted message may be in its author's cached message matrix"""
+    if instance.role != 'user' or instance.embedding is None:
+        return
+    user_id = Chat.objects.filter(id=instance.chat_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        invalidate_cached_messages([user_id])
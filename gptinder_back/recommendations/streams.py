@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .jobs import run_recommendation_job, start_recommendation_job, wait_for_job
+from .models import RecommendationJob, UserRecommendation
+from .serializers import RecommendationJobSerializer, UserRecommendationSerializer
+
+
+def sse_event(event, data):
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def authenticate(request):
+    """Token header or session user, like the REST API; None when anonymous"""
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    if result is not None:
+        return result[0]
+    return request.user if request.user.is_authenticated else None
+
+
+def generate_with_events(user, emit):
+    """
+    Start or attach to the user's RecommendationJob (the same one POST generate/ uses),
+    calling emit(event, data) for:
+    - job: the job when the stream starts, and again on each change of a job run elsewhere;
+    - recommendation: a row as soon as its candidate is scored (id is null for new pairs);
+    - explanation: {recommended_user, explanation} when a new explanation is ready;
+    - done: the saved recommendations;
+    - error: {detail}.
+    recommendation and explanation events only come from a job this stream runs itself.
+    """
+    try:
+        job, created = start_recommendation_job(user)
+        emit('job', RecommendationJobSerializer(job).data)
+
+        if created:
+            run_recommendation_job(
+                job.id,
+                on_recommendation=lambda recommendation: emit(
+                    'recommendation', UserRecommendationSerializer(recommendation).data
+                ),
+                on_explained=lambda recommended_user_id, explanation: emit(
+                    'explanation', {'recommended_user': recommended_user_id, 'explanation': explanation}
+                )
+            )
+            job.refresh_from_db()
+        else:
+            # Another request or a worker runs it: relay its progress
+            job = wait_for_job(job.id, on_progress=lambda job: emit('job', RecommendationJobSerializer(job).data))
+            if job is None:
+                emit('error', {"detail": "Generating recommendations is taking too long. Please try again later."})
+                return
+
+        if job.status == RecommendationJob.FAILED or job.recommendations_count == 0:
+            emit('error', {"detail": job.detail or "Failed to generate recommendations"})
+            return
+
+        recommendations = UserRecommendation.objects.filter(user=user).select_related('recommended_user')
+        emit('done', {'recommendations': UserRecommendationSerializer(recommendations, many=True).data})
+    except Exception as e:
+        print(f"Error streaming recommendations for user {user.id}: {e}")
+        emit('error', {"detail": f"Error generating recommendations: {str(e)}"})
+    finally:
+        # The worker thread's connections aren't closed by the request cycle
+        connections.close_all()
+
+
+async def recommendation_events(user):
+    """Run the generation in a worker thread and relay its events as they happen"""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def emit(event, data):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    def run():
+        try:
+            generate_with_events(user, emit)
+        finally:
+            emit(None, None)
+
+    # The event loop stays free while the thread waits on the vector store and OpenAI
+    worker = asyncio.ensure_future(sync_to_async(run, thread_sensitive=False)())
+    while True:
+        event, data = await queue.get()
+        if event is None:
+            break
+        yield sse_event(event, data)
+    await worker
+
+
+@require_GET
+async def recommendation_stream(request):
+    """
+    Regenerate the current user's recommendations and stream them as server-sent events:
+    each recommendation as soon as it is scored, its explanation once the LLM returns.
+    A generation already running for the user (from another tab or POST generate/) is
+    joined instead of started again, and its progress is relayed.
+    Needs an ASGI server (see gptinder_back/asgi.py) to not hold a worker per stream.
+    """
+    user = await sync_to_async(authenticate)(request)
+    if user is None:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=401
+        )
+
+    return StreamingHttpResponse(
+        recommendation_events(user),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
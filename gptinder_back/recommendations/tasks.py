@@ -1,198 +1,303 @@
-import random
-import numpy as np
-import openai
-from celery import shared_task
+from celery import chord, shared_task
+from celery.signals import worker_process_init, worker_ready
 from django.conf import settings
-from django.db.models import Q
 
-from users.models import User
 from ai_chat.models import Message
-from .models import UserRecommendation
-from .embeddings import EmbeddingService
+from users.interests import common_interests, similar_users_by_tags
+from users.models import User
+from .models import ExplanationCacheEntry, UserRecommendation
+from .all_pairs import rebuild_all_user_neighbors
+from .analysis_schedule import pop_due_users
+from .candidates import excluded_user_ids, invalidate_excluded_user_ids
+from .clients import get_openai_client, reset_clients
+from .embeddings import get_embedding_service, profile_hash
+from .explanation_cache import explanation_cache, explanation_key
+from .jobs import run_recommendation_job
+from .message_scoring import cached_recent_messages, score_messages
+from .neighbors import exact_scores
+from .vector_store import ensure_vector_indexes
+
+
+# Part of the explanation cache key, bump it when the usefulness prompt changes
+USEFULNESS_PROMPT_VERSION = 1
+
+
+@worker_ready.connect
+def check_vector_indexes(**kwargs):
+    """Check (and create) the vector indexes once when a worker boots"""
+    try:
+        ensure_vector_indexes()
+    except Exception as e:
+        print(f"Error checking vector indexes: {e}")
+
+
+@worker_process_init.connect
+def reset_clients_after_fork(**kwargs):
+    """Pool processes open their own HTTP connections instead of inheriting the parent's"""
+    reset_clients()
+
+
+@shared_task
+def refresh_dirty_user_embeddings():
+    """Re-embed users whose interests or bio changed since their embedding was built"""
+    # Pool workers are daemonic and can't start processes for a full neighbour rebuild
+    return get_embedding_service().update_dirty_user_embeddings(neighbor_workers=1)
+
+
+@shared_task
+def rebuild_all_user_neighbors_task():
+    """Full rebuild of the UserNeighbor table from one in-memory all-pairs computation"""
+    # Pool workers are daemonic and can't start processes; BLAS still uses every core
+    return rebuild_all_user_neighbors(workers=1)
+
+
+@shared_task
+def index_message_task(message_id):
+    """Index a new user message for message-based recommendations, off the chat request"""
+    message = Message.objects.select_related('chat__user').filter(id=message_id).first()
+    if message is None:
+        return
+    get_embedding_service().index_message(message)
+
+
+@shared_task
+def sync_user_active_task(user_id):
+    """Update the is_active metadata of a user's vectors after the user was (de)activated"""
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return
+    get_embedding_service().sync_user_active(user)
+
+
+@shared_task
+def generate_recommendations_job(job_id):
+    """Run a RecommendationJob created by the generate endpoint"""
+    run_recommendation_job(job_id)
 
 
 @shared_task
 def analyze_messages_for_recommendations():
     """
     Periodically analyze user messages to find users that might be useful to each other.
-    The task:
-    1. Selects random users who have similar embeddings (profile-based)
+    The task selects the users due for analysis and fans out one analyze_user_messages
+    subtask per user; summarize_message_analysis aggregates their results when all are done.
+    """
+    # The most stale and active users first, a limited number to avoid overload
+    user_ids = pop_due_users(settings.MESSAGE_ANALYSIS_BATCH_SIZE)
+    if not user_ids:
+        return "No users due for message analysis"
+    
+    options = {'queue': settings.MESSAGE_ANALYSIS_QUEUE} if settings.MESSAGE_ANALYSIS_QUEUE else {}
+    chord(
+        analyze_user_messages.s(user_id).set(**options) for user_id in user_ids
+    )(summarize_message_analysis.s().set(**options))
+    return f"Dispatched message analysis of {len(user_ids)} users"
+
+
+@shared_task(
+    bind=True,
+    max_retries=settings.MESSAGE_ANALYSIS_MAX_RETRIES,
+    soft_time_limit=settings.MESSAGE_ANALYSIS_USER_TIME_LIMIT
+)
+def analyze_user_messages(self, user_id):
+    """
+    Message analysis of one user, retried on failure. Safe to run twice: existing pairs are
+    skipped. Always returns {user_id, created, error} so one bad user doesn't fail the chord.
+    """
+    try:
+        created = analyze_user_messages_for_recommendations(user_id)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=30 * 2 ** self.request.retries)
+        print(f"Error analyzing messages of user {user_id}: {e}")
+        return {'user_id': user_id, 'created': 0, 'error': str(e)}
+    return {'user_id': user_id, 'created': created, 'error': None}
+
+
+@shared_task
+def summarize_message_analysis(results):
+    """Summary of the analyze_user_messages results of a run"""
+    created = sum(result['created'] for result in results)
+    failed = sum(1 for result in results if result['error'])
+    summary = f"Created {created} new recommendations based on message analysis"
+    if failed:
+        summary += f" ({failed} of {len(results)} users failed)"
+    return summary
+
+
+def analyze_user_messages_for_recommendations(user_id):
+    """
+    1. Finds users who have similar embeddings (profile-based), the authors of the messages
+       closest to the user's recent messages in the message index and users sharing interest tags
     2. Analyzes their chat messages to find similar topics/interests
     3. If messages similarity is high, creates a recommendation
+    Returns the number of recommendations created.
     """
-    embedding_service = EmbeddingService()
+    user = User.objects.filter(id=user_id, embedding__isnull=False).first()
+    if user is None:
+        return 0
+    
+    messages = cached_recent_messages([user.id])
+    if user.id not in messages:
+        return 0
+    user_messages, user_matrix = messages[user.id]
     
-    # Get all users with embeddings
-    users = User.objects.filter(embedding__isnull=False).order_by('?')
+    # Candidates that weren't recommended to or chatting with this user yet: profile neighbours,
+    # users writing about the same things whatever their profile says,
+    embedding_service = get_embedding_service()
+    similar_users_data = embedding_service.find_similar_users(user.id, top_k=5, exclude_seen=True)
+    profile_scores = {data['user_id']: data['similarity_score'] for data in similar_users_data}
+    message_authors = [
+        author_id for author_id, _ in embedding_service.find_users_by_messages(
+            user.id, user_matrix, top_k=settings.MESSAGE_ANALYSIS_MESSAGE_CANDIDATES, exclude_seen=True
+        )
+        if author_id not in profile_scores
+    ]
+    # and users sharing the most interest tags (Jaccard top-k in SQL)
+    tag_users = [
+        tag_user_id for tag_user_id, _ in similar_users_by_tags(
+            user.id,
+            top_k=settings.MESSAGE_ANALYSIS_TAG_CANDIDATES,
+            exclude_user_ids=[*excluded_user_ids(user.id), *profile_scores, *message_authors]
+        )
+    ]
+    profile_scores.update(exact_scores(user.embedding, message_authors + tag_users))
+    similar_user_ids = list(profile_scores)
+    if not similar_user_ids:
+        return 0
     
-    # Limit to a reasonable number to avoid overload
-    max_users = min(50, users.count())
-    selected_users = users[:max_users]
+    # Recent messages (cached), existing pairs and candidate users, one query each
+    messages.update(cached_recent_messages(similar_user_ids))
+    existing_pairs = set(UserRecommendation.objects.filter(
+        user=user, recommended_user_id__in=similar_user_ids
+    ).values_list('recommended_user_id', flat=True))
+    candidate_users = User.objects.defer('embedding').in_bulk(similar_user_ids)
     
-    recommendations_count = 0
+    candidates = {
+        similar_user_id: profile_similarity
+        for similar_user_id, profile_similarity in profile_scores.items()
+        if similar_user_id not in existing_pairs and similar_user_id in messages
+    }
     
-    for user in selected_users:
-        # Find users with similar embeddings
-        similar_users_data = embedding_service.find_similar_users(user.id, top_k=5)
-        
-        if not similar_users_data:
-            continue
-            
-        # Get user's messages with embeddings
-        user_messages = Message.objects.filter(
-            chat__user=user,
-            role='user',
-            embedding__isnull=False
-        ).order_by('-created_at')[:20]  # Get recent messages
-        
-        if not user_messages:
-            continue
-            
-        # Extract message embeddings
-        user_msg_embeddings = [msg.embedding for msg in user_messages if msg.embedding]
+    # Max similarity and the most similar message pair per candidate, in one product
+    message_scores = score_messages(
+        user_matrix,
+        {similar_user_id: messages[similar_user_id][1] for similar_user_id in candidates}
+    )
+    
+    hits = []
+    for similar_user_id, (max_message_similarity, user_msg_idx, similar_user_msg_idx) in message_scores.items():
+        # Calculate overall relevance score (combine profile + message similarity)
+        relevance_score = (candidates[similar_user_id] + max_message_similarity) / 2
         
-        for similar_user_data in similar_users_data:
-            similar_user_id = similar_user_data['user_id']
-            profile_similarity = similar_user_data['similarity_score']
-            
-            # Skip if a recommendation already exists
-            if UserRecommendation.objects.filter(
-                user=user, 
-                recommended_user_id=similar_user_id
-            ).exists():
-                continue
-                
-            # Get similar user messages with embeddings
-            similar_user_messages = Message.objects.filter(
-                chat__user_id=similar_user_id,
-                role='user',
-                embedding__isnull=False
-            ).order_by('-created_at')[:20]
-            
-            if not similar_user_messages:
-                continue
-                
-            # Extract message embeddings for similar user
-            similar_user_msg_embeddings = [
-                msg.embedding for msg in similar_user_messages if msg.embedding
-            ]
-            
-            # Analyze message similarity
-            message_similarities = []
-            
-            # Compare embeddings of messages from both users
-            for embed1 in user_msg_embeddings:
-                for embed2 in similar_user_msg_embeddings:
-                    # Calculate cosine similarity
-                    similarity = calculate_cosine_similarity(embed1, embed2)
-                    message_similarities.append(similarity)
-            
-            # Check if there are any highly similar messages
-            if message_similarities:
-                # Get max similarity
-                max_message_similarity = max(message_similarities)
-                
-                # Calculate overall relevance score (combine profile + message similarity)
-                relevance_score = (profile_similarity + max_message_similarity) / 2
-                
-                # If messages are similar enough, create a recommendation
-                if max_message_similarity > 0.75 or relevance_score > 0.7:
-                    similar_user = User.objects.get(id=similar_user_id)
-                    
-                    # Find the most similar messages for explanation
-                    user_msg_idx, similar_user_msg_idx = find_most_similar_messages(
-                        user_msg_embeddings, similar_user_msg_embeddings
-                    )
-                    
-                    most_similar_user_msg = user_messages[user_msg_idx].content
-                    most_similar_other_msg = similar_user_messages[similar_user_msg_idx].content
-                    
-                    # Generate explanation based on the most similar messages
-                    explanation = generate_usefulness_explanation(
-                        user, similar_user, most_similar_user_msg, most_similar_other_msg
-                    )
-                    
-                    # Extract common interests
-                    user_interests = set(i.strip().lower() for i in user.interests.split(',') if i.strip())
-                    similar_interests = set(i.strip().lower() for i in similar_user.interests.split(',') if i.strip())
-                    common_interests = list(user_interests.intersection(similar_interests))
-                    
-                    # Create the recommendation
-                    UserRecommendation.objects.create(
-                        user=user,
-                        recommended_user=similar_user,
-                        similarity_score=relevance_score,
-                        common_interests=common_interests,
-                        explanation=explanation
-                    )
-                    
-                    recommendations_count += 1
-    
-    return f"Created {recommendations_count} new recommendations based on message analysis"
-
-
-def calculate_cosine_similarity(embed1, embed2):
-    """Calculate cosine similarity between two embedding vectors"""
-    if not embed1 or not embed2:
+        # If messages are similar enough, create a recommendation
+        if max_message_similarity > 0.75 or relevance_score > 0.7:
+            hits.append((similar_user_id, relevance_score, user_msg_idx, similar_user_msg_idx))
+    
+    if not hits:
         return 0
-        
-    a = np.array(embed1)
-    b = np.array(embed2)
     
-    # Compute cosine similarity
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+    shared_interests = common_interests(user.id, [similar_user_id for similar_user_id, *_ in hits])
+    
+    # Explanations based on the most similar messages
+    explanations = generate_usefulness_explanations(user, {
+        similar_user_id: (
+            candidate_users[similar_user_id],
+            user_messages[user_msg_idx],
+            messages[similar_user_id][0][similar_user_msg_idx]
+        )
+        for similar_user_id, _, user_msg_idx, similar_user_msg_idx in hits
+    })
+    
+    # ignore_conflicts makes bulk_create return every object, count the rows that actually went in
+    pairs = UserRecommendation.objects.filter(
+        user=user, recommended_user_id__in=[similar_user_id for similar_user_id, *_ in hits]
+    )
+    existing_count = pairs.count()
+    UserRecommendation.objects.bulk_create([
+        UserRecommendation(
+            user=user,
+            recommended_user=candidate_users[similar_user_id],
+            similarity_score=relevance_score,
+            common_interests=shared_interests[similar_user_id],
+            explanation=explanations[similar_user_id]
+        )
+        for similar_user_id, relevance_score, _, _ in hits
+    ], ignore_conflicts=True)
+    
+    # bulk_create sends no post_save signals
+    invalidate_excluded_user_ids([user.id])
+    
+    return pairs.count() - existing_count
 
 
-def find_most_similar_messages(user_embeddings, other_embeddings):
-    """Find indices of the most similar message pair between two users"""
-    max_similarity = -1
-    best_pair = (0, 0)
+def generate_usefulness_explanations(user1, pairs):
+    """
+    Explanations of why user1 and each candidate might be useful to each other.
+    pairs is {user2_id: (user2, msg1, msg2)}; cached ones come from one explanation cache
+    lookup, the rest from OpenAI. Returns {user2_id: explanation}.
+    """
+    keys = {
+        user2.id: explanation_key(
+            USEFULNESS_PROMPT_VERSION,
+            profile_hash(user1),
+            profile_hash(user2),
+            user1.first_name or user1.username,
+            user2.first_name or user2.username,
+            msg1[:200],
+            msg2[:200]
+        )
+        for user2, msg1, msg2 in pairs.values()
+    }
+    explanations = explanation_cache.get_many(ExplanationCacheEntry.MESSAGES, user1.id, keys)
     
-    for i, embed1 in enumerate(user_embeddings):
-        for j, embed2 in enumerate(other_embeddings):
-            similarity = calculate_cosine_similarity(embed1, embed2)
-            if similarity > max_similarity:
-                max_similarity = similarity
-                best_pair = (i, j)
+    generated = {}
+    for user2_id, (user2, msg1, msg2) in pairs.items():
+        if user2_id in explanations:
+            continue
+        try:
+            generated[user2_id] = request_usefulness_explanation(user1, user2, msg1, msg2)
+        except Exception as e:
+            print(f"Error generating explanation: {e}")
+            explanations[user2_id] = f"{user2.first_name or user2.username} has been discussing topics that might be relevant to your interests!"
     
-    return best_pair
+    if generated:
+        explanation_cache.set_many(ExplanationCacheEntry.MESSAGES, user1.id, generated, keys)
+    explanations.update(generated)
+    return explanations
 
 
-def generate_usefulness_explanation(user1, user2, msg1, msg2):
-    """Generate an explanation of why these users might be useful to each other"""
-    try:
-        prompt = f"""
-        I need to explain why these two people might be useful to each other based on their messages.
-        
-        Person 1:
-        Name: {user1.first_name or user1.username}
-        Interests: {user1.interests}
-        Example message: {msg1[:200]}
-        
-        Person 2:
-        Name: {user2.first_name or user2.username}
-        Interests: {user2.interests}
-        Example message: {msg2[:200]}
-        
-        Please provide a brief, natural sounding explanation of why these two people might be useful to each other.
-        Focus on their specific shared interests and the content of their messages.
-        Keep it short (max 40 words) and casual, addressing Person 1 directly.
-        
-        Example format: "Hey [Person 1 name], [Person 2 name] seems to be discussing similar topics around [specific topic from messages]. You might find their perspective on [something from messages] helpful!"
-        """
-        
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a friendly AI helping to explain why two people might be useful to each other."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=150,
-            temperature=0.7
-        )
-        
-        explanation = response.choices[0].message.content.strip()
-        return explanation
-    except Exception as e:
-        print(f"Error generating explanation: {e}")
-        return f"{user2.first_name or user2.username} has been discussing topics that might be relevant to your interests!" 
\ No newline at end of file
+def request_usefulness_explanation(user1, user2, msg1, msg2):
+    """Ask OpenAI why these users might be useful to each other based on their messages, raises on failure"""
+    # Bump USEFULNESS_PROMPT_VERSION when changing the prompt
+    prompt = f"""
+    I need to explain why these two people might be useful to each other based on their messages.
+    
+    Person 1:
+    Name: {user1.first_name or user1.username}
+    Interests: {user1.interests}
+    Example message: {msg1[:200]}
+    
+    Person 2:
+    Name: {user2.first_name or user2.username}
+    Interests: {user2.interests}
+    Example message: {msg2[:200]}
+    
+    Please provide a brief, natural sounding explanation of why these two people might be useful to each other.
+    Focus on their specific shared interests and the content of their messages.
+    Keep it short (max 40 words) and casual, addressing Person 1 directly.
+    
+    Example format: "Hey [Person 1 name], [Person 2 name] seems to be discussing similar topics around [specific topic from messages]. You might find their perspective on [something from messages] helpful!"
+    """
+    
+    response = get_openai_client().chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": "You are a friendly AI helping to explain why two people might be useful to each other."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=150,
+        temperature=0.7
+    )
+    
+    return response.choices[0].message.content.strip()
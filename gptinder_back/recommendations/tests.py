@@ -1,3 +1,565 @@
-from django.test import TestCase
+import shutil
+import tempfile
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from users.models import User
+from .all_pairs import block_size, block_top_k, rebuild_all_user_neighbors
+from .bitsets import IdBitset
+from .candidates import candidate_filter
+from .hnsw import HNSWIndex
+from .models import UserChat, UserNeighbor
+from .neighbors import rebuild_user_neighbors, refresh_user_neighbors, search_neighbors
+from .quantization import ProductQuantizer, ScalarQuantizer, normalize_rows
+from .vector_store import EMBEDDING_DIMENSION, HNSWVectorStore, NumpyVectorStore, QuantizedVectorStore, filter_mask, matches_filter
+
+
+def random_vectors(count, dimension=32, seed=0):
+    """Clustered random vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(8, dimension))
+    return (centers[rng.integers(8, size=count)] + rng.normal(scale=0.5, size=(count, dimension))).astype(np.float32)
+
+
+def brute_force_top_k(matrix, query, k, allowed=None):
+    """Exact top-k row indices by cosine similarity, optionally among allowed rows only"""
+    scores = normalize_rows(matrix) @ normalize_rows(query)[0]
+    if allowed is not None:
+        scores[~allowed] = -np.inf
+    order = np.argsort(-scores, kind='stable')[:k]
+    return [int(index) for index in order if scores[index] > -np.inf]
+
+
+def recall(found, expected):
+    return len(set(found) & set(expected)) / len(expected)
+
+
+class HNSWIndexTests(SimpleTestCase):
+    """HNSWIndex against exact search on small random data"""
+
+    def setUp(self):
+        self.vectors = random_vectors(600)
+        self.queries = random_vectors(30, seed=1)
+        self.index = HNSWIndex(32, M=8, ef_construction=100, ef_search=64, seed=0)
+        for label, vector in enumerate(self.vectors):
+            self.index.add(label, vector)
+
+    def test_recall(self):
+        recalls = [
+            recall(
+                [label for label, _ in self.index.search(query, k=10)],
+                brute_force_top_k(self.vectors, query, 10)
+            )
+            for query in self.queries
+        ]
+        self.assertGreaterEqual(np.mean(recalls), 0.95)
+
+    def test_scores_are_cosine_similarities(self):
+        query = self.queries[0]
+        for label, score in self.index.search(query, k=5):
+            expected = float(normalize_rows(self.vectors[label])[0] @ normalize_rows(query)[0])
+            self.assertAlmostEqual(score, expected, places=5)
+
+    def test_filtered_search(self):
+        allowed = np.arange(len(self.vectors)) % 7 == 0
+        recalls = []
+        for query in self.queries:
+            found = [label for label, _ in self.index.search(query, k=10, accept=lambda label: label % 7 == 0)]
+            self.assertEqual(len(found), 10)
+            self.assertTrue(all(label % 7 == 0 for label in found))
+            recalls.append(recall(found, brute_force_top_k(self.vectors, query, 10, allowed)))
+        self.assertGreaterEqual(np.mean(recalls), 0.9)
+
+    def test_deleted_vectors_are_skipped(self):
+        deleted = set(range(0, 600, 3))
+        for label in deleted:
+            self.index.delete(label)
+        self.assertEqual(len(self.index), 400)
+        self.assertEqual(self.index.tombstones, 200)
+
+        allowed = np.array([label not in deleted for label in range(600)])
+        recalls = []
+        for query in self.queries:
+            found = [label for label, _ in self.index.search(query, k=10)]
+            self.assertFalse(deleted & set(found))
+            recalls.append(recall(found, brute_force_top_k(self.vectors, query, 10, allowed)))
+        self.assertGreaterEqual(np.mean(recalls), 0.9)
+
+    def test_compact_drops_tombstones(self):
+        for label in range(0, 600, 2):
+            self.index.delete(label)
+        self.index.compact()
+        self.assertEqual(self.index.tombstones, 0)
+        self.assertEqual(len(self.index), 300)
+
+        allowed = np.arange(600) % 2 == 1
+        recalls = [
+            recall(
+                [label for label, _ in self.index.search(query, k=10)],
+                brute_force_top_k(self.vectors, query, 10, allowed)
+            )
+            for query in self.queries
+        ]
+        self.assertGreaterEqual(np.mean(recalls), 0.95)
+
+    def test_readding_a_label_replaces_its_vector(self):
+        self.index.add(5, self.queries[0])
+        label, score = self.index.search(self.queries[0], k=1)[0]
+        self.assertEqual(label, 5)
+        self.assertAlmostEqual(score, 1.0, places=5)
+        self.assertEqual(len(self.index), 600)
+
+
+class HNSWVectorStoreTests(SimpleTestCase):
+    """Snapshot and log replay between stores sharing a directory, as separate processes do"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.vectors = random_vectors(200)
+
+    def make_store(self):
+        return HNSWVectorStore('users', dimension=32, directory=self.directory, M=8, ef_construction=100)
+
+    def upsert(self, store, labels):
+        store.upsert([
+            {'id': f"user:{label}", 'values': self.vectors[label], 'metadata': {'user_id': label}}
+            for label in labels
+        ])
+
+    def search(self, store, query, **kwargs):
+        return [match['id'] for match in store.query(query, top_k=10, **kwargs)]
+
+    def test_other_store_replays_the_log(self):
+        writer = self.make_store()
+        reader = self.make_store()
+        self.upsert(writer, range(200))
+        writer.delete(['user:0', 'user:1'])
+
+        self.assertEqual(len(reader), 198)
+        query = self.vectors[0]
+        self.assertEqual(self.search(reader, query), self.search(writer, query))
+        self.assertNotIn('user:0', self.search(reader, query))
+
+    def test_snapshot_then_log(self):
+        writer = self.make_store()
+        self.upsert(writer, range(150))
+        writer.snapshot()
+        self.upsert(writer, range(150, 200))
+        writer.delete(['user:3'])
+
+        restarted = self.make_store()
+        self.assertEqual(len(restarted), 199)
+        for query in self.vectors[:20]:
+            self.assertEqual(self.search(restarted, query), self.search(writer, query))
+
+    def test_metadata_filter(self):
+        store = self.make_store()
+        self.upsert(store, range(200))
+        matches = store.query(
+            self.vectors[0], top_k=10, include_metadata=True,
+            filter={'user_id': {'$nin': [0, 1, 2], '$lt': 100}}
+        )
+        self.assertEqual(len(matches), 10)
+        for match in matches:
+            self.assertNotIn(match['metadata']['user_id'], (0, 1, 2))
+            self.assertLess(match['metadata']['user_id'], 100)
+
+    def test_fill_if_empty_loads_once(self):
+        store = self.make_store()
+        calls = []
+
+        def load():
+            calls.append(1)
+            self.upsert(store, range(10))
+
+        store.fill_if_empty(load)
+        self.make_store().fill_if_empty(load)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(store), 10)
+
+
+class QuantizerTests(SimpleTestCase):
+    """int8 and product quantization codes and their asymmetric scores"""
+
+    def setUp(self):
+        self.vectors = normalize_rows(random_vectors(500))
+        self.query = normalize_rows(random_vectors(1, seed=1))[0]
+
+    def test_int8_round_trip(self):
+        quantizer = ScalarQuantizer()
+        codes, scales = quantizer.encode(self.vectors)
+        self.assertEqual(codes.dtype, np.int8)
+        error = np.abs(quantizer.decode(codes, scales) - self.vectors)
+        # Rounding moves each component by at most half a step
+        self.assertTrue(np.all(error <= scales[:, None] / 2 + 1e-6))
+
+    def test_int8_scores_match_decoded_vectors(self):
+        quantizer = ScalarQuantizer()
+        codes, scales = quantizer.encode(self.vectors)
+        np.testing.assert_allclose(
+            quantizer.scores(self.query, codes, scales, chunk_size=64),
+            quantizer.decode(codes, scales) @ self.query,
+            rtol=1e-5, atol=1e-5
+        )
+
+    def test_pq_scores_match_decoded_vectors(self):
+        quantizer = ProductQuantizer(32, subspaces=8, centroids=32, iterations=10)
+        quantizer.train(self.vectors)
+        codes, _ = quantizer.encode(self.vectors)
+        self.assertEqual(codes.shape, (500, 8))
+        np.testing.assert_allclose(
+            quantizer.scores(self.query, codes, chunk_size=64),
+            quantizer.decode(codes) @ self.query,
+            rtol=1e-5, atol=1e-5
+        )
+
+    def test_pq_codes_beat_random_centroids(self):
+        quantizer = ProductQuantizer(32, subspaces=8, centroids=32, iterations=10)
+        quantizer.train(self.vectors)
+        codes, _ = quantizer.encode(self.vectors)
+        error = np.linalg.norm(quantizer.decode(codes) - self.vectors, axis=1).mean()
+
+        random_codes = np.random.default_rng(0).integers(32, size=codes.shape).astype(np.uint8)
+        random_error = np.linalg.norm(quantizer.decode(random_codes) - self.vectors, axis=1).mean()
+        self.assertLess(error, random_error / 2)
+
+    def test_pq_dimension_must_split_evenly(self):
+        with self.assertRaises(ValueError):
+            ProductQuantizer(30, subspaces=8)
+
+
+class QuantizedVectorStoreTests(SimpleTestCase):
+    """Search on codes plus exact re-ranking against brute force"""
+
+    def setUp(self):
+        self.vectors = random_vectors(600)
+        self.queries = random_vectors(20, seed=1)
+
+    def rerank_loader(self, vector_ids):
+        return {vector_id: self.vectors[int(vector_id.split(':')[1])] for vector_id in vector_ids}
+
+    def make_store(self, method, **kwargs):
+        store = QuantizedVectorStore(
+            dimension=32, method=method, rerank_candidates=50, pq_subspaces=8,
+            pq_train_size=300, rerank_loader=self.rerank_loader, **kwargs
+        )
+        store.upsert([
+            {'id': f"message:{index}", 'values': vector, 'metadata': {'user_id': index % 50}}
+            for index, vector in enumerate(self.vectors)
+        ])
+        return store
+
+    def assert_matches_brute_force(self, store, min_recall, allowed=None, filter=None):
+        recalls = []
+        for query in self.queries:
+            matches = store.query(query, top_k=10, filter=filter)
+            found = [int(match['id'].split(':')[1]) for match in matches]
+            for index, match in zip(found, matches):
+                # Re-ranked scores are exact
+                self.assertAlmostEqual(
+                    match['score'],
+                    float(normalize_rows(self.vectors[index])[0] @ normalize_rows(query)[0]),
+                    places=5
+                )
+                if allowed is not None:
+                    self.assertTrue(allowed[index])
+            recalls.append(recall(found, brute_force_top_k(self.vectors, query, 10, allowed)))
+        self.assertGreaterEqual(np.mean(recalls), min_recall)
+
+    def test_int8(self):
+        self.assert_matches_brute_force(self.make_store('int8'), 1.0)
+
+    def test_pq(self):
+        store = self.make_store('pq')
+        self.assertTrue(store.quantizer.trained)
+        self.assert_matches_brute_force(store, 0.9)
+
+    def test_pq_before_training_is_exact(self):
+        store = QuantizedVectorStore(dimension=32, method='pq', pq_subspaces=8, pq_train_size=1000)
+        store.upsert([{'id': f"message:{index}", 'values': vector} for index, vector in enumerate(self.vectors)])
+        self.assertFalse(store.quantizer.trained)
+        self.assert_matches_brute_force(store, 1.0)
+
+    def test_bitset_filter(self):
+        excluded = IdBitset.from_ids(range(0, 50, 2))
+        allowed = np.array([index % 50 % 2 == 1 for index in range(600)])
+        self.assert_matches_brute_force(
+            self.make_store('int8'), 1.0, allowed=allowed, filter={'user_id': {'$nin': excluded}}
+        )
+
+    def test_delete(self):
+        store = self.make_store('pq')
+        store.delete([f"message:{index}" for index in range(0, 600, 2)])
+        self.assertEqual(len(store), 300)
+        self.assert_matches_brute_force(store, 0.9, allowed=np.arange(600) % 2 == 1)
+
+
+@override_settings(USER_NEIGHBOR_COUNT=5, USER_NEIGHBOR_PATCH_CANDIDATES=10)
+class RefreshUserNeighborsTests(TestCase):
+    """Incrementally patched UserNeighbor rows against a full exact rebuild"""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.store = NumpyVectorStore(dimension=32)
+        self.users = [
+            User.objects.create(username=f"user{index}", interests='python', bio='bio')
+            for index in range(60)
+        ]
+        for user, vector in zip(self.users, random_vectors(60)):
+            self.set_embedding(user, vector)
+        rebuild_user_neighbors(self.store, self.users)
+
+    def set_embedding(self, user, vector):
+        user.embedding = vector
+        user.embedding_updated_at = timezone.now()
+        user.save(update_fields=['embedding', 'embedding_updated_at'])
+        self.store.upsert([{'id': f"user:{user.id}", 'values': vector, 'metadata': {'user_id': user.id}}])
+
+    def move(self, users, vectors):
+        for user, vector in zip(users, vectors):
+            self.set_embedding(user, vector)
+        refresh_user_neighbors(self.store, users)
+
+    def assert_neighbors_exact(self):
+        """
+        Every list holds the user's true top-k scores. Tied scores make several
+        lists correct, so scores are compared rather than neighbour ids.
+        """
+        for user in self.users:
+            rows = list(UserNeighbor.objects.filter(user=user).order_by('rank').values_list('neighbor_id', 'score'))
+            expected = search_neighbors(self.store, user.id, user.embedding, 5)
+            self.assertNotIn(user.id, [neighbor_id for neighbor_id, _ in rows])
+            np.testing.assert_allclose(
+                [score for _, score in rows], [score for _, score in expected], atol=1e-5,
+                err_msg=f"neighbours of user {user.id}"
+            )
+
+    def test_random_moves(self):
+        for round in range(5):
+            moved = [self.users[index] for index in self.rng.choice(60, 3, replace=False)]
+            self.move(moved, random_vectors(3, seed=round + 10))
+            self.assert_neighbors_exact()
+
+    def test_move_into_another_cluster(self):
+        # Jump next to user 0: enters lists the user was nowhere near before
+        self.move([self.users[1]], [self.users[0].embedding + 0.01])
+        self.assert_neighbors_exact()
+
+    def test_ties_at_the_last_rank(self):
+        # Eight identical users tie for every slot of each other's lists
+        twin = random_vectors(1, seed=20)[0]
+        twins = self.users[:8]
+        self.move(twins, [twin] * 8)
+        self.assert_neighbors_exact()
+
+        # A ninth twin ties with the k-th score of the twins' lists
+        self.move([self.users[8]], [twin])
+        self.assert_neighbors_exact()
+
+        # A listed twin leaves, another twin has to take its place
+        listed = UserNeighbor.objects.filter(user=twins[0], rank=1).values_list('neighbor_id', flat=True).get()
+        self.move([next(user for user in self.users if user.id == listed)], random_vectors(1, seed=21))
+        self.assert_neighbors_exact()
+
+    def test_several_users_move_at_once(self):
+        moved = self.users[10:30]
+        self.move(moved, random_vectors(20, seed=30))
+        self.assert_neighbors_exact()
+
+
+class IdBitsetTests(SimpleTestCase):
+    """IdBitset against a plain set"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.ids = set(rng.integers(0, 5000, size=300).tolist())
+        self.bitset = IdBitset.from_ids(self.ids)
+
+    def test_membership(self):
+        self.assertEqual(len(self.bitset), len(self.ids))
+        self.assertEqual(list(self.bitset), sorted(self.ids))
+        for candidate in range(5100):
+            self.assertEqual(candidate in self.bitset, candidate in self.ids)
+        self.assertNotIn(-1, self.bitset)
+        self.assertNotIn('1', self.bitset)
+
+    def test_contains_many(self):
+        candidates = np.arange(-5, 6000)
+        np.testing.assert_array_equal(
+            self.bitset.contains_many(candidates),
+            [candidate in self.ids for candidate in candidates.tolist()]
+        )
+
+    def test_union_and_bytes(self):
+        other = IdBitset.from_ids([1, 7000])
+        self.assertEqual(set(self.bitset | other), self.ids | {1, 7000})
+        self.assertEqual(set(IdBitset.from_bytes(self.bitset.to_bytes())), self.ids)
+
+        copy = self.bitset.copy()
+        copy.add(9999)
+        self.assertNotIn(9999, self.bitset)
+
+    def test_negative_ids_are_rejected(self):
+        with self.assertRaises(ValueError):
+            IdBitset.from_ids([3, -1])
+
+
+class FilterTests(SimpleTestCase):
+    """Bitset filters in filter_mask and inside vector search"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.metadata = [
+            {'user_id': int(user_id), 'is_active': bool(active)}
+            for user_id, active in zip(rng.integers(0, 200, size=500), rng.random(500) < 0.8)
+        ]
+        self.metadata[3] = None
+        self.excluded = set(range(0, 200, 3))
+
+    def test_filter_mask_matches_matches_filter(self):
+        filters = [
+            {'is_active': True, 'user_id': {'$nin': IdBitset.from_ids(self.excluded)}},
+            {'user_id': {'$in': IdBitset.from_ids(self.excluded), '$gte': 50}},
+            {'user_id': {'$nin': list(self.excluded)}},
+        ]
+        for filter in filters:
+            np.testing.assert_array_equal(
+                filter_mask(self.metadata, filter),
+                [matches_filter(item, filter) for item in self.metadata]
+            )
+        # A bitset behaves like the list of its ids
+        np.testing.assert_array_equal(filter_mask(self.metadata, filters[0]), filter_mask(self.metadata, {
+            'is_active': True, 'user_id': {'$nin': list(self.excluded)}
+        }))
+
+    def test_filtered_search_returns_top_k_allowed(self):
+        vectors = random_vectors(500)
+        store = NumpyVectorStore(dimension=32)
+        store.upsert([
+            {'id': f"user:{index}", 'values': vector, 'metadata': metadata}
+            for index, (vector, metadata) in enumerate(zip(vectors, self.metadata))
+        ])
+        filter = {'is_active': True, 'user_id': {'$nin': IdBitset.from_ids(self.excluded)}}
+        allowed = np.array([matches_filter(item, filter) for item in self.metadata])
+
+        for query in random_vectors(10, seed=1):
+            found = [int(match['id'].split(':')[1]) for match in store.query(query, top_k=10, filter=filter)]
+            self.assertEqual(found, brute_force_top_k(vectors, query, 10, allowed))
+
+
+class CandidateFilterTests(TestCase):
+    """Active users are filtered on metadata, recency and exclusions on bitsets"""
+
+    def setUp(self):
+        # Active-user and exclusion bitsets are cached between calls
+        cache.clear()
+        self.user = User.objects.create(username='user', interests='python', bio='bio')
+
+    @override_settings(RECOMMENDATION_ACTIVE_DAYS=0)
+    def test_active_users_on_metadata(self):
+        filter = candidate_filter(self.user.id, exclude_seen=True)
+        self.assertIs(filter['is_active'], True)
+        self.assertNotIn('$in', filter['user_id'])
+        self.assertIn(self.user.id, filter['user_id']['$nin'])
+        self.assertTrue(matches_filter({'user_id': self.user.id + 1, 'is_active': True}, filter))
+        self.assertFalse(matches_filter({'user_id': self.user.id + 1, 'is_active': False}, filter))
+
+    def test_chat_partners_are_excluded(self):
+        partner = User.objects.create(username='partner', interests='python', bio='bio')
+        stranger = User.objects.create(username='stranger', interests='python', bio='bio')
+        chat = UserChat.objects.create()
+        chat.participants.add(self.user, partner)
+
+        excluded = candidate_filter(self.user.id, exclude_seen=True)['user_id']['$nin']
+        self.assertIn(partner.id, excluded)
+        self.assertNotIn(stranger.id, excluded)
+        self.assertNotIn(partner.id, candidate_filter(self.user.id)['user_id']['$nin'])
+
+    @override_settings(RECOMMENDATION_ACTIVE_DAYS=7)
+    def test_recency_window_uses_active_bitset(self):
+        other = User.objects.create(username='other', interests='python', bio='bio')
+        filter = candidate_filter(self.user.id)
+        self.assertIn(other.id, filter['user_id']['$in'])
+        self.assertTrue(matches_filter({'user_id': other.id, 'is_active': True}, filter))
+        self.assertFalse(matches_filter({'user_id': other.id + 100, 'is_active': True}, filter))
+
+
+class BlockTopKTests(SimpleTestCase):
+    """Blocked all-pairs top-k against brute force"""
+
+    def setUp(self):
+        self.matrix = normalize_rows(random_vectors(120))
+
+    def brute_force(self, row, k):
+        scores = self.matrix @ self.matrix[row]
+        scores[row] = -np.inf
+        return np.sort(scores)[::-1][:k]
+
+    def test_blocks_match_brute_force(self):
+        for start, stop, k in [(0, 120, 10), (0, 1, 5), (37, 64, 10), (119, 120, 119)]:
+            indices, scores = block_top_k(self.matrix, start, stop, k)
+            self.assertEqual(indices.shape, (stop - start, k))
+            for offset, row in enumerate(range(start, stop)):
+                self.assertNotIn(row, indices[offset])
+                np.testing.assert_allclose(scores[offset], self.brute_force(row, k), atol=1e-5)
+                np.testing.assert_allclose(
+                    scores[offset], self.matrix[indices[offset]] @ self.matrix[row], atol=1e-5
+                )
+
+    def test_block_size_fits_the_budget(self):
+        self.assertEqual(block_size(1000, 2, 1000 * 2 * 16 * 50), 50)
+        # Always at least one row, however small the budget
+        self.assertEqual(block_size(1000, 4, 1), 1)
+
+
+@override_settings(USER_NEIGHBOR_COUNT=5)
+class RebuildAllUserNeighborsTests(TestCase):
+    """The all-pairs rebuild writes every user's exact top-k"""
+
+    def setUp(self):
+        self.store = NumpyVectorStore()
+        self.users = []
+        now = timezone.now()
+        for index, vector in enumerate(random_vectors(40, dimension=EMBEDDING_DIMENSION)):
+            user = User.objects.create(
+                username=f"user{index}", interests='python', bio='bio',
+                embedding=vector, embedding_updated_at=now
+            )
+            self.users.append(user)
+            self.store.upsert([{'id': f"user:{user.id}", 'values': vector, 'metadata': {'user_id': user.id}}])
+
+    def assert_neighbors_exact(self):
+        for user in self.users:
+            rows = UserNeighbor.objects.filter(user=user).order_by('rank')
+            self.assertEqual([row.rank for row in rows], [1, 2, 3, 4, 5])
+            self.assertTrue(all(row.embedding_version == user.embedding_updated_at for row in rows))
+            expected = search_neighbors(self.store, user.id, user.embedding, 5)
+            np.testing.assert_allclose(
+                [row.score for row in rows], [score for _, score in expected], atol=1e-5
+            )
+
+    def test_single_block(self):
+        self.assertEqual(rebuild_all_user_neighbors(workers=1), 40)
+        self.assertEqual(UserNeighbor.objects.count(), 200)
+        self.assert_neighbors_exact()
+
+    def test_many_blocks(self):
+        # A budget of a few rows per block
+        rebuild_all_user_neighbors(workers=1, memory_budget=40 * 16 * 3)
+        self.assert_neighbors_exact()
+
+    def test_worker_processes(self):
+        rebuild_all_user_neighbors(workers=2, memory_budget=40 * 2 * 16 * 7)
+        self.assert_neighbors_exact()
+
+    def test_replaces_stale_rows(self):
+        UserNeighbor.objects.create(
+            user=self.users[0], neighbor=self.users[1], score=2.0, rank=1, embedding_version=None
+        )
+        rebuild_all_user_neighbors(workers=1)
+        self.assertEqual(UserNeighbor.objects.count(), 200)
+        self.assert_neighbors_exact()
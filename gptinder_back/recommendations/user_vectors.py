@@ -0,0 +1,128 @@
+from collections import deque
+
+import numpy as np
+from django.conf import settings
+
+from ai_chat.models import Message
+from .models import UserVector
+from .quantization import normalize_rows
+
+
+# Vector kinds and the vector store namespace each one is indexed in
+PROFILE = 'profile'
+USER_VECTOR_NAMESPACES = {
+    PROFILE: 'users',
+    UserVector.RECENT: 'user_recent',
+    UserVector.LONG_TERM: 'user_long_term',
+}
+
+
+def message_centroid(embeddings):
+    """
+    Mean of the normalized message embeddings. It is stored unnormalized so it can be
+    updated incrementally; cosine search normalizes it anyway.
+    """
+    return normalize_rows(np.vstack(embeddings)).mean(axis=0)
+
+
+def user_messages(user_ids=None):
+    """(user_id, embedding) of user-role AI chat messages (of all users by default), per user oldest first"""
+    messages = Message.objects.filter(role='user', embedding__isnull=False)
+    if user_ids is not None:
+        messages = messages.filter(chat__user_id__in=user_ids)
+    return messages.order_by('chat__user_id', 'created_at', 'id').values_list('chat__user_id', 'embedding')
+
+
+def compute_user_vectors(messages):
+    """
+    One pass over (user_id, embedding) pairs grouped by user, oldest first.
+    Yields (user_id, {kind: (centroid, message_count)}) per user.
+    """
+    recent_count = settings.USER_RECENT_MESSAGES
+    current_user = None
+    total = None
+    count = 0
+    recent = deque(maxlen=recent_count)
+
+    def vectors():
+        return {
+            UserVector.RECENT: (message_centroid(recent), len(recent)),
+            UserVector.LONG_TERM: (total / count, count),
+        }
+
+    for user_id, embedding in messages:
+        if user_id != current_user:
+            if current_user is not None:
+                yield current_user, vectors()
+            current_user = user_id
+            total = np.zeros(len(embedding), dtype=np.float32)
+            count = 0
+            recent.clear()
+
+        embedding = normalize_rows(embedding)[0]
+        total += embedding
+        count += 1
+        recent.append(embedding)
+
+    if current_user is not None:
+        yield current_user, vectors()
+
+
+def add_message_to_vectors(user_id, embedding):
+    """
+    Fold one new message into a user's vectors: the long-term centroid is updated
+    as a running mean, the recent one is recomputed from the latest messages.
+    Returns {kind: centroid}.
+    """
+    embedding = normalize_rows(embedding)[0]
+    stored = {vector.kind: vector for vector in UserVector.objects.filter(user_id=user_id)}
+
+    recent = list(
+        Message.objects.filter(
+            chat__user_id=user_id,
+            role='user',
+            embedding__isnull=False
+        ).order_by('-created_at', '-id').values_list('embedding', flat=True)[:settings.USER_RECENT_MESSAGES]
+    ) or [embedding]
+
+    long_term = stored.get(UserVector.LONG_TERM)
+    if long_term is None:
+        # No running mean yet: build it from all messages
+        long_term_vector, long_term_count = next(
+            compute_user_vectors(user_messages([user_id]).iterator())
+        )[1][UserVector.LONG_TERM]
+    else:
+        long_term_count = long_term.message_count + 1
+        long_term_vector = (long_term.embedding * long_term.message_count + embedding) / long_term_count
+
+    return save_user_vectors(user_id, {
+        UserVector.RECENT: (message_centroid(recent), len(recent)),
+        UserVector.LONG_TERM: (long_term_vector, long_term_count),
+    })
+
+
+def save_user_vectors(user_id, vectors):
+    """Store {kind: (centroid, message_count)} for a user, returns {kind: centroid}"""
+    for kind, (vector, message_count) in vectors.items():
+        UserVector.objects.update_or_create(
+            user_id=user_id,
+            kind=kind,
+            defaults={'embedding': vector, 'message_count': message_count}
+        )
+    return {kind: vector for kind, (vector, _) in vectors.items()}
+
+
+def _load_vectors(kind, vector_ids):
+    user_ids = [int(vector_id.split(':', 1)[1]) for vector_id in vector_ids]
+    vectors = UserVector.objects.filter(user_id__in=user_ids, kind=kind).values_list('user_id', 'embedding')
+    return {f"user:{user_id}": embedding for user_id, embedding in vectors}
+
+
+def load_recent_vectors(vector_ids):
+    """Recent-message centroids for vector ids like 'user:42'"""
+    return _load_vectors(UserVector.RECENT, vector_ids)
+
+
+def load_long_term_vectors(vector_ids):
+    """Long-term message centroids for vector ids like 'user:42'"""
+    return _load_vectors(UserVector.LONG_TERM, vector_ids)
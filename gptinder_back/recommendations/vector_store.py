@@ -0,0 +1,777 @@
+import base64
+import fcntl
+import json
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .bitsets import IdBitset
+from .clients import get_pinecone_client
+from .hnsw import HNSWIndex
+from .quantization import ProductQuantizer, ScalarQuantizer, normalize_rows
+
+
+# OpenAI text-embedding-ada-002 dimension
+EMBEDDING_DIMENSION = 1536
+
+# Pinecone query limits: values in one $in / $nin condition, and top_k
+PINECONE_MAX_FILTER_VALUES = 10000
+PINECONE_MAX_TOP_K = 1000
+
+
+def chunked(iterable, size):
+    """Yield lists of up to size items from any iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def matches_filter(metadata, filter):
+    """
+    Check metadata against a Pinecone-style filter, e.g.
+    {'is_active': True, 'user_id': {'$nin': [1, 2]}}
+    """
+    if not filter:
+        return True
+
+    metadata = metadata or {}
+    for field, condition in filter.items():
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+
+        for op, expected in condition.items():
+            if op == '$eq' and value != expected:
+                return False
+            if op == '$ne' and value == expected:
+                return False
+            if op == '$in' and value not in expected:
+                return False
+            if op == '$nin' and value in expected:
+                return False
+            if op in ('$gt', '$gte', '$lt', '$lte'):
+                if value is None:
+                    return False
+                if op == '$gt' and not value > expected:
+                    return False
+                if op == '$gte' and not value >= expected:
+                    return False
+                if op == '$lt' and not value < expected:
+                    return False
+                if op == '$lte' and not value <= expected:
+                    return False
+    return True
+
+
+def filter_mask(metadata, filter):
+    """
+    matches_filter() over a list of metadata dicts as a boolean mask.
+    '$in' / '$nin' conditions with an IdBitset are checked for all rows at once.
+    """
+    mask = np.ones(len(metadata), dtype=bool)
+    rest = {}
+    for field, condition in filter.items():
+        if not isinstance(condition, dict):
+            rest[field] = condition
+            continue
+
+        for op, expected in condition.items():
+            if op in ('$in', '$nin') and isinstance(expected, IdBitset):
+                values = np.fromiter(
+                    (-1 if not item or item.get(field) is None else item[field] for item in metadata),
+                    dtype=np.int64,
+                    count=len(metadata)
+                )
+                found = expected.contains_many(values)
+                mask &= found if op == '$in' else ~found
+            else:
+                rest.setdefault(field, {})[op] = expected
+
+    if rest:
+        mask &= np.fromiter(
+            (matches_filter(item, rest) for item in metadata),
+            dtype=bool,
+            count=len(metadata)
+        )
+    return mask
+
+
+class VectorStore:
+    """
+    Interface for vector similarity backends.
+    Vectors are dicts with 'id', 'values' and optional 'metadata',
+    query results are dicts with 'id', 'score' and 'metadata'.
+    """
+    # Local stores live in the process and are filled from the database on first use
+    local = False
+
+    def upsert(self, vectors):
+        """Insert or replace vectors"""
+        raise NotImplementedError
+
+    def upsert_many(self, vectors, batch_size=None, max_concurrency=None):
+        """
+        Upsert an iterable of vectors in chunks of batch_size, returns the number written.
+        The iterable is consumed lazily, so generators keep memory flat.
+        """
+        batch_size = batch_size or settings.VECTOR_UPSERT_BATCH_SIZE
+        count = 0
+        for chunk in chunked(vectors, batch_size):
+            self.upsert(chunk)
+            count += len(chunk)
+        return count
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=False):
+        """
+        Return up to top_k matches ordered by descending cosine similarity.
+        filter is applied during the search, so top_k matches come back whenever
+        that many vectors pass it. '$in' / '$nin' accept lists or IdBitsets.
+        """
+        raise NotImplementedError
+
+    def delete(self, ids):
+        """Remove vectors by id"""
+        raise NotImplementedError
+
+    def ensure_index(self):
+        """Create the backing index if it doesn't exist yet"""
+        pass
+
+    def fill_if_empty(self, load):
+        """Call load() to fill a local store from the database if it holds no vectors yet"""
+        if len(self) == 0:
+            load()
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class PineconeVectorStore(VectorStore):
+    """Vector store backed by a Pinecone index"""
+
+    def __init__(self, namespace='users', index_name=None, dimension=EMBEDDING_DIMENSION):
+        # User vectors predate namespaces and live in the default one
+        self.namespace = '' if namespace == 'users' else namespace
+        self.index_name = index_name or settings.PINECONE_INDEX_NAME
+        self.dimension = dimension
+        self._index = None
+
+    @property
+    def index(self):
+        # Connect on first use; with PINECONE_INDEX_HOST set this needs no API call
+        if self._index is None:
+            self._index = get_pinecone_client().Index(
+                name=self.index_name,
+                host=settings.PINECONE_INDEX_HOST
+            )
+        return self._index
+
+    def ensure_index(self):
+        # Called at worker boot or by the ensure_vector_index command, not on the request path
+        pc = get_pinecone_client()
+        if self.index_name not in pc.list_indexes().names():
+            pc.create_index(
+                name=self.index_name,
+                dimension=self.dimension,
+                metric='cosine'
+            )
+
+    def upsert(self, vectors):
+        # Pinecone expects plain lists, embeddings are loaded as numpy arrays
+        vectors = [
+            {**item, 'values': np.asarray(item['values'], dtype=np.float32).tolist()}
+            for item in vectors
+        ]
+        self.index.upsert(vectors=vectors, namespace=self.namespace)
+
+    def upsert_many(self, vectors, batch_size=None, max_concurrency=None):
+        # Each chunk is one request; keep up to max_concurrency of them in flight
+        batch_size = batch_size or settings.VECTOR_UPSERT_BATCH_SIZE
+        max_concurrency = max_concurrency or settings.VECTOR_UPSERT_CONCURRENCY
+        # Connect before fanning out so the threads share one index client
+        self.index
+        count = 0
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            pending = deque()
+            for chunk in chunked(vectors, batch_size):
+                pending.append(executor.submit(self.upsert, chunk))
+                count += len(chunk)
+                if len(pending) >= max_concurrency:
+                    pending.popleft().result()
+            while pending:
+                pending.popleft().result()
+        return count
+
+    @staticmethod
+    def _split_filter(filter):
+        """
+        Split a filter into the part Pinecone evaluates and the part checked here:
+        bitsets are sent as id lists unless they exceed Pinecone's limit
+        """
+        remote = {}
+        local = {}
+        for field, condition in (filter or {}).items():
+            if not isinstance(condition, dict):
+                remote[field] = condition
+                continue
+            for op, expected in condition.items():
+                if isinstance(expected, IdBitset):
+                    if len(expected) > PINECONE_MAX_FILTER_VALUES:
+                        local.setdefault(field, {})[op] = expected
+                        continue
+                    expected = list(expected)
+                remote.setdefault(field, {})[op] = expected
+        return remote, local
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=False):
+        remote, local = self._split_filter(filter)
+        vector = np.asarray(vector, dtype=np.float32).tolist()
+
+        # Conditions checked here need over-fetching until top_k matches pass them
+        fetch = top_k
+        while True:
+            query_response = self.index.query(
+                vector=vector,
+                top_k=fetch,
+                filter=remote or None,
+                include_metadata=include_metadata or bool(local),
+                namespace=self.namespace
+            )
+            matches = [
+                match for match in query_response['matches']
+                if matches_filter(match.get('metadata'), local)
+            ]
+            if (not local or len(matches) >= top_k or len(query_response['matches']) < fetch
+                    or fetch >= PINECONE_MAX_TOP_K):
+                break
+            fetch = min(fetch * 4, PINECONE_MAX_TOP_K)
+
+        return [
+            {
+                'id': match['id'],
+                'score': match['score'],
+                'metadata': (match.get('metadata') or {}) if include_metadata else {}
+            }
+            for match in matches[:top_k]
+        ]
+
+    def delete(self, ids):
+        self.index.delete(ids=list(ids), namespace=self.namespace)
+
+    def __len__(self):
+        stats = self.index.describe_index_stats()
+        namespace_stats = stats['namespaces'].get(self.namespace)
+        return namespace_stats['vector_count'] if namespace_stats else 0
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process exact search over a contiguous float32 matrix.
+    Rows are normalized on insert, so a query is one matrix-vector
+    product followed by argpartition.
+    Single-process, for development and tests: each process fills its own copy
+    from the database and only sees the upserts it made itself, so web and
+    Celery processes drift apart. Use 'hnsw' or 'pinecone' with several processes.
+    """
+    local = True
+
+    def __init__(self, namespace='users', dimension=EMBEDDING_DIMENSION, initial_capacity=1024):
+        self.namespace = namespace
+        self.dimension = dimension
+        self._matrix = np.zeros((initial_capacity, dimension), dtype=np.float32)
+        self._ids = []
+        self._metadata = []
+        self._positions = {}
+        self._lock = threading.RLock()
+
+    def _grow(self, required):
+        capacity = self._matrix.shape[0]
+        if required <= capacity:
+            return
+        while capacity < required:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+        matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = matrix
+
+    @staticmethod
+    def _normalize(values):
+        vector = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        return vector
+
+    def upsert(self, vectors):
+        with self._lock:
+            self._grow(len(self._ids) + len(vectors))
+            for item in vectors:
+                position = self._positions.get(item['id'])
+                if position is None:
+                    position = len(self._ids)
+                    self._positions[item['id']] = position
+                    self._ids.append(item['id'])
+                    self._metadata.append(None)
+                self._matrix[position] = self._normalize(item['values'])
+                self._metadata[position] = item.get('metadata') or {}
+
+    def delete(self, ids):
+        with self._lock:
+            for vector_id in ids:
+                position = self._positions.pop(vector_id, None)
+                if position is None:
+                    continue
+
+                # Move the last row into the freed slot to keep the matrix dense
+                last = len(self._ids) - 1
+                if position != last:
+                    last_id = self._ids[last]
+                    self._matrix[position] = self._matrix[last]
+                    self._ids[position] = last_id
+                    self._metadata[position] = self._metadata[last]
+                    self._positions[last_id] = position
+                self._ids.pop()
+                self._metadata.pop()
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=False):
+        query = self._normalize(vector)
+
+        with self._lock:
+            size = len(self._ids)
+            if size == 0 or top_k <= 0:
+                return []
+
+            scores = self._matrix[:size] @ query
+            if filter:
+                mask = filter_mask(self._metadata, filter)
+                scores[~mask] = -np.inf
+                size = int(mask.sum())
+                if size == 0:
+                    return []
+
+            k = min(top_k, size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            return [
+                {
+                    'id': self._ids[position],
+                    'score': float(scores[position]),
+                    'metadata': self._metadata[position] if include_metadata else {}
+                }
+                for position in top
+            ]
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class HNSWVectorStore(VectorStore):
+    """
+    Approximate search over an in-process HNSW graph, persisted as a snapshot
+    plus an append-only log of upserts and deletes. Every write goes through
+    the log, and every process replays new log records before it reads, so
+    workers sharing HNSW_INDEX_DIR see each other's writes without a rebuild.
+    """
+    local = True
+
+    def __init__(self, namespace='users', dimension=EMBEDDING_DIMENSION, directory=None,
+                 M=None, ef_construction=None, ef_search=None, snapshot_every=None):
+        self.namespace = namespace
+        self.dimension = dimension
+        self.M = M or settings.HNSW_M
+        self.ef_construction = ef_construction or settings.HNSW_EF_CONSTRUCTION
+        self.ef_search = ef_search or settings.HNSW_EF_SEARCH
+        self.snapshot_every = snapshot_every or settings.HNSW_SNAPSHOT_EVERY
+
+        directory = directory or settings.HNSW_INDEX_DIR
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, f"{namespace}.npz")
+        self.log_path = os.path.join(directory, f"{namespace}.log")
+
+        self._lock = threading.RLock()
+        self._log_lock_depth = 0
+        self._reload()
+
+    def _reload(self):
+        """Load the snapshot (if any) and replay the whole log"""
+        if os.path.exists(self.snapshot_path):
+            self.index = HNSWIndex.load(self.snapshot_path, ef_search=self.ef_search)
+            self._snapshot_mtime = os.path.getmtime(self.snapshot_path)
+            with np.load(self.snapshot_path) as data:
+                self._metadata = json.loads(str(data['metadata'])) if 'metadata' in data else {}
+        else:
+            self.index = HNSWIndex(self.dimension, self.M, self.ef_construction, self.ef_search)
+            self._snapshot_mtime = None
+            self._metadata = {}
+        self._log_offset = 0
+        self._log_records = 0
+        self._replay_log()
+
+    def _replay_log(self):
+        """Apply log records written since the last replay"""
+        if not os.path.exists(self.log_path):
+            return
+
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._log_offset)
+            data = f.read()
+
+        # Only complete lines; a record being written right now is picked up next time
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if not line:
+                continue
+            record = json.loads(line)
+            if record['op'] == 'upsert':
+                values = np.frombuffer(base64.b64decode(record['values']), dtype=np.float32)
+                self.index.add(record['id'], values)
+                self._metadata[record['id']] = record.get('metadata') or {}
+            elif record['op'] == 'delete':
+                for vector_id in record['ids']:
+                    self.index.delete(vector_id)
+                    self._metadata.pop(vector_id, None)
+            self._log_records += 1
+        self._log_offset += end
+
+    def _sync(self):
+        """Catch up with snapshots and log records written by other processes"""
+        snapshot_mtime = os.path.getmtime(self.snapshot_path) if os.path.exists(self.snapshot_path) else None
+        log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+
+        if snapshot_mtime != self._snapshot_mtime or log_size < self._log_offset:
+            self._reload()
+        elif log_size > self._log_offset:
+            self._replay_log()
+
+    @contextmanager
+    def _log_lock(self):
+        """
+        Exclusive flock on the log shared by all processes, reentrant within this store
+        (flock on a second descriptor of the same file would wait for the first one)
+        """
+        with self._lock:
+            if self._log_lock_depth:
+                self._log_lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._log_lock_depth -= 1
+                return
+
+            with open(self.log_path, 'ab') as log:
+                fcntl.flock(log, fcntl.LOCK_EX)
+                self._log_lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._log_lock_depth = 0
+                    fcntl.flock(log, fcntl.LOCK_UN)
+
+    def _append(self, records):
+        payload = b''.join(json.dumps(record).encode() + b'\n' for record in records)
+        with self._log_lock(), open(self.log_path, 'ab') as f:
+            f.write(payload)
+            f.flush()
+
+    def upsert(self, vectors):
+        records = [
+            {
+                'op': 'upsert',
+                'id': item['id'],
+                'values': base64.b64encode(
+                    np.asarray(item['values'], dtype=np.float32).tobytes()
+                ).decode('ascii'),
+                'metadata': item.get('metadata') or {}
+            }
+            for item in vectors
+        ]
+        with self._lock:
+            self._append(records)
+            self._sync()
+            if self._log_records >= self.snapshot_every:
+                self.snapshot()
+
+    def delete(self, ids):
+        with self._lock:
+            self._append([{'op': 'delete', 'ids': list(ids)}])
+            self._sync()
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=False, ef=None):
+        with self._lock:
+            self._sync()
+
+            accept = None
+            if filter:
+                accept = lambda vector_id: matches_filter(self._metadata.get(vector_id), filter)
+
+            return [
+                {
+                    'id': vector_id,
+                    'score': float(score),
+                    'metadata': self._metadata.get(vector_id, {}) if include_metadata else {}
+                }
+                for vector_id, score in self.index.search(vector, k=top_k, ef=ef, accept=accept)
+            ]
+
+    def snapshot(self):
+        """Write a fresh snapshot and truncate the log"""
+        with self._log_lock():
+            self._sync()
+
+            # Drop tombstones once they make up a large part of the graph
+            if self.index.tombstones > len(self.index):
+                self.index.compact()
+
+            self.index.save(self.snapshot_path, metadata=np.asarray(json.dumps(self._metadata)))
+
+            os.truncate(self.log_path, 0)
+            self._snapshot_mtime = os.path.getmtime(self.snapshot_path)
+            self._log_offset = 0
+            self._log_records = 0
+
+    def fill_if_empty(self, load):
+        """
+        Fill the store once across processes: the emptiness check and load() run under
+        the log lock, so processes starting together don't all write the same records
+        """
+        with self._log_lock():
+            self._sync()
+            if len(self.index) == 0:
+                load()
+
+    def __len__(self):
+        with self._lock:
+            self._sync()
+            return len(self.index)
+
+
+class QuantizedVectorStore(VectorStore):
+    """
+    Compressed in-process store. Vectors are kept as int8 codes with a per-vector
+    scale (method 'int8') or as product-quantized codes (method 'pq'); candidates
+    are ranked with asymmetric scores on the codes and the best rerank_candidates
+    are re-scored exactly against full-precision vectors from the namespace's
+    rerank loader (VECTOR_RERANK_LOADERS).
+    Product quantization needs training data: until pq_train_size vectors have
+    arrived (or train() is called) vectors are kept as float32 and searched exactly.
+    Like NumpyVectorStore, each process holds its own copy; run message analysis
+    in the process that indexes messages, or accept copies refreshed on restart.
+    """
+    local = True
+
+    def __init__(self, namespace='messages', dimension=EMBEDDING_DIMENSION, method=None,
+                 rerank_candidates=None, pq_subspaces=None, pq_train_size=None, rerank_loader=None):
+        self.namespace = namespace
+        self.dimension = dimension
+        self.method = method or settings.QUANTIZATION_METHOD
+        self.rerank_candidates = rerank_candidates or settings.QUANTIZATION_RERANK_CANDIDATES
+        self.pq_train_size = pq_train_size or settings.PQ_TRAIN_SIZE
+
+        if self.method == 'int8':
+            self.quantizer = ScalarQuantizer()
+        elif self.method == 'pq':
+            self.quantizer = ProductQuantizer(dimension, subspaces=pq_subspaces or settings.PQ_SUBSPACES)
+        else:
+            raise ValueError(f"Unknown quantization method: {self.method}")
+
+        if rerank_loader is None:
+            loader_path = getattr(settings, 'VECTOR_RERANK_LOADERS', {}).get(namespace)
+            rerank_loader = import_string(loader_path) if loader_path else None
+        self.rerank_loader = rerank_loader
+
+        self._rows = self._allocate(1024)
+        self._scales = np.ones(1024, dtype=np.float32)
+        self._ids = []
+        self._metadata = []
+        self._positions = {}
+        self._lock = threading.RLock()
+
+    def _allocate(self, capacity):
+        if not self.quantizer.trained:
+            return np.zeros((capacity, self.dimension), dtype=np.float32)
+        if self.method == 'int8':
+            return np.zeros((capacity, self.dimension), dtype=np.int8)
+        return np.zeros((capacity, self.quantizer.subspaces), dtype=np.uint8)
+
+    def _grow(self, required):
+        capacity = self._rows.shape[0]
+        if required <= capacity:
+            return
+        while capacity < required:
+            capacity *= 2
+        rows = self._allocate(capacity)
+        rows[:len(self._ids)] = self._rows[:len(self._ids)]
+        scales = np.ones(capacity, dtype=np.float32)
+        scales[:len(self._ids)] = self._scales[:len(self._ids)]
+        self._rows, self._scales = rows, scales
+
+    def upsert(self, vectors):
+        if not vectors:
+            return
+        matrix = normalize_rows([item['values'] for item in vectors])
+
+        with self._lock:
+            if self.quantizer.trained:
+                rows, scales = self.quantizer.encode(matrix)
+            else:
+                rows, scales = matrix, None
+
+            self._grow(len(self._ids) + len(vectors))
+            for offset, item in enumerate(vectors):
+                position = self._positions.get(item['id'])
+                if position is None:
+                    position = len(self._ids)
+                    self._positions[item['id']] = position
+                    self._ids.append(item['id'])
+                    self._metadata.append(None)
+                self._rows[position] = rows[offset]
+                self._scales[position] = 1 if scales is None else scales[offset]
+                self._metadata[position] = item.get('metadata') or {}
+
+            if not self.quantizer.trained and len(self._ids) >= self.pq_train_size:
+                self.train()
+
+    def train(self):
+        """Train the quantizer on the stored float32 vectors and switch to codes"""
+        with self._lock:
+            if self.quantizer.trained or not self._ids:
+                return
+            size = len(self._ids)
+            raw = self._rows[:size]
+            sample = raw
+            if size > self.pq_train_size:
+                rng = np.random.default_rng(0)
+                sample = raw[rng.choice(size, self.pq_train_size, replace=False)]
+            self.quantizer.train(sample)
+
+            codes, _ = self.quantizer.encode(raw)
+            self._rows = self._allocate(self._rows.shape[0])
+            self._rows[:size] = codes
+
+    def delete(self, ids):
+        with self._lock:
+            for vector_id in ids:
+                position = self._positions.pop(vector_id, None)
+                if position is None:
+                    continue
+
+                # Move the last row into the freed slot to keep the arrays dense
+                last = len(self._ids) - 1
+                if position != last:
+                    last_id = self._ids[last]
+                    self._rows[position] = self._rows[last]
+                    self._scales[position] = self._scales[last]
+                    self._ids[position] = last_id
+                    self._metadata[position] = self._metadata[last]
+                    self._positions[last_id] = position
+                self._ids.pop()
+                self._metadata.pop()
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=False):
+        query = normalize_rows(vector)[0]
+
+        with self._lock:
+            size = len(self._ids)
+            if size == 0 or top_k <= 0:
+                return []
+
+            quantized = self.quantizer.trained
+            if quantized:
+                scores = self.quantizer.scores(query, self._rows[:size], self._scales[:size])
+            else:
+                scores = self._rows[:size] @ query
+
+            if filter:
+                mask = filter_mask(self._metadata, filter)
+                scores[~mask] = -np.inf
+                size = int(mask.sum())
+                if size == 0:
+                    return []
+
+            # Over-fetch on approximate scores, then re-rank exactly
+            k = min(max(top_k, self.rerank_candidates) if quantized else top_k, size)
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            candidate_ids = [self._ids[position] for position in candidates]
+            candidate_scores = {vector_id: float(scores[position])
+                                for vector_id, position in zip(candidate_ids, candidates)}
+            metadata = {vector_id: self._metadata[position]
+                        for vector_id, position in zip(candidate_ids, candidates)}
+
+        if quantized and self.rerank_loader is not None:
+            full_vectors = self.rerank_loader(candidate_ids)
+            # Vectors missing from the source of truth were deleted there, drop them
+            candidate_scores = {
+                vector_id: float(normalize_rows(values)[0] @ query)
+                for vector_id, values in full_vectors.items()
+                if vector_id in candidate_scores
+            }
+
+        ranked = sorted(candidate_scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            {
+                'id': vector_id,
+                'score': score,
+                'metadata': metadata[vector_id] if include_metadata else {}
+            }
+            for vector_id, score in ranked
+        ]
+
+    def memory_usage(self):
+        """Bytes used by the vector payload (codes, scales and codebooks)"""
+        size = len(self._ids)
+        usage = self._rows[:size].nbytes + self._scales[:size].nbytes
+        if self.method == 'pq' and self.quantizer.trained:
+            usage += self.quantizer.codebooks.nbytes
+        return usage
+
+    def __len__(self):
+        return len(self._ids)
+
+
+VECTOR_STORE_BACKENDS = {
+    'pinecone': PineconeVectorStore,
+    'numpy': NumpyVectorStore,
+    'hnsw': HNSWVectorStore,
+    'quantized': QuantizedVectorStore,
+}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(namespace='users', backend=None):
+    """
+    Return the process-wide vector store for a namespace ('users' or 'messages').
+    In-process backends must be shared, otherwise every caller
+    would see an empty index.
+    """
+    if backend is None and namespace == 'messages':
+        backend = getattr(settings, 'MESSAGE_VECTOR_STORE_BACKEND', None)
+    backend = backend or getattr(settings, 'VECTOR_STORE_BACKEND', 'pinecone')
+
+    with _stores_lock:
+        key = (backend, namespace)
+        if key not in _stores:
+            try:
+                store_class = VECTOR_STORE_BACKENDS[backend]
+            except KeyError:
+                raise ValueError(f"Unknown vector store backend: {backend}")
+            _stores[key] = store_class(namespace=namespace)
+        return _stores[key]
+
+
+def ensure_vector_indexes():
+    """Make sure the indexes behind the user and message stores exist"""
+    for namespace in ('users', 'messages'):
+        get_vector_store(namespace).ensure_index()
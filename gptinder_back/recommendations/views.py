@@ -1,17 +1,20 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
 import numpy as np
+from django.db import transaction
 from django.db.models import Q, Count
 from django.contrib.auth import get_user_model
 from rest_framework import viewsets, permissions, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
-from .models import UserRecommendation, UserChat, UserMessage
+from .models import RecommendationJob, UserRecommendation, UserChat, UserMessage
 from .serializers import (
-    UserRecommendationSerializer, UserChatSerializer, 
+    RecommendationJobSerializer, UserRecommendationSerializer, UserChatSerializer, 
     UserMessageSerializer, MessageRequestSerializer
 )
-from .embeddings import EmbeddingService
+from .jobs import start_recommendation_job
+from .tasks import generate_recommendations_job
 
 User = get_user_model()
 
@@ -31,41 +34,28 @@ class UserRecommendationViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['post'])
     def generate(self, request):
         """
-        Generate or regenerate user recommendations based on user embeddings
+        Start generating or regenerating user recommendations in the background.
+        Returns 202 with the job, its progress is at jobs/{id}/. The list keeps
+        serving the previous recommendations until the new set is saved.
         """
-        try:
-            # Initialize the embedding service
-            embedding_service = EmbeddingService()
-            
-            # Generate or update embedding for current user
-            user_embedding = embedding_service.generate_user_embedding(request.user)
-            
-            if not user_embedding:
-                return Response(
-                    {"detail": "Couldn't generate embeddings for your profile. Please add more information to your interests and bio."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Generate recommendations
-            num_recommendations = embedding_service.generate_recommendations(request.user.id)
-            
-            if num_recommendations == 0:
-                return Response(
-                    {"detail": "No recommendations found. Try adding more to your interests and bio."},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            # Get and return the recommendations
-            recommendations = UserRecommendation.objects.filter(user=request.user)
-            serializer = self.get_serializer(recommendations, many=True)
-            
-            return Response(serializer.data)
-            
-        except Exception as e:
-            return Response(
-                {"detail": f"Error generating recommendations: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        # Reuse the user's running job (also one started by the stream) unless it looks lost
+        job, created = start_recommendation_job(request.user)
+        
+        if created:
+            job_id = str(job.id)
+            transaction.on_commit(lambda: generate_recommendations_job.delay(job_id))
+        
+        return Response(
+            RecommendationJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('recommendation-job', kwargs={'job_id': job.id}, request=request)}
+        )
+    
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})')
+    def job(self, request, job_id=None):
+        """Status and partial counts of a recommendation generation job"""
+        job = get_object_or_404(RecommendationJob, id=job_id, user=request.user)
+        return Response(RecommendationJobSerializer(job).data)
     
     @action(detail=True, methods=['post'])
     def mark_viewed(self, request, pk=None):
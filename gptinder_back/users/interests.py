@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, FloatField, OuterRef, Subquery
+from django.db.models.functions import Cast
+
+from .models import InterestTag, UserInterest
+
+
+def interest_names(interests):
+    """Normalized set of comma-separated interests"""
+    return set(i.strip().lower() for i in (interests or '').split(',') if i.strip())
+
+
+def _tag_ids_key(user_id):
+    return f"user_interest_tags:{user_id}"
+
+
+def sync_user_interests(user):
+    """Make the user's UserInterest rows match their interests text"""
+    names = interest_names(user.interests)
+    current = dict(UserInterest.objects.filter(user=user).values_list('tag__name', 'tag_id'))
+
+    removed = [tag_id for name, tag_id in current.items() if name not in names]
+    added = names - set(current)
+    if removed:
+        UserInterest.objects.filter(user=user, tag_id__in=removed).delete()
+    if added:
+        InterestTag.objects.bulk_create([InterestTag(name=name) for name in added], ignore_conflicts=True)
+        tag_ids = InterestTag.objects.filter(name__in=added).values_list('id', flat=True)
+        UserInterest.objects.bulk_create(
+            [UserInterest(user=user, tag_id=tag_id) for tag_id in tag_ids],
+            ignore_conflicts=True
+        )
+
+    if removed or added:
+        cache.delete(_tag_ids_key(user.pk))
+
+
+def user_tag_ids(user_ids):
+    """{user_id: set of tag ids}, cached for INTEREST_TAGS_CACHE_SECONDS"""
+    keys = {user_id: _tag_ids_key(user_id) for user_id in user_ids}
+    cached = cache.get_many(list(keys.values()))
+    result = {user_id: set(cached[key]) for user_id, key in keys.items() if key in cached}
+
+    missing = [user_id for user_id in keys if user_id not in result]
+    if missing:
+        fetched = {user_id: set() for user_id in missing}
+        links = UserInterest.objects.filter(user_id__in=missing).values_list('user_id', 'tag_id')
+        for user_id, tag_id in links:
+            fetched[user_id].add(tag_id)
+        cache.set_many(
+            {keys[user_id]: sorted(tag_ids) for user_id, tag_ids in fetched.items()},
+            timeout=settings.INTEREST_TAGS_CACHE_SECONDS
+        )
+        result.update(fetched)
+    return result
+
+
+def tag_names(tag_ids):
+    """{tag_id: name}; tags are never renamed, so names are cached without expiry"""
+    keys = {tag_id: f"interest_tag:{tag_id}" for tag_id in tag_ids}
+    cached = cache.get_many(list(keys.values()))
+    result = {tag_id: cached[key] for tag_id, key in keys.items() if key in cached}
+
+    missing = [tag_id for tag_id in keys if tag_id not in result]
+    if missing:
+        fetched = dict(InterestTag.objects.filter(id__in=missing).values_list('id', 'name'))
+        cache.set_many({keys[tag_id]: name for tag_id, name in fetched.items()}, timeout=None)
+        result.update(fetched)
+    return result
+
+
+def common_interests(user_id, other_ids):
+    """{other_id: sorted names of the interests it shares with user_id}"""
+    tag_ids = user_tag_ids([user_id, *other_ids])
+    own = tag_ids[user_id]
+    common = {other_id: own & tag_ids[other_id] for other_id in other_ids}
+    names = tag_names(set().union(*common.values()))
+    return {
+        other_id: sorted(names[tag_id] for tag_id in shared if tag_id in names)
+        for other_id, shared in common.items()
+    }
+
+
+def similar_users_by_tags(user_id, top_k=10, exclude_user_ids=()):
+    """
+    Active users with the most similar interests by Jaccard similarity of their tags,
+    as [(user_id, score)] best first. Computed in SQL over the (tag, user) index.
+    """
+    own_count = len(user_tag_ids([user_id])[user_id])
+    if not own_count:
+        return []
+
+    tag_counts = UserInterest.objects.filter(
+        user_id=OuterRef('user_id')
+    ).order_by().values('user_id').annotate(count=Count('id')).values('count')
+
+    matches = UserInterest.objects.filter(
+        tag__user_links__user_id=user_id,
+        user__is_active=True
+    ).exclude(
+        user_id__in=[user_id, *exclude_user_ids]
+    ).values('user_id').annotate(
+        common=Count('id'),
+        total=Subquery(tag_counts)
+    ).annotate(
+        score=Cast(F('common'), FloatField()) / Cast(own_count + F('total') - F('common'), FloatField())
+    ).order_by('-score', 'user_id').values_list('user_id', 'score')
+
+    return list(matches[:top_k])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from users.interests import sync_user_interests
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds interest tags of all users from their interests text'
+
+    def handle(self, *args, **options):
+        users = User.objects.only('id', 'interests').order_by('id')
+        count = 0
+        for user in users.iterator(chunk_size=1000):
+            sync_user_interests(user)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Synced interest tags of {count} users"))
@@ -0,0 +1,63 @@
+# Generated by Django 5.2 on 2026-10-17 03:10
+
+from django.db import migrations
+
+import gptinder_back.fields
+
+
+BATCH_SIZE = 500
+
+
+def json_to_binary(apps, schema_editor):
+    """Copy JSON float lists into the binary vector column"""
+    User = apps.get_model('users', 'User')
+    batch = []
+    users = User.objects.filter(embedding__isnull=False).only('id', 'embedding')
+    for user in users.iterator(chunk_size=BATCH_SIZE):
+        user.embedding_binary = user.embedding
+        batch.append(user)
+        if len(batch) >= BATCH_SIZE:
+            User.objects.bulk_update(batch, ['embedding_binary'])
+            batch = []
+    if batch:
+        User.objects.bulk_update(batch, ['embedding_binary'])
+
+
+def binary_to_json(apps, schema_editor):
+    """Copy binary vectors back into the JSON column"""
+    User = apps.get_model('users', 'User')
+    batch = []
+    users = User.objects.filter(embedding_binary__isnull=False).only('id', 'embedding_binary')
+    for user in users.iterator(chunk_size=BATCH_SIZE):
+        user.embedding = user.embedding_binary.tolist()
+        batch.append(user)
+        if len(batch) >= BATCH_SIZE:
+            User.objects.bulk_update(batch, ['embedding'])
+            batch = []
+    if batch:
+        User.objects.bulk_update(batch, ['embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_last_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='embedding_binary',
+            field=gptinder_back.fields.VectorField(blank=True, null=True, verbose_name='Embedding Vector'),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='user',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='user',
+            old_name='embedding_binary',
+            new_name='embedding',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_user_embedding_binary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='embedding_dirty',
+            field=models.BooleanField(db_index=True, default=True, verbose_name='Embedding Dirty'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='embedding_profile_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Embedding Profile Hash'),
+        ),
+    ]
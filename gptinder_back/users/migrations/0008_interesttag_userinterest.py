@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-17 13:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_user_embedding_dirty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterestTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=500, unique=True, verbose_name='Name')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserInterest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_links', to='users.interesttag')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interest_links', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='interest_tags',
+            field=models.ManyToManyField(blank=True, related_name='users', through='users.UserInterest', to='users.interesttag'),
+        ),
+        migrations.AddIndex(
+            model_name='userinterest',
+            index=models.Index(fields=['tag', 'user'], name='users_useri_tag_id_cda4bf_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='userinterest',
+            unique_together={('user', 'tag')},
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-17 17:55
+
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+
+
+def interest_names(interests):
+    """Same normalization as users.interests.interest_names, frozen for this migration"""
+    return set(i.strip().lower() for i in (interests or '').split(',') if i.strip())
+
+
+def build_interest_tags(apps, schema_editor):
+    """Build InterestTag and UserInterest rows from the interests text of existing users"""
+    User = apps.get_model('users', 'User')
+    InterestTag = apps.get_model('users', 'InterestTag')
+    UserInterest = apps.get_model('users', 'UserInterest')
+
+    users = User.objects.exclude(interests='').values_list('id', 'interests')
+    user_names = {user_id: interest_names(interests) for user_id, interests in users.iterator(chunk_size=BATCH_SIZE)}
+    all_names = set().union(*user_names.values()) if user_names else set()
+
+    InterestTag.objects.bulk_create(
+        [InterestTag(name=name) for name in all_names],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    tag_ids = dict(InterestTag.objects.values_list('name', 'id'))
+    UserInterest.objects.bulk_create(
+        (
+            UserInterest(user_id=user_id, tag_id=tag_ids[name])
+            for user_id, names in user_names.items()
+            for name in names
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_interesttag_userinterest'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_interest_tags, migrations.RunPython.noop),
+    ]
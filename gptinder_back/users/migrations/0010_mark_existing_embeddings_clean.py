@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 19:00
+
+import hashlib
+import unicodedata
+
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+
+
+def profile_hash(interests, bio):
+    """Same hash as recommendations.embeddings.profile_hash, frozen for this migration"""
+    text = ' '.join(unicodedata.normalize('NFC', f"Interests: {interests}\nBio: {bio}").split())
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def mark_embedded_users_clean(apps, schema_editor):
+    """Users embedded before 0007 keep their embedding instead of all being re-embedded as dirty"""
+    User = apps.get_model('users', 'User')
+
+    users = User.objects.filter(embedding__isnull=False, embedding_profile_hash='').only('id', 'interests', 'bio')
+    batch = []
+    for user in users.iterator(chunk_size=BATCH_SIZE):
+        user.embedding_profile_hash = profile_hash(user.interests, user.bio)
+        user.embedding_dirty = False
+        batch.append(user)
+        if len(batch) >= BATCH_SIZE:
+            User.objects.bulk_update(batch, ['embedding_profile_hash', 'embedding_dirty'])
+            batch = []
+    if batch:
+        User.objects.bulk_update(batch, ['embedding_profile_hash', 'embedding_dirty'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_backfill_interest_tags'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_embedded_users_clean, migrations.RunPython.noop),
+    ]
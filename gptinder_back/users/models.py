@@ -1,7 +1,21 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from gptinder_back.fields import VectorField
+
+
+class InterestTag(models.Model):
+    """Normalized interest (lowercased, trimmed item of User.interests)"""
+    name = models.CharField(_("Name"), max_length=500, unique=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
 
 class User(AbstractUser):
     """
@@ -17,11 +31,46 @@ class User(AbstractUser):
     bio = models.TextField(_("Bio"), max_length=500, blank=True)
     interests = models.TextField(_("Interests"), max_length=500, blank=True)
     
+    # Tags parsed from interests, kept in sync when the profile is saved
+    interest_tags = models.ManyToManyField(
+        InterestTag,
+        through='UserInterest',
+        related_name='users',
+        blank=True
+    )
+    
+    last_activity = models.DateTimeField(
+        _("Last Activity"),
+        default=timezone.now,
+        help_text=_("Timestamp of user's last activity")
+    )
+    
     # Embedding vector for user interests
-    embedding = models.JSONField(_("Embedding Vector"), null=True, blank=True)
+    embedding = VectorField(_("Embedding Vector"), null=True, blank=True)
     
     # Last time the embedding was updated
     embedding_updated_at = models.DateTimeField(_("Embedding Updated At"), null=True, blank=True)
     
+    # Hash of the profile text the embedding was built from
+    embedding_profile_hash = models.CharField(_("Embedding Profile Hash"), max_length=64, blank=True)
+    
+    # Set when interests or bio change after the embedding was built, cleared by the refresh
+    embedding_dirty = models.BooleanField(_("Embedding Dirty"), default=True, db_index=True)
+    
     def __str__(self):
         return self.username
+
+
+class UserInterest(models.Model):
+    """User <-> tag link; the (tag, user) index is the inverted index from a tag to its users"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interest_links')
+    tag = models.ForeignKey(InterestTag, on_delete=models.CASCADE, related_name='user_links')
+    
+    class Meta:
+        unique_together = ['user', 'tag']
+        indexes = [
+            models.Index(fields=['tag', 'user']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.tag_id}"
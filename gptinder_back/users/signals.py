@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .interests import sync_user_interests
+from .models import User
+
+
+@receiver(post_save, sender=User, dispatch_uid='sync_interest_tags')
+def sync_interest_tags(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the user's interest tags in sync with their interests text"""
+    if update_fields is not None and 'interests' not in update_fields:
+        return
+    # Deferred interests were not loaded, so they can't have been edited
+    if 'interests' in instance.get_deferred_fields():
+        return
+    if created and not instance.interests:
+        return
+
+    sync_user_interests(instance)
@@ -64,6 +64,8 @@ export const recommendationsApi = {
   
   generateRecommendations: () => api.post('/recommendations/generate/'),
   
+  getGenerationJob: (jobId: string) => api.get(`/recommendations/jobs/${jobId}/`),
+  
   markViewed: (recommendationId: number) => 
     api.post(`/recommendations/${recommendationId}/mark_viewed/`),
 };
@@ -72,11 +72,28 @@ export const fetchRecommendations = createAsyncThunk(
   }
 );
 
+const JOB_POLL_INTERVAL_MS = 1000;
+// The server's RECOMMENDATION_JOB_TIMEOUT (600s) plus a margin; a job still unfinished by then is lost
+const JOB_POLL_TIMEOUT_MS = 660 * 1000;
+
 export const generateRecommendations = createAsyncThunk(
   'recommendations/generateRecommendations',
   async (_, { rejectWithValue }) => {
     try {
-      const response = await recommendationsApi.generateRecommendations();
+      // Generation runs as a background job: poll it, then load the new list
+      let { data: job } = await recommendationsApi.generateRecommendations();
+      const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+      while (job.status === 'pending' || job.status === 'running') {
+        if (Date.now() >= deadline) {
+          return rejectWithValue('Generating recommendations is taking too long. Please try again later.');
+        }
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        job = (await recommendationsApi.getGenerationJob(job.id)).data;
+      }
+      if (job.status === 'failed' || job.recommendations_count === 0) {
+        return rejectWithValue(job.detail || 'Failed to generate recommendations');
+      }
+      const response = await recommendationsApi.getRecommendations();
       return response.data;
     } catch (error: any) {
       return rejectWithValue(error.response?.data?.detail || 'Failed to generate recommendations');